@@ -1,12 +1,389 @@
+"""
+Dry-run planner of initial_translation.
 
-def calculate_api_cost(folder_name):
-    folder_path = project_path / folder_name
-    text_files = [text_file for text_file in folder_path.rglob("*.txt")]
-    total_characters = 0
-    for text_file in text_files:
-        output_path = text_file.with_suffix(".mp3")
-        if not output_path.exists():
-            total_characters += len(text_file.read_text())
-    cost = total_characters / 1000 * 0.18
-    print(f"Estimated cost for API usage: {cost:.2f}€")
-    return cost
+Usage: python api_cost_evaluation.py COURSE_DIR SOURCE TARGET [TARGET ...]
+           [--source-version v002] [--version-policy latest|new] [--trace trace.jsonl] [--json plan.json]
+
+The course tree is walked once and, for every chapter and target language,
+the planner works out what a run would produce: the pptx runs to translate,
+the transcripts to write and to translate, the audio files to synthesize and
+the videos to render. Existing outputs, translation memory hits, audio
+cache hits and transcript cache hits are left out, exactly as the pipeline would skip them.
+
+The plan reports tokens (counted with tiktoken, with the prompts the pipeline
+sends), characters, request counts, the dollar cost and a projected wall time.
+Durations come from the per-stage rates measured in a metrics trace
+(METRICS_TRACE_PATH of a previous run) when one is given, and from
+conservative defaults otherwise. Nothing is written and no API is called: the
+translation memory and the transcript cache are opened read-only, a missing
+one counts as all misses.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+from collections import defaultdict
+
+from audio_cache import audio_cache
+from cli_helpers import get_latest_version
+from config import ANTHROPIC_MAX_CONCURRENT, ANTHROPIC_REQUESTS_PER_MINUTE, ANTHROPIC_TOKENS_PER_MINUTE, voice_ids
+from course_index import SLIDES_DIR_NAME, get_index
+from file_manifest import sha256_file
+from initial_translation import list_chapters, slides_are_outdated
+from mp3_info import Mp3InfoError, mp3_duration
+from pipeline_scheduler import DEFAULT_CPU_WORKERS, DEFAULT_IO_WORKERS
+from pptx_translator import collect_paragraphs, paragraph_segment
+from supported_languages import language_codes
+from text_chunker import SENTENCE, chunk_text, count_tokens
+from transcript_cache import WHISPER_MODEL, transcript_cache, whisper_language
+from translation_memory import translation_memory
+from txt_2_mp3 import audio_key
+from txt_translation import (MODEL, PROMPT_VERSION, batch_system_prompt, chunk_system_prompt, fanout_chunk_tokens,
+                             fanout_system_prompt, pack_segments)
+
+# Dollar prices
+ANTHROPIC_PRICE_PER_MILLION_INPUT_TOKENS = 3.0
+ANTHROPIC_PRICE_PER_MILLION_OUTPUT_TOKENS = 15.0
+ELEVENLABS_PRICE_PER_1K_CHARACTERS = 0.18
+WHISPER_PRICE_PER_MINUTE = 0.006
+
+# A translation is about as long as its source, a bit longer in most target languages
+OUTPUT_TOKEN_RATIO = 1.2
+CHARACTER_RATIO = 1.1
+# Spoken lectures, used for transcripts that do not exist yet
+TOKENS_PER_AUDIO_MINUTE = 200
+CHARACTERS_PER_AUDIO_MINUTE = 900
+
+# Metric stage -> counter the stage duration is proportional to (None: per call)
+RATE_UNITS = {
+    "translate": "tokens_out",
+    "tts": "characters",
+    "transcribe": "bytes_sent",
+    "export_pdf": None,
+    "rasterize_pdf": "pages",
+    "render_video": "slides",
+}
+# Seconds per unit when no trace is available
+DEFAULT_RATES = {
+    "translate": 0.02,
+    "tts": 0.01,
+    "transcribe": 6e-6,
+    "export_pdf": 8.0,
+    "rasterize_pdf": 0.5,
+    "render_video": 1.5,
+}
+
+
+def load_rates(trace_path=None):
+    """
+    Seconds per unit of every stage, measured from the successful spans of a
+    metrics trace, falling back to `DEFAULT_RATES`.
+    """
+    rates = dict(DEFAULT_RATES)
+    if not trace_path or not os.path.exists(trace_path):
+        return rates
+
+    seconds = defaultdict(float)
+    units = defaultdict(float)
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            stage = entry.get("stage")
+            if stage not in RATE_UNITS or not entry.get("ok"):
+                continue
+            unit = RATE_UNITS[stage]
+            seconds[stage] += entry.get("seconds", 0)
+            units[stage] += entry.get(unit, 0) if unit else 1
+    for stage in RATE_UNITS:
+        if units[stage] > 0:
+            rates[stage] = seconds[stage] / units[stage]
+    return rates
+
+
+def resolve_target_version_path(course_dir, target, version_policy):
+    """The version folder prepare_target_folders would pick, or None if it would create a new one."""
+    target_lang_path = os.path.join(course_dir, target)
+    if version_policy != "latest" or not os.path.isdir(target_lang_path):
+        return None
+    latest_version = get_latest_version(target_lang_path)
+    return os.path.join(target_lang_path, latest_version) if latest_version else None
+
+
+def new_plan():
+    return defaultdict(lambda: defaultdict(float))
+
+
+def plan_segments(plan, stage, segments, languages, source_language):
+    """Add the batched requests translate_segments_to_many would send for `segments`."""
+    missing = []
+    for segment in dict.fromkeys(segments):
+        hits = sum(translation_memory.contains(segment, source_language, language, MODEL, PROMPT_VERSION)
+                   for language in languages)
+        plan[stage]["memory_hits"] += hits
+        if hits < len(languages):
+            missing.append(segment)
+
+    max_tokens = 1500 if len(languages) == 1 else min(1500, fanout_chunk_tokens(len(languages), 1500))
+    for batch in pack_segments(missing, max_tokens):
+        numbered = "\n".join(f"<{n}>{missing[i]}</{n}>" for n, i in enumerate(batch, 1))
+        text_tokens = count_tokens(numbered)
+        if len(languages) == 1:
+            system_prompt = batch_system_prompt(languages[0], len(batch))
+        else:
+            system_prompt = fanout_system_prompt(languages, len(batch))
+        plan[stage]["requests"] += 1
+        plan[stage]["segments"] += len(batch)
+        plan[stage]["tokens_in"] += count_tokens(system_prompt) + text_tokens
+        plan[stage]["tokens_out"] += text_tokens * OUTPUT_TOKEN_RATIO * len(languages)
+
+
+def plan_texts(plan, stage, texts, languages, source_language=None):
+    """Add the chunked requests translate_texts_to_many would send for `texts`."""
+    if len(languages) == 1:
+        system_tokens, max_tokens = count_tokens(chunk_system_prompt(languages[0])), 1750
+    else:
+        system_tokens, max_tokens = count_tokens(fanout_system_prompt(languages)), fanout_chunk_tokens(len(languages))
+    for text in texts:
+        for chunk in chunk_text(text, max_tokens, SENTENCE):
+            hits = sum(translation_memory.contains(chunk, source_language, language, MODEL, PROMPT_VERSION)
+                       for language in languages)
+            plan[stage]["memory_hits"] += hits
+            if hits == len(languages):
+                continue
+            chunk_tokens = count_tokens(chunk)
+            plan[stage]["requests"] += 1
+            plan[stage]["tokens_in"] += system_tokens + count_tokens(f"string to translate:\n {chunk}")
+            plan[stage]["tokens_out"] += chunk_tokens * OUTPUT_TOKEN_RATIO * len(languages)
+
+
+def plan_estimated_texts(plan, stage, tokens, languages):
+    """Add the requests for a transcript that does not exist yet, from its estimated length."""
+    if len(languages) == 1:
+        system_tokens, max_tokens = count_tokens(chunk_system_prompt(languages[0])), 1750
+    else:
+        system_tokens, max_tokens = count_tokens(fanout_system_prompt(languages)), fanout_chunk_tokens(len(languages))
+    requests = max(1, math.ceil(tokens / max_tokens))
+    plan[stage]["requests"] += requests
+    plan[stage]["tokens_in"] += tokens + requests * system_tokens
+    plan[stage]["tokens_out"] += tokens * OUTPUT_TOKEN_RATIO * len(languages)
+
+
+def plan_chapter(plan, pending, source_version_path, subfolder, source, target, target_version_path, transcribe=True):
+    """
+    Plan the outputs of one chapter for one target language.
+
+    Translations are only recorded in `pending` (source -> target languages),
+    the pipeline translates a chapter into all its target languages at once.
+    """
+    source_index = get_index(source_version_path)
+    source_chapter_path = os.path.join(source_version_path, subfolder)
+    target_chapter_path = os.path.join(target_version_path, subfolder) if target_version_path else None
+
+    def target_exists(*parts):
+        return target_version_path is not None and get_index(target_version_path).exists(subfolder, *parts)
+
+    # Slides
+    source_pptx_path = os.path.join(source_chapter_path, f"{subfolder}.pptx")
+    if source_index.exists(subfolder, f"{subfolder}.pptx"):
+        from pptx import Presentation
+
+        prs = Presentation(source_pptx_path)
+        page_count = len(prs.slides)
+        target_pptx_path = os.path.join(target_chapter_path, f"{subfolder}.pptx") if target_chapter_path else None
+        if not target_exists(f"{subfolder}.pptx"):
+            version = os.path.basename(os.path.normpath(target_version_path)) if target_version_path else "v001"
+            # One segment per paragraph, as translate_pptx_to_many sends them
+            segments = [paragraph_segment(runs) for runs in collect_paragraphs(prs, source, target, version, True)]
+            plan["translate_pptx"]["files"] += 1
+            for segment in segments:
+                pending["pptx"].setdefault(segment, []).append(language_codes[target])
+        if not target_exists(f"{subfolder}.pptx") or slides_are_outdated(target_pptx_path):
+            plan["export_slides"]["files"] += 1
+            plan["export_slides"]["pages"] += page_count
+
+    # Transcripts, audio and video
+    source_slide_path = os.path.join(source_chapter_path, SLIDES_DIR_NAME)
+    if not source_index.is_dir(subfolder, SLIDES_DIR_NAME):
+        return
+    files = source_index.files(subfolder, SLIDES_DIR_NAME)
+    stems = sorted({os.path.splitext(f)[0] for f in files if f.endswith((".txt", ".mp3"))})
+    for stem in stems:
+        txt_name = f"{stem}.txt"
+        source_txt_path = os.path.join(source_slide_path, txt_name)
+        source_mp3_path = os.path.join(source_slide_path, f"{stem}.mp3")
+        target_txt_exists = target_exists(SLIDES_DIR_NAME, txt_name)
+
+        if txt_name in files:
+            with open(source_txt_path, "r", encoding="utf-8") as f:
+                text = f.read()
+            tokens, characters = count_tokens(text), len(text)
+            if not target_txt_exists:
+                plan["translate_txt"]["files"] += 1
+                pending["txt"].setdefault(text, []).append(target)
+        else:
+            # Transcribed once, for all the target languages
+            minutes = 0.0
+            try:
+                minutes = mp3_duration(source_mp3_path) / 60
+            except (OSError, Mp3InfoError):
+                pass
+            if transcribe and transcript_cache.contains(sha256_file(source_mp3_path), WHISPER_MODEL,
+                                                        whisper_language(source)):
+                plan["transcribe"]["cache_hits"] += 1
+            elif transcribe:
+                plan["transcribe"]["files"] += 1
+                plan["transcribe"]["requests"] += 1
+                plan["transcribe"]["minutes"] += minutes
+                plan["transcribe"]["bytes_sent"] += source_index.stat(subfolder, SLIDES_DIR_NAME, f"{stem}.mp3").st_size
+            tokens, characters = minutes * TOKENS_PER_AUDIO_MINUTE, minutes * CHARACTERS_PER_AUDIO_MINUTE
+            if not target_txt_exists:
+                plan["translate_txt"]["files"] += 1
+                pending["estimated_txt"].setdefault(stem, (tokens, []))[1].append(target)
+
+        if not target_exists(SLIDES_DIR_NAME, f"{stem}.mp3"):
+            if target_txt_exists:
+                with open(os.path.join(target_chapter_path, SLIDES_DIR_NAME, txt_name), "r", encoding="utf-8") as f:
+                    target_text = f.read()
+                voice_id = voice_ids.get(stem.split("_")[-1])
+                if voice_id and audio_cache.contains(audio_key(target_text, voice_id)):
+                    plan["tts"]["cache_hits"] += 1
+                    continue
+                characters = len(target_text)
+            else:
+                characters *= CHARACTER_RATIO
+            plan["tts"]["files"] += 1
+            plan["tts"]["requests"] += 1
+            plan["tts"]["characters"] += characters
+
+    if stems and not target_exists(f"{subfolder}.mp4"):
+        plan["render_video"]["files"] += 1
+        plan["render_video"]["slides"] += len(stems)
+
+
+def plan_course(course_dir, source, targets, source_version=None, version_policy="latest"):
+    """
+    Walk a course and return the plan of a run, one entry per stage.
+
+    Returns:
+        dict: stage -> counters (files, requests, tokens_in, tokens_out,
+        characters, minutes, pages, slides, memory_hits, cache_hits).
+    """
+    source_lang_dir = os.path.join(course_dir, source)
+    source_version = source_version or get_latest_version(source_lang_dir)
+    source_version_path = os.path.join(source_lang_dir, source_version)
+    chapters = list_chapters(source_version_path)
+
+    plan = new_plan()
+    target_version_paths = [resolve_target_version_path(course_dir, target, version_policy) for target in targets]
+    for subfolder in chapters:
+        pending = {"pptx": {}, "txt": {}, "estimated_txt": {}}
+        for target, target_version_path in zip(targets, target_version_paths):
+            plan_chapter(plan, pending, source_version_path, subfolder, source, target, target_version_path,
+                         transcribe=target == targets[0])
+
+        # translate_pptx_to_many sends the union of the segments for all the languages
+        languages = list(dict.fromkeys(language for languages in pending["pptx"].values() for language in languages))
+        if languages:
+            plan_segments(plan, "translate_pptx", list(pending["pptx"]), languages, language_codes[source])
+
+        # Transcripts missing in the same languages are translated together
+        text_groups = defaultdict(list)
+        for text, languages in pending["txt"].items():
+            text_groups[tuple(sorted(languages))].append(text)
+        for languages, texts in text_groups.items():
+            plan_texts(plan, "translate_txt", texts, list(languages), source)
+        for tokens, languages in pending["estimated_txt"].values():
+            plan_estimated_texts(plan, "translate_txt", tokens, sorted(languages))
+    return {stage: dict(counters) for stage, counters in plan.items()}
+
+
+def estimate(plan, rates, io_workers=DEFAULT_IO_WORKERS, cpu_workers=DEFAULT_CPU_WORKERS):
+    """
+    Add the dollar cost and the serial duration of every stage to the plan,
+    and return (total cost, projected wall time in seconds).
+    """
+    for stage, counters in plan.items():
+        counters["cost"] = (
+            counters.get("tokens_in", 0) / 1e6 * ANTHROPIC_PRICE_PER_MILLION_INPUT_TOKENS
+            + counters.get("tokens_out", 0) / 1e6 * ANTHROPIC_PRICE_PER_MILLION_OUTPUT_TOKENS
+            + counters.get("characters", 0) / 1000 * ELEVENLABS_PRICE_PER_1K_CHARACTERS
+            + counters.get("minutes", 0) * WHISPER_PRICE_PER_MINUTE
+        )
+
+    def seconds(metric_stage, units):
+        return units * rates[metric_stage]
+
+    stage_seconds = {
+        "translate_pptx": seconds("translate", plan.get("translate_pptx", {}).get("tokens_out", 0)),
+        "translate_txt": seconds("translate", plan.get("translate_txt", {}).get("tokens_out", 0)),
+        "transcribe": seconds("transcribe", plan.get("transcribe", {}).get("bytes_sent", 0)),
+        "tts": seconds("tts", plan.get("tts", {}).get("characters", 0)),
+        "export_slides": (seconds("export_pdf", plan.get("export_slides", {}).get("files", 0))
+                          + seconds("rasterize_pdf", plan.get("export_slides", {}).get("pages", 0))),
+        "render_video": seconds("render_video", plan.get("render_video", {}).get("slides", 0)),
+    }
+    for stage, value in stage_seconds.items():
+        if stage in plan:
+            plan[stage]["seconds"] = value
+
+    # The Anthropic stages share the limiter, the other IO stages the IO pool
+    requests = sum(plan.get(stage, {}).get("requests", 0) for stage in ("translate_pptx", "translate_txt"))
+    tokens_in = sum(plan.get(stage, {}).get("tokens_in", 0) for stage in ("translate_pptx", "translate_txt"))
+    anthropic_wall = max(
+        (stage_seconds["translate_pptx"] + stage_seconds["translate_txt"]) / ANTHROPIC_MAX_CONCURRENT,
+        requests / ANTHROPIC_REQUESTS_PER_MINUTE * 60,
+        tokens_in / ANTHROPIC_TOKENS_PER_MINUTE * 60 if ANTHROPIC_TOKENS_PER_MINUTE else 0,
+    )
+    io_wall = (stage_seconds["transcribe"] + stage_seconds["tts"]) / io_workers
+    cpu_wall = (stage_seconds["export_slides"] + stage_seconds["render_video"]) / cpu_workers
+    total_cost = sum(counters["cost"] for counters in plan.values())
+    return total_cost, max(anthropic_wall + io_wall, cpu_wall)
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def print_plan(plan, total_cost, wall_seconds):
+    print(f"{'stage':16} {'files':>6} {'requests':>9} {'tokens in':>10} {'tokens out':>11} "
+          f"{'characters':>11} {'hits':>6} {'cost $':>9} {'time':>10}")
+    print("-" * 96)
+    for stage, counters in plan.items():
+        print(f"{stage:16} {counters.get('files', 0):6.0f} {counters.get('requests', 0):9.0f} "
+              f"{counters.get('tokens_in', 0):10.0f} {counters.get('tokens_out', 0):11.0f} "
+              f"{counters.get('characters', 0):11.0f} {counters.get('memory_hits', 0) + counters.get('cache_hits', 0):6.0f} "
+              f"{counters['cost']:9.2f} {format_duration(counters.get('seconds', 0)):>10}")
+    print("-" * 96)
+    print(f"Estimated cost      : ${total_cost:.2f}")
+    print(f"Projected wall time : {format_duration(wall_seconds)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Predict what a translation run would cost, without running it.")
+    parser.add_argument("course_dir")
+    parser.add_argument("source", help="source language code")
+    parser.add_argument("targets", nargs="+", help="target language codes")
+    parser.add_argument("--source-version", help="default: the latest version of the source language")
+    parser.add_argument("--version-policy", choices=("latest", "new"), default="latest")
+    parser.add_argument("--trace", default=os.getenv("METRICS_TRACE_PATH"),
+                        help="metrics trace of a previous run, for the per-stage rates")
+    parser.add_argument("--json", help="also write the plan to this file")
+    args = parser.parse_args()
+
+    for lang in [args.source] + args.targets:
+        if lang not in language_codes:
+            print(f"Error: unsupported language {lang}")
+            sys.exit(2)
+
+    plan = plan_course(args.course_dir, args.source, args.targets, args.source_version, args.version_policy)
+    total_cost, wall_seconds = estimate(plan, load_rates(args.trace))
+    print_plan(plan, total_cost, wall_seconds)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"stages": plan, "cost": total_cost, "wall_seconds": wall_seconds}, f, indent=2)
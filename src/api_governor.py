@@ -0,0 +1,263 @@
+"""
+Retries, backoff and rate limiting shared by every outbound API client.
+
+Each provider (Anthropic, ElevenLabs, OpenAI) has one `Governor` for the
+whole process. Every request goes through `Governor.call`, which:
+
+- waits for the provider `RateLimiter` (token buckets and concurrency slots),
+- retries only the failures that are safe to retry: throttling, timeouts,
+  connection errors and server errors. Other errors are raised at once,
+- honours Retry-After and the rate-limit headers, and halves the request rate
+  of the provider on every throttled answer, winning it back on success,
+- backs off exponentially with jitter between attempts,
+- opens a circuit breaker after many consecutive failures, so that all the
+  threads wait for the provider together instead of hammering it.
+
+Providers describe their errors with a `classify` function returning a
+`Failure`, or None for an error that must not be retried.
+"""
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+DURATION_PATTERN = re.compile(r"^(?:(\d+)h)?(?:(\d+)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+)ms)?$")
+
+
+class Failure:
+    """
+    A retryable failure of a request.
+
+    Args:
+        reason (str): What went wrong, for the logs.
+        throttled (bool): The provider asked us to slow down.
+        retry_after (float): Seconds the provider asked us to wait, if any.
+    """
+
+    def __init__(self, reason, throttled=False, retry_after=None):
+        self.reason = reason
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+
+class RetriesExhaustedError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delay in seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_reset(value):
+    """
+    Seconds until a rate-limit window resets, from a delay in seconds, an
+    RFC 3339 date (Anthropic) or a duration such as 6m0s (OpenAI). None if unknown.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() - time.time())
+    except ValueError:
+        pass
+    match = DURATION_PATTERN.match(value)
+    if match and any(match.groups()):
+        hours, minutes, seconds, milliseconds = (float(group or 0) for group in match.groups())
+        return hours * 3600 + minutes * 60 + seconds + milliseconds / 1000
+    return None
+
+
+def int_header(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_status(status, headers=None):
+    """Classify an HTTP status shared by every provider, None if it must not be retried."""
+    headers = headers or {}
+    retry_after = parse_retry_after(headers.get("retry-after") or headers.get("Retry-After"))
+    if status == 429:
+        return Failure(f"throttled ({status})", throttled=True, retry_after=retry_after)
+    if status in (408, 409) or status >= 500:
+        # 529 is Anthropic's "overloaded"
+        return Failure(f"server error ({status})", throttled=status == 529, retry_after=retry_after)
+    return None
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests to a provider that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens for
+    `cooldown` seconds. Once the cooldown is over, a single trial request is let
+    through: its success closes the circuit, its failure opens it again. A
+    throttled trial says nothing either way, it only lets the next request try.
+    """
+
+    def __init__(self, failure_threshold=10, cooldown=30):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        """
+        Raise CircuitOpenError with the seconds to wait while the circuit is open:
+        the rest of the cooldown, or a second while the trial request runs.
+        """
+        with self._lock:
+            if self._failures < self.failure_threshold:
+                return
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            if self._trial_running:
+                raise CircuitOpenError(1.0)
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+
+    def record_throttled(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.cooldown
+
+
+class Governor:
+    """
+    Send the requests of one provider within its limits.
+
+    Args:
+        name (str): The provider name, used in logs and errors.
+        limiter (RateLimiter): The budget of the provider.
+        classify (callable): exception -> Failure, or None if it must not be retried.
+        max_attempts (int): Attempts per request, the first one included.
+        base_delay (float): First backoff delay in seconds, doubled at every attempt.
+        max_delay (float): Upper bound of a backoff delay.
+    """
+
+    def __init__(self, name, limiter, classify, max_attempts=8, base_delay=1.0, max_delay=60.0, breaker=None):
+        self.name = name
+        self.limiter = limiter
+        self.classify = classify
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+    def backoff(self, attempt, base_delay=None):
+        """Jittered exponential delay before attempt `attempt + 1`."""
+        delay = min(self.max_delay, (base_delay or self.base_delay) * 2 ** (attempt - 1))
+        return random.uniform(delay / 2, delay)
+
+    def call(self, fn, tokens=0, label="request", span=None, max_attempts=None, base_delay=None, on_response=None):
+        """
+        Run `fn()` within the provider budget, retrying the retryable failures.
+
+        Args:
+            fn (callable): Sends the request and returns its result.
+            tokens (int): Tokens the request spends in the provider budget.
+            label (str): Human readable description of the request, used in logs and errors.
+            span (metrics.Span): Receives the retries and throttled counters.
+            on_response (callable): Called with the result, e.g. to read rate-limit headers.
+
+        Raises:
+            RetriesExhaustedError: If every attempt failed.
+            Exception: The first non-retryable error, as raised by `fn`.
+        """
+        max_attempts = max_attempts or self.max_attempts
+        last_failure = None
+        for attempt in range(1, max_attempts + 1):
+            self.wait_for_circuit(label)
+            try:
+                with self.limiter.request(tokens):
+                    result = fn()
+            except Exception as e:
+                failure = self.classify(e)
+                if failure is None:
+                    # The provider answered, it is up
+                    self.breaker.record_success()
+                    raise
+                last_failure = failure
+                wait = self.on_failure(failure, attempt, base_delay)
+                if span is not None:
+                    span.add(throttled=failure.throttled)
+            else:
+                self.breaker.record_success()
+                self.limiter.speed_up()
+                if on_response is not None:
+                    on_response(result)
+                return result
+
+            if attempt == max_attempts:
+                break
+            if span is not None:
+                span.add(retries=1)
+            print(f"{self.name} {label}, attempt {attempt}/{max_attempts}: {last_failure.reason}. "
+                  f"Retrying in {wait:.1f} seconds...")
+            time.sleep(wait)
+
+        raise RetriesExhaustedError(f"{self.name} {label} failed after {max_attempts} attempts. "
+                                    f"Last error: {last_failure.reason}")
+
+    def wait_for_circuit(self, label):
+        """
+        Block while the circuit is open, or while another thread sends the trial request.
+
+        The wait does not count as an attempt: the request was never sent.
+        """
+        while True:
+            try:
+                self.breaker.before_request()
+                return
+            except CircuitOpenError as e:
+                wait = e.args[0]
+                print(f"{self.name} {label}: circuit open, {self.name} keeps failing. "
+                      f"Waiting {wait:.1f} seconds...")
+                time.sleep(wait)
+
+    def on_failure(self, failure, attempt, base_delay=None):
+        """Update the shared state after a failed attempt and return the seconds to wait."""
+        wait = self.backoff(attempt, base_delay)
+        if failure.throttled:
+            # Throttling says nothing about the health of the provider
+            self.limiter.slow_down()
+            self.breaker.record_throttled()
+        else:
+            self.breaker.record_failure()
+        if failure.retry_after is not None:
+            wait = max(failure.retry_after, 0.1)
+            self.limiter.pause(wait)
+        return wait
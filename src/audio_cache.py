@@ -0,0 +1,130 @@
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from config import AUDIO_CACHE_DIR, AUDIO_CACHE_MAX_BYTES
+from translation_memory import normalize_text
+
+# ioctl cloning a file on copy-on-write filesystems (btrfs, xfs), see ioctl_ficlone(2)
+FICLONE = 0x40049409
+
+
+def make_key(text: str, voice_id: str, model_id: str, voice_settings: dict) -> str:
+    """
+    Build the content address of a synthesized audio.
+
+    The key is a SHA-256 of the normalized text together with everything that
+    influences the audio: voice, model and voice settings.
+    """
+    parts = [normalize_text(text), voice_id, model_id, json.dumps(voice_settings, sort_keys=True)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def clone_or_copy(source_path, output_path):
+    """
+    Materialize `source_path` at `output_path` without duplicating its data
+    when the filesystem allows it: a reflink, else a copy. The file appears
+    atomically.
+
+    Never a hardlink: the cache and the course tree must not share an inode,
+    refreshing the recency of an entry would change the mtime of the course
+    files and an in-place edit of a course file would corrupt the entry.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, partial_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix=".part", dir=output_dir)
+    try:
+        with open(source_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+            try:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            except OSError:
+                shutil.copyfileobj(src, dst)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+
+class AudioCache:
+    """
+    Shared on-disk store of synthesized audio files.
+
+    Files are stored under their content address (see `make_key`) and
+    materialized next to the transcripts with `clone_or_copy`. Once the store
+    grows over `max_bytes`, the least recently used files are evicted (a hit
+    refreshes the mtime of the stored file). Other generated media can be
+    stored the same way with another `suffix`.
+    """
+
+    EVICTION_INTERVAL = 50  # number of stores between two eviction passes
+
+    def __init__(self, directory=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES, suffix=".mp3"):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._stores = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    def fetch(self, key, output_path):
+        """Materialize the stored audio at `output_path`, return False on a miss."""
+        cached_path = self.path(key)
+        try:
+            os.utime(cached_path)
+        except FileNotFoundError:
+            return False
+        try:
+            clone_or_copy(cached_path, output_path)
+        except OSError as e:
+            # Evicted in the meantime
+            if e.errno == errno.ENOENT:
+                return False
+            raise
+        return True
+
+    def store(self, key, audio_path):
+        """Add a complete audio file to the store."""
+        cached_path = self.path(key)
+        os.makedirs(os.path.dirname(cached_path), exist_ok=True)
+        clone_or_copy(audio_path, cached_path)
+        with self._lock:
+            self._stores += 1
+            evict = self._stores % self.EVICTION_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used files until the store fits in `max_bytes`."""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(self.suffix):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        # Removed by a concurrent eviction or replaced by a store
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+audio_cache = AudioCache()
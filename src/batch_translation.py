@@ -0,0 +1,173 @@
+"""
+Headless batch mode of initial_translation.
+
+Usage: python batch_translation.py jobs.yml
+
+The job spec is a YAML file:
+
+    root_dir: ../../../Documents/     # optional, base of relative course paths
+    defaults:                         # optional, applied to every job
+      source_language: original       # a language code, or "original" to read course.yml
+      source_version: latest          # "latest" or a version folder such as v002
+      target_languages: [fr, es]
+      version_policy: latest          # "latest" reuses the latest target version, "new" creates one
+    jobs:
+      - course: btc101
+      - course: lnp201
+        target_languages: [de]
+        version_policy: new
+
+A course can only appear in one job. Every job is prepared without any prompt, then the tasks of all the jobs run in
+a single graph, in this one process, sharing the API clients, the tokenizer and
+the caches.
+"""
+import argparse
+import os
+import sys
+import yaml
+
+from cli_helpers import get_latest_version, get_original_language, print_separator
+from initial_translation import ROOT_DIR, build_pipeline, prepare_target_folders
+from pipeline_scheduler import run_tasks
+from supported_languages import language_codes
+
+DEFAULT_JOB = {
+    "source_language": "original",
+    "source_version": "latest",
+    "target_languages": [],
+    "version_policy": "latest",
+}
+VERSION_POLICIES = ("latest", "new")
+
+
+class JobSpecError(Exception):
+    pass
+
+
+def load_jobs(spec_path):
+    """Read a job spec and return the list of jobs, each with every setting resolved."""
+    with open(spec_path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+
+    root_dir = spec.get("root_dir", ROOT_DIR)
+    defaults = dict(DEFAULT_JOB, **(spec.get("defaults") or {}))
+    jobs = []
+    courses = set()
+    for entry in spec.get("jobs") or []:
+        if isinstance(entry, str):
+            entry = {"course": entry}
+        if "course" not in entry:
+            raise JobSpecError(f"Job without a course: {entry}")
+        job = dict(defaults, **entry)
+        job["course_dir"] = os.path.join(root_dir, job["course"])
+        # Task names and the batch summary are per course, and two jobs would write the same folders
+        course_key = os.path.normpath(os.path.abspath(job["course_dir"]))
+        if course_key in courses:
+            raise JobSpecError(f"Course {job['course']} has several jobs, list all its target languages in one job")
+        courses.add(course_key)
+        jobs.append(job)
+    if not jobs:
+        raise JobSpecError(f"No jobs found in {spec_path}")
+    return jobs
+
+
+def resolve_job(job):
+    """
+    Turn a job into (source language, source version, target languages) without prompting.
+
+    Raises:
+        JobSpecError: If the course, a language or a version cannot be resolved.
+    """
+    course_dir = job["course_dir"]
+    if not os.path.isdir(course_dir):
+        raise JobSpecError(f"Course not found: {course_dir}")
+
+    source = job["source_language"]
+    if source == "original":
+        source = get_original_language(course_dir)
+        if not source:
+            raise JobSpecError(f"No original_language in course.yml of {course_dir}")
+
+    targets = list(job["target_languages"])
+    for lang in [source] + targets:
+        if lang not in language_codes:
+            raise JobSpecError(f"Unsupported language {lang} for {course_dir}")
+    if not targets:
+        raise JobSpecError(f"No target languages for {course_dir}")
+    if source in targets:
+        raise JobSpecError(f"Source language {source} is also a target for {course_dir}")
+
+    if job["version_policy"] not in VERSION_POLICIES:
+        raise JobSpecError(f"Unknown version policy {job['version_policy']} for {course_dir}")
+
+    source_lang_dir = os.path.join(course_dir, source)
+    source_version = job["source_version"]
+    if source_version == "latest":
+        source_version = get_latest_version(source_lang_dir) if os.path.isdir(source_lang_dir) else None
+    if not source_version or not os.path.isdir(os.path.join(source_lang_dir, source_version)):
+        raise JobSpecError(f"Source version {job['source_version']} not found in {source_lang_dir}")
+
+    return source, source_version, targets
+
+
+def build_batch(jobs):
+    """Prepare the folders of every job and return (tasks, skipped jobs)."""
+    tasks = []
+    skipped = {}
+    for job in jobs:
+        course = job["course"]
+        try:
+            source, source_version, targets = resolve_job(job)
+        except JobSpecError as e:
+            skipped[course] = str(e)
+            continue
+
+        course_dir = job["course_dir"]
+        print(f"{course}: {source} {source_version} -> {', '.join(targets)}")
+        target_version_paths = prepare_target_folders(course_dir, source, targets, source_version,
+                                                      version_policy=job["version_policy"])
+        if not target_version_paths:
+            skipped[course] = "could not prepare the target folders"
+            continue
+
+        source_version_path = os.path.join(course_dir, source, source_version)
+        tasks.extend(build_pipeline(source_version_path, source, targets, target_version_paths,
+                                    name_prefix=f"{course}:"))
+    return tasks, skipped
+
+
+def run_batch(spec_path):
+    jobs = load_jobs(spec_path)
+    print(f"Preparing {len(jobs)} job(s)")
+    print_separator()
+    tasks, skipped = build_batch(jobs)
+    print_separator()
+
+    failures = run_tasks(tasks, desc="Translating courses") if tasks else {}
+
+    print("\nBatch summary:")
+    print_separator()
+    for course, reason in skipped.items():
+        print(f"{course}: skipped, {reason}")
+    for job in jobs:
+        course = job["course"]
+        if course in skipped:
+            continue
+        course_failures = {name: reason for name, reason in failures.items() if name.startswith(f"{course}:")}
+        print(f"{course}: {'done' if not course_failures else f'{len(course_failures)} step(s) did not complete'}")
+        for name, reason in sorted(course_failures.items()):
+            print(f"    {name}: {reason}")
+    print_separator("=")
+    return not skipped and not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translate several courses without any prompt.")
+    parser.add_argument("spec", help="YAML job spec")
+    args = parser.parse_args()
+    try:
+        succeeded = run_batch(args.spec)
+    except (OSError, yaml.YAMLError, JobSpecError) as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,151 @@
+"""
+Benchmark of text_chunker.chunk_text against the chunkers it replaced.
+
+Usage: python benchmark_chunking.py [--words N] [--repeat N]
+
+The legacy implementations below are verbatim copies of the former
+txt_translation.split_text and mp3_2_txt.split_text_into_chunks, kept here as
+the reference the linear-time chunker is measured against.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+import tiktoken
+
+from text_chunker import chunk_text, count_tokens, SENTENCE, TRANSCRIPT, PARAGRAPH
+
+
+def legacy_split_text(text, max_tokens=1750):
+    enc = tiktoken.get_encoding("cl100k_base")
+    tokens = enc.encode(text)
+
+    chunks = []
+    current_chunk = []
+    current_token_count = 0
+
+    for token in tokens:
+        current_chunk.append(token)
+        current_token_count += 1
+
+        if current_token_count >= max_tokens:
+            chunk_text = enc.decode(current_chunk)
+            last_period = chunk_text.rfind('.')
+            if last_period != -1:
+                chunks.append(chunk_text[:last_period+1])
+                current_chunk = enc.encode(chunk_text[last_period+1:])
+                current_token_count = len(current_chunk)
+            else:
+                chunks.append(chunk_text)
+                current_chunk = []
+                current_token_count = 0
+
+    if current_chunk:
+        chunks.append(enc.decode(current_chunk))
+
+    return chunks
+
+
+def legacy_num_tokens_from_string(string, encoding_name):
+    encoding = tiktoken.get_encoding(encoding_name)
+    return len(encoding.encode(string))
+
+
+def legacy_split_text_into_chunks(text, MAX_TOKENS=1000, ENCODING_NAME="cl100k_base", transcript=False):
+    chunks = []
+    current_chunk = ""
+
+    if transcript:
+        sentences = re.split(r'\.\s+', text)
+        for sentence in sentences:
+            sentence_tokens = legacy_num_tokens_from_string(sentence, ENCODING_NAME)
+            if sentence_tokens + legacy_num_tokens_from_string(current_chunk, ENCODING_NAME) <= MAX_TOKENS:
+                current_chunk += sentence + ". "
+            else:
+                chunks.append(current_chunk.strip())
+                current_chunk = sentence
+    else:
+        paragraphs = text.splitlines()
+        for paragraph in paragraphs:
+            paragraph_tokens = legacy_num_tokens_from_string(paragraph, ENCODING_NAME)
+            if paragraph_tokens + legacy_num_tokens_from_string(current_chunk, ENCODING_NAME) <= MAX_TOKENS:
+                current_chunk += paragraph + "\n"
+            else:
+                chunks.append(current_chunk.strip())
+                current_chunk = paragraph
+
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+
+def make_book(words, seed=0):
+    """A synthetic book: sentences of random length grouped in paragraphs, with some accents."""
+    rng = random.Random(seed)
+    vocabulary = ["bitcoin", "réseau", "nœud", "transaction", "bloc", "clé", "privée", "the", "a",
+                  "lightning", "channel", "fee", "mempool", "miner", "hash", "signature", "été"]
+    paragraphs = []
+    written = 0
+    while written < words:
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            length = rng.randint(5, 30)
+            sentences.append(" ".join(rng.choice(vocabulary) for _ in range(length)).capitalize() + ".")
+            written += length
+        paragraphs.append(" ".join(sentences))
+    return "\n".join(paragraphs)
+
+
+def measure(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, default=300000, help="size of the synthetic book (default: 300000)")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs (default: 3)")
+    args = parser.parse_args()
+
+    book = make_book(args.words)
+    count_tokens("warm up the encoding cache")
+    print(f"Book: {len(book):,} characters, {count_tokens(book):,} tokens")
+
+    cases = [
+        ("txt_translation (sentence, 1750)", 1750,
+         lambda: legacy_split_text(book, 1750),
+         lambda: chunk_text(book, 1750, SENTENCE)),
+        ("mp3_2_txt transcript (1000)", 1000,
+         lambda: legacy_split_text_into_chunks(book, 1000, transcript=True),
+         lambda: chunk_text(book, 1000, TRANSCRIPT)),
+        ("mp3_2_txt paragraph (1000)", 1000,
+         lambda: legacy_split_text_into_chunks(book, 1000, transcript=False),
+         lambda: chunk_text(book, 1000, PARAGRAPH)),
+    ]
+
+    slower = False
+    print(f"{'case':36} {'legacy':>10} {'new':>10} {'speedup':>9} {'chunks':>13}")
+    for name, max_tokens, legacy, new in cases:
+        legacy_time, legacy_chunks = measure(legacy, args.repeat)
+        new_time, new_chunks = measure(new, args.repeat)
+        speedup = legacy_time / new_time
+        slower = slower or speedup < 1
+        print(f"{name:36} {legacy_time:9.3f}s {new_time:9.3f}s {speedup:8.1f}x {len(legacy_chunks):6}/{len(new_chunks):<6}")
+        # Re-encoding a chunk on its own may merge one token at each cut
+        if max(count_tokens(chunk) for chunk in new_chunks) > max_tokens + 1:
+            print(f"  warning: a chunk of {name} exceeds the token limit")
+
+    if slower:
+        print("The new chunker is slower than a legacy implementation.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
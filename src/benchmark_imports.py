@@ -0,0 +1,97 @@
+"""
+Cold start benchmark of the command line tools.
+
+Usage: python benchmark_imports.py [--runs N] [--max-ms MS] [--json FILE] [--baseline FILE]
+
+Every entry module is imported in a fresh interpreter, several times, and the
+best wall time is kept. The import must also leave the heavy libraries (API
+clients, tokenizer, pptx, numpy) unloaded: they belong to the stages and are
+only imported once a task runs.
+
+Exits non-zero when a module loads a heavy library, takes longer than
+--max-ms, or regresses against a --baseline report.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_MODULES = ("initial_translation", "update_reviewed_version", "batch_translation", "api_cost_evaluation")
+HEAVY_MODULES = ("anthropic", "openai", "pptx", "tiktoken", "requests", "numpy", "psutil")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed * 1000, [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def time_import(module):
+    """Import `module` in a fresh interpreter, return (milliseconds, heavy modules loaded)."""
+    env = dict(os.environ)
+    # config parses VOICE_IDS at import time
+    env.setdefault("VOICE_IDS", "{}")
+    result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                            cwd=SRC_DIR, env=env, check=True, text=True, capture_output=True)
+    milliseconds, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return milliseconds, loaded
+
+
+def run_benchmark(runs):
+    report = {}
+    for module in ENTRY_MODULES:
+        timings = []
+        for _ in range(runs):
+            milliseconds, loaded = time_import(module)
+            timings.append(milliseconds)
+        report[module] = {"milliseconds": min(timings), "heavy_modules": loaded}
+        print(f"{module:26} {min(timings):8.1f} ms" + (f"  loads {', '.join(loaded)}" if loaded else ""))
+    return report
+
+
+def find_regressions(report, max_ms, baseline=None, tolerance=0.2):
+    regressions = []
+    for module, result in report.items():
+        if result["heavy_modules"]:
+            regressions.append(f"{module} imports {', '.join(result['heavy_modules'])}")
+        if result["milliseconds"] > max_ms:
+            regressions.append(f"{module} takes {result['milliseconds']:.1f} ms, over {max_ms:.0f} ms")
+        if baseline and module in baseline:
+            before = baseline[module]["milliseconds"]
+            if result["milliseconds"] > before * (1 + tolerance):
+                regressions.append(f"{module} {before:.1f} ms -> {result['milliseconds']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="imports per module, the best one is kept (default: 5)")
+    parser.add_argument("--max-ms", type=float, default=300, help="allowed import time per module (default: 300)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare with a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression against the baseline (default: 0.2)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.runs)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = find_regressions(report, args.max_ms, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
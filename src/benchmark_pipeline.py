@@ -0,0 +1,436 @@
+"""
+Offline end-to-end throughput benchmark of the translation pipeline.
+
+Usage: python benchmark_pipeline.py [--chapters N] [--targets fr,es] [--latency S] ...
+
+Local HTTP servers stand in for the Anthropic messages API, the ElevenLabs
+text-to-speech stream API and the OpenAI audio transcription API, with
+configurable latency, rate limit and error rate. A synthetic course is built
+from test/lnp201-en.pptx, then initial_translation and update_reviewed_version
+run against it. The report gives the wall time of every stage, the number of
+requests each stand-in received and the peak RSS.
+
+Nothing is downloaded: tokens are counted with a word-level stand-in for the
+tiktoken encoding (--tiktoken uses the real one), and when LibreOffice or
+poppler is missing the decks are exported as placeholder slides.
+
+Exits non-zero when a stage or a task of the graph fails. With --json the
+report is also written to a file, and --baseline compares the run with a
+previous report and exits non-zero on a regression.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_PPTX = os.path.join(REPO_DIR, "test", "lnp201-en.pptx")
+VOICE = "Rogzy"
+
+# One MPEG-1 layer III frame (128 kbps, 44.1 kHz, joint stereo) of silence
+MP3_FRAME = b"\xff\xfb\x90\x44" + b"\x00" * 413
+MP3_FRAME_DURATION = 1152 / 44100
+
+
+def silent_mp3(seconds):
+    return MP3_FRAME * max(1, int(seconds / MP3_FRAME_DURATION))
+
+
+def solid_png(width, height, rgb=(255, 255, 255)):
+    """A minimal single-colour PNG, used when LibreOffice is not available."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    row = b"\x00" + bytes(rgb) * width
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * height, 9))
+            + chunk(b"IEND", b""))
+
+
+class WordEncoding:
+    """
+    Offline stand-in for the tiktoken encoding: one token per word with its
+    leading whitespace. Tokens are the byte pieces themselves.
+    """
+
+    name = "benchmark-words"
+    PIECE_PATTERN = re.compile(rb"\s*\S+|\s+")
+
+    def encode(self, text, **kwargs):
+        return self.PIECE_PATTERN.findall(text.encode("utf-8"))
+
+    def decode_tokens_bytes(self, tokens):
+        return list(tokens)
+
+    def decode(self, tokens):
+        return b"".join(tokens).decode("utf-8", errors="replace")
+
+
+class MockProvider:
+    """Latency, rate limit and error injection shared by the routes of one provider."""
+
+    def __init__(self, name, latency, rate_limit, error_rate, seed=0):
+        self.name = name
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Return None to serve the request, or (status, headers) to reject it."""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if now - self._window_start >= 1:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            if self.rate_limit and self._window_count > self.rate_limit:
+                self.throttled += 1
+                return 429, {"Retry-After": "1"}
+            if self._random.random() < self.error_rate:
+                self.errors += 1
+                return 500, {}
+        time.sleep(self.latency)
+        return None
+
+
+def make_handler(providers):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send(self, status, body, content_type="application/json", headers=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/v1/messages"):
+                provider, respond = providers["anthropic"], self.anthropic
+            elif re.search(r"/v1/text-to-speech/[^/]+/stream$", self.path):
+                provider, respond = providers["elevenlabs"], self.elevenlabs
+            elif self.path.endswith("/audio/transcriptions"):
+                provider, respond = providers["openai"], self.openai
+            else:
+                self.send(404, b'{"error": "not found"}')
+                return
+
+            rejection = provider.admit()
+            if rejection:
+                status, headers = rejection
+                self.send(status, json.dumps({"type": "error", "error": {"type": "mock_error", "message": "mock"}}).encode(),
+                          headers=headers)
+                return
+            respond(body)
+
+        def anthropic(self, body):
+            request = json.loads(body)
+            text = request["messages"][0]["content"][0]["text"]
+            # Echo the text to translate, it keeps numbered segments intact
+            translation = text.split("\n", 1)[1] if "\n" in text else text
+            # Fan-out requests expect one block per language
+            languages = re.findall(r'<translation lang="([^"]+)">', request.get("system", ""))
+            if languages:
+                translation = "".join(f'<translation lang="{language}">{translation}</translation>\n'
+                                      for language in dict.fromkeys(languages))
+            response = {
+                "id": "msg_mock", "type": "message", "role": "assistant", "model": request.get("model"),
+                "content": [{"type": "text", "text": translation}],
+                "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": len(text) // 4, "output_tokens": len(translation) // 4},
+            }
+            self.send(200, json.dumps(response).encode())
+
+        def elevenlabs(self, body):
+            text = json.loads(body)["text"]
+            # Roughly 15 characters per second of speech
+            self.send(200, silent_mp3(len(text) / 15), content_type="audio/mpeg")
+
+        def openai(self, body):
+            self.send(200, json.dumps({"text": "This is a transcript of the slide. It explains the topic."}).encode())
+
+    return Handler
+
+
+def start_mock_server(providers):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(providers))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def count_slides(pptx_path):
+    try:
+        from pptx import Presentation
+        return len(Presentation(pptx_path).slides)
+    except Exception:
+        return 10
+
+
+def build_course(root, chapters, transcribed_ratio=0.5):
+    """
+    Lay out a synthetic course: en/v001/chapter-NN/{chapter-NN.pptx, slides/*.mp3, some slides/*.txt}.
+    """
+    course_dir = os.path.join(root, "benchmark-course")
+    version_path = os.path.join(course_dir, "en", "v001")
+    slide_count = count_slides(SAMPLE_PPTX)
+    os.makedirs(course_dir)
+    with open(os.path.join(course_dir, "course.yml"), "w") as f:
+        f.write("original_language: en\n")
+
+    rng = random.Random(0)
+    for c in range(1, chapters + 1):
+        chapter = f"chapter-{c:02d}"
+        slide_path = os.path.join(version_path, chapter, "slides")
+        os.makedirs(slide_path)
+        shutil.copy(SAMPLE_PPTX, os.path.join(version_path, chapter, f"{chapter}.pptx"))
+        for s in range(1, slide_count + 1):
+            stem = os.path.join(slide_path, f"{chapter}.{s:02d}_{VOICE}")
+            with open(f"{stem}.mp3", "wb") as f:
+                f.write(silent_mp3(rng.uniform(5, 20)))
+            if rng.random() < transcribed_ratio:
+                with open(f"{stem}.txt", "w", encoding="utf-8") as f:
+                    f.write(" ".join(["The lecturer explains how bitcoin transactions are built and signed."] * rng.randint(2, 8)))
+    return course_dir, version_path
+
+
+def placeholder_export(pptx_path, width=1920, height=1080):
+    """
+    Stand-in for pdf_rasterizer.export_slides when LibreOffice or poppler is
+    not available: one blank slide per page of the deck, and the manifest.
+    """
+    from file_manifest import sha256_file
+    from pdf_rasterizer import save_slides_manifest
+
+    slide_dir = os.path.join(os.path.dirname(os.path.abspath(pptx_path)), "slides")
+    base_name = os.path.splitext(os.path.basename(pptx_path))[0]
+    os.makedirs(slide_dir, exist_ok=True)
+    png = solid_png(width, height)
+    pages = {}
+    for page in range(1, count_slides(pptx_path) + 1):
+        image_name = f"{base_name}.{page:02d}.png"
+        image_path = os.path.join(slide_dir, image_name)
+        if not os.path.exists(image_path):
+            with open(image_path, "wb") as f:
+                f.write(png)
+        pages[image_name] = {"sha256": sha256_file(image_path), "width": width, "height": height, "bytes": len(png)}
+    save_slides_manifest(slide_dir, base_name, {"resolution": [width, height], "pages": pages})
+    return list(pages)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+class StageTimer:
+    def __init__(self, providers):
+        self.providers = providers
+        self.stages = []
+
+    def run(self, name, fn, *args, **kwargs):
+        """Time a stage, a failure is recorded in the report instead of stopping the benchmark."""
+        before = {key: provider.requests for key, provider in self.providers.items()}
+        start = time.perf_counter()
+        error = None
+        try:
+            result = fn(*args, **kwargs)
+            # run_tasks returns the failed and skipped tasks instead of raising
+            if name == "pipeline graph" and result:
+                error = f"{len(result)} task(s) failed or skipped: {', '.join(sorted(result))}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - start
+        requests = {key: provider.requests - before[key] for key, provider in self.providers.items()}
+        self.stages.append({"stage": name, "seconds": elapsed, "requests": requests, "error": error})
+        print(f"{name:28} {elapsed:8.2f}s  " + "  ".join(f"{k}={v}" for k, v in requests.items())
+              + (f"  ERROR {error}" if error else ""))
+
+
+def configure_environment(base_url, cache_dir):
+    """Point every client to the stand-ins, must run before the pipeline modules are imported."""
+    os.environ["ANTHROPIC_BASE_URL"] = base_url
+    os.environ["ELEVENLABS_API_BASE"] = base_url
+    os.environ["OPENAI_API_BASE"] = f"{base_url}/v1"
+    os.environ.setdefault("API_KEY_ANTHROPIC", "mock")
+    os.environ.setdefault("API_KEY_ELEVENLABS", "mock")
+    os.environ.setdefault("API_KEY_OPENAI", "mock")
+    os.environ["VOICE_IDS"] = json.dumps({VOICE: "mock-voice"})
+    os.environ["CACHE_DIR"] = cache_dir
+
+
+def run_benchmark(args, work_dir):
+    providers = {
+        "anthropic": MockProvider("anthropic", args.latency, args.rate_limit, args.error_rate, seed=1),
+        "elevenlabs": MockProvider("elevenlabs", args.latency, args.rate_limit, args.error_rate, seed=2),
+        "openai": MockProvider("openai", args.latency, args.rate_limit, args.error_rate, seed=3),
+    }
+    server = start_mock_server(providers)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    configure_environment(base_url, os.path.join(work_dir, "cache"))
+
+    if not args.tiktoken:
+        from text_chunker import register_encoding
+        register_encoding("cl100k_base", WordEncoding())
+
+    import initial_translation
+    import update_reviewed_version
+
+    missing_tools = initial_translation.missing_export_tools()
+    if missing_tools:
+        print(f"{', '.join(missing_tools)} not found, decks are exported as placeholder slides")
+        initial_translation.export_slides = placeholder_export
+        initial_translation.missing_export_tools = lambda: ()
+
+    course_dir, source_version_path = build_course(work_dir, args.chapters)
+    targets = args.targets
+    target_version_paths = initial_translation.prepare_target_folders(course_dir, "en", targets, "v001",
+                                                                       version_policy="latest")
+    timer = StageTimer(providers)
+    print(f"Synthetic course: {args.chapters} chapter(s), targets {', '.join(targets)}, mode {args.mode}")
+    print("-" * 72)
+
+    total_start = time.perf_counter()
+    if args.mode == "graph":
+        tasks = initial_translation.build_pipeline(source_version_path, "en", targets, target_version_paths)
+        timer.run("pipeline graph", initial_translation.run_tasks, tasks)
+    else:
+        timer.run("transcript_if_necessary", initial_translation.transcript_if_necessary, source_version_path)
+        for target, target_version_path in zip(targets, target_version_paths):
+            timer.run(f"translate_pptx [{target}]", initial_translation.translate_pptx_in_subfolders,
+                      source_version_path, "en", target_version_path, target)
+            timer.run(f"translate_transcripts [{target}]", initial_translation.translate_transcripts,
+                      source_version_path, target, target_version_path)
+            timer.run(f"generate_audios [{target}]", initial_translation.generate_translated_audios,
+                      target_version_path)
+            timer.run(f"generate_videos [{target}]", initial_translation.generate_translated_videos,
+                      target_version_path)
+    initial_seconds = time.perf_counter() - total_start
+
+    # A reviewed version: copy the first target version and edit one transcript
+    reviewed_path = os.path.join(os.path.dirname(target_version_paths[0]), "v002")
+    shutil.copytree(target_version_paths[0], reviewed_path)
+    edited = next((
+        os.path.join(root, name)
+        for root, _, names in sorted(os.walk(reviewed_path))
+        for name in sorted(names) if name.endswith(".txt") and "slides" in root
+    ), None)
+    if edited is None:
+        timer.stages.append({"stage": "update_reviewed_version", "seconds": 0.0, "requests": {},
+                             "error": "no translated transcript to review"})
+    else:
+        with open(edited, "a", encoding="utf-8") as f:
+            f.write(" Reviewed.")
+        timer.run("update_reviewed_version", update_reviewed_version.update_version, reviewed_path)
+
+    own_rss, children_rss = peak_rss_mb()
+    server.shutdown()
+    report = {
+        "chapters": args.chapters,
+        "targets": targets,
+        "mode": args.mode,
+        "latency": args.latency,
+        "rate_limit": args.rate_limit,
+        "error_rate": args.error_rate,
+        "initial_seconds": initial_seconds,
+        "stages": timer.stages,
+        "requests": {key: provider.requests for key, provider in providers.items()},
+        "throttled": {key: provider.throttled for key, provider in providers.items()},
+        "errors": {key: provider.errors for key, provider in providers.items()},
+        "peak_rss_mb": own_rss,
+        "peak_children_rss_mb": children_rss,
+    }
+    print("-" * 72)
+    print(f"initial_translation total   {initial_seconds:8.2f}s")
+    print("requests   " + "  ".join(f"{k}={v}" for k, v in report["requests"].items()))
+    print("throttled  " + "  ".join(f"{k}={v}" for k, v in report["throttled"].items()))
+    print("errors     " + "  ".join(f"{k}={v}" for k, v in report["errors"].items()))
+    print(f"peak RSS   {own_rss:.1f} MB (children {children_rss:.1f} MB)")
+    return report
+
+
+def compare_with_baseline(report, baseline_path, tolerance):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = []
+    if report["initial_seconds"] > baseline["initial_seconds"] * (1 + tolerance):
+        regressions.append(f"initial_translation {baseline['initial_seconds']:.2f}s -> {report['initial_seconds']:.2f}s")
+    for provider, count in report["requests"].items():
+        if count > baseline["requests"].get(provider, 0) * (1 + tolerance):
+            regressions.append(f"{provider} requests {baseline['requests'].get(provider, 0)} -> {count}")
+    if report["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']:.1f} MB -> {report['peak_rss_mb']:.1f} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chapters", type=int, default=3, help="chapters in the synthetic course (default: 3)")
+    parser.add_argument("--targets", type=lambda value: value.split(","), default=["fr", "es"],
+                        help="comma-separated target languages (default: fr,es)")
+    parser.add_argument("--mode", choices=("stages", "graph"), default="stages",
+                        help="run the stages one after the other, or the whole task graph (default: stages)")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every mock response (default: 0.2)")
+    parser.add_argument("--rate-limit", type=int, default=0, help="requests per second per provider, 0 for none")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 500")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="compare with a previous --json report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression against the baseline (default: 0.2)")
+    parser.add_argument("--tiktoken", action="store_true",
+                        help="count tokens with the real tiktoken encoding, downloaded on first use")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic course folder")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    try:
+        report = run_benchmark(args, work_dir)
+    finally:
+        if args.keep:
+            print(f"Synthetic course kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failed = [stage for stage in report["stages"] if stage["error"]]
+    for stage in failed:
+        print(f"Failed: {stage['stage']}: {stage['error']}")
+    regressions = []
+    if args.baseline:
+        regressions = compare_with_baseline(report, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
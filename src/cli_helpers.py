@@ -0,0 +1,138 @@
+"""
+Interactive prompts shared by the command line tools: course, version and
+language selection. Kept apart from the pipeline stages, so that a tool only
+asking questions starts without loading any API client.
+"""
+import os
+import re
+import sys
+
+import yaml
+
+from supported_languages import language_codes
+
+numbered_languages = list(enumerate(language_codes.items(), 1))
+
+def print_separator(char="-", length=40):
+    print(char * length)
+
+def print_languages():
+    print("\nAvailable languages:")
+    print_separator()
+    for number, (code, name) in numbered_languages:
+        print(f"{number:2}. {name:20} ({code})")
+    print_separator()
+
+def get_language_choice(prompt, multiple=False, default=None):
+    while True:
+        if default:
+            prompt = f"{prompt} (default: {default}): "
+        try:
+            user_input = input(prompt).strip()
+            if default and user_input == "":
+                return default if not multiple else [default]
+            
+            if multiple:
+                choices = user_input.split(',')
+                selected = [numbered_languages[int(choice.strip()) - 1][1][0] for choice in choices]
+                if len(selected) == len(set(selected)):  # Check for duplicates
+                    return selected
+                print("Duplicate selections are not allowed. Please try again.")
+            else:
+                choice = int(user_input)
+                if 1 <= choice <= len(numbered_languages):
+                    return numbered_languages[choice - 1][1][0]  # Return the language code
+            print("Invalid number(s). Please try again.")
+        except (ValueError, IndexError):
+            print("Please enter valid number(s).")
+
+def select_directory(ROOT_DIR):
+    subdirs = [d for d in os.listdir(ROOT_DIR) if os.path.isdir(os.path.join(ROOT_DIR, d))]
+    subdirs = sorted(subdirs)
+    
+    if not subdirs:
+        print("No subdirectories found in the root directory.")
+        sys.exit(1)
+    
+    print("\nAvailable courses (subdirectories):")
+    print_separator()
+    for i, subdir in enumerate(subdirs, 1):
+        print(f"{i:2}. {subdir}")
+    print_separator()
+    
+    while True:
+        try:
+            choice = int(input("Enter the number for the course (subdirectory): "))
+            if 1 <= choice <= len(subdirs):
+                return os.path.join(ROOT_DIR, subdirs[choice - 1])
+            print("Invalid number. Please try again.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def get_latest_version(directory):
+    version_dirs = [d for d in os.listdir(directory) if re.match(r'v\d{3}', d)]
+    if not version_dirs:
+        return None
+    return max(version_dirs)
+
+def select_source_version(course_dir, source_lang):
+    lang_dir = os.path.join(course_dir, source_lang)
+    if not os.path.exists(lang_dir):
+        print(f"No directory found for language: {source_lang}")
+        return None
+
+    latest_version = get_latest_version(lang_dir)
+    if not latest_version:
+        print(f"No version folders found for language: {source_lang}")
+        return None
+
+    print(f"\nLatest version found: {latest_version}")
+    use_latest = input("Do you want to use this version? (y/n): ").lower().strip()
+
+    if use_latest == 'y':
+        return latest_version
+
+    print("\nAvailable versions:")
+    versions = sorted([d for d in os.listdir(lang_dir) if re.match(r'v\d{3}', d)])
+    for i, version in enumerate(versions, 1):
+        print(f"{i:2}. {version}")
+
+    while True:
+        try:
+            choice = int(input("Enter the number for the version you want to use: "))
+            if 1 <= choice <= len(versions):
+                return versions[choice - 1]
+            print("Invalid number. Please try again.")
+        except ValueError:
+            print("Please enter a valid number.")
+
+def get_original_language(course_dir):
+    course_yaml = os.path.join(course_dir, 'course.yml')
+    if os.path.exists(course_yaml):
+        with open(course_yaml, 'r') as file:
+            try:
+                course_data = yaml.safe_load(file)
+                return course_data.get('original_language')
+            except yaml.YAMLError:
+                print("Error reading course.yml file.")
+    return None
+
+def select_languages(course_dir):
+    print_languages()
+    
+    original_lang = get_original_language(course_dir)
+    if original_lang:
+        print(f"\nOriginal language found in course.yml: {language_codes.get(original_lang, original_lang)} ({original_lang})")
+        use_original = input("Do you want to use this as the source language? (y/n): ").lower().strip()
+        if use_original == 'y':
+            source_lang = original_lang
+        else:
+            source_lang = get_language_choice("\nEnter the number for the source language")
+    else:
+        source_lang = get_language_choice("\nEnter the number for the source language")
+    
+    while True:
+        target_langs = get_language_choice("Enter the numbers for the target languages (comma-separated): ", multiple=True)
+        if source_lang not in target_langs:
+            return source_lang, target_langs
+        print("Source language cannot be in target languages. Please try again.")
@@ -1,16 +1,25 @@
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 import os
-import anthropic
 import json
 
 parent_dir = Path(__file__).parent.parent
 load_dotenv(dotenv_path=parent_dir / '.env')
 
 API_KEY_ANTHROPIC = os.getenv('API_KEY_ANTHROPIC')
-anthropic_client = anthropic.Anthropic(api_key=API_KEY_ANTHROPIC)
+# Base URLs can point to local stand-ins, see benchmark_pipeline.py
+ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL') or None
+
+@lru_cache(maxsize=None)
+def get_anthropic_client():
+    """The process-wide Anthropic client, built on first use (importing the SDK takes a while)."""
+    import anthropic
+    # Retries are left to api_governor, which shares the backoff between threads
+    return anthropic.Anthropic(api_key=API_KEY_ANTHROPIC, base_url=ANTHROPIC_BASE_URL, max_retries=0)
 
 API_KEY_ELEVENLABS = os.getenv("API_KEY_ELEVENLABS")
+ELEVENLABS_API_BASE = os.getenv("ELEVENLABS_API_BASE", "https://api.elevenlabs.io")
 HEADERS = {
     "Accept": "application/json",
     "xi-api-key": API_KEY_ELEVENLABS,
@@ -18,3 +27,32 @@ HEADERS = {
 }
 voice_ids_json = os.linesep.join(os.getenv('VOICE_IDS').splitlines())
 voice_ids = json.loads(voice_ids_json)
+
+# Local caches shared by every run of the pipeline
+CACHE_DIR = Path(os.getenv('CACHE_DIR', parent_dir / '.cache'))
+TRANSLATION_MEMORY_PATH = CACHE_DIR / 'translation_memory.sqlite'
+TRANSLATION_MEMORY_MAX_ENTRIES = int(os.getenv('TRANSLATION_MEMORY_MAX_ENTRIES', 200000))
+AUDIO_CACHE_DIR = CACHE_DIR / 'audio'
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', 5 * 1024 ** 3))
+STILL_CACHE_DIR = CACHE_DIR / 'stills'
+STILL_CACHE_MAX_BYTES = int(os.getenv('STILL_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+SEGMENT_CACHE_DIR = CACHE_DIR / 'segments'
+SEGMENT_CACHE_MAX_BYTES = int(os.getenv('SEGMENT_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+TRANSCRIPT_CACHE_PATH = CACHE_DIR / 'transcripts.sqlite'
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv('TRANSCRIPT_CACHE_MAX_ENTRIES', 50000))
+
+# Process-wide budget for the Anthropic API, see rate_limiter.RateLimiter
+ANTHROPIC_REQUESTS_PER_MINUTE = int(os.getenv('ANTHROPIC_REQUESTS_PER_MINUTE', 50))
+ANTHROPIC_TOKENS_PER_MINUTE = int(os.getenv('ANTHROPIC_TOKENS_PER_MINUTE', 40000))
+ANTHROPIC_MAX_CONCURRENT = int(os.getenv('ANTHROPIC_MAX_CONCURRENT', 8))
+
+# Budgets of the other providers, see api_governor.Governor
+ELEVENLABS_REQUESTS_PER_MINUTE = int(os.getenv('ELEVENLABS_REQUESTS_PER_MINUTE', 120))
+ELEVENLABS_MAX_CONCURRENT = int(os.getenv('ELEVENLABS_MAX_CONCURRENT', 5))
+
+# Machine share of the concurrent ffmpeg encodes, see render_pool.RenderBudget
+RENDER_CORES = int(os.getenv('RENDER_CORES', os.cpu_count() or 1))
+RENDER_MEMORY_SHARE = float(os.getenv('RENDER_MEMORY_SHARE', 0.5))
+
+# Size of the rendered videos, slides are exported straight at this resolution
+SLIDE_RESOLUTION = (int(os.getenv('SLIDE_WIDTH', 1920)), int(os.getenv('SLIDE_HEIGHT', 1080)))
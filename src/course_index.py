@@ -0,0 +1,185 @@
+"""
+In-memory index of the files of a course version folder.
+
+The pipeline stages ask the index which chapters exist, which transcripts,
+audios and slide images a chapter has and whether an output already exists,
+instead of listing the folders again for every stage and every target
+language. Folders are read with os.scandir on first use only.
+
+Stages record the files they write with `CourseIndex.add`. Changes made
+behind the back of the index (an export, another process) are picked up by
+`CourseIndex.refresh`, which only scans again the folders whose mtime changed.
+"""
+import os
+import re
+import threading
+
+SLIDES_DIR_NAME = "slides"
+# Chapters excluded from the translation
+EXCLUDED_MARKER = "-DNT"
+# BASE.NN.png, BASE.NN_Voice.txt and BASE.NN_Voice.mp3 belong to slide NN
+SLIDE_FILE_PATTERN = re.compile(r"\.(\d+)(?:_[^.]*)?\.(png|txt|mp3)$", re.IGNORECASE)
+
+
+def version_language(version_path):
+    """The language code of a version folder, they live in COURSE/LANGUAGE/vNNN."""
+    return os.path.basename(os.path.dirname(os.path.abspath(version_path)))
+
+
+def slide_number(name):
+    """The slide number of a slide file name, None for any other file."""
+    match = SLIDE_FILE_PATTERN.search(name)
+    return int(match.group(1)) if match else None
+
+
+def pair_slides(names):
+    """
+    Group slide file names by slide number.
+
+    Returns:
+        list: (slide number, {"png": name, "txt": name, "mp3": name}) sorted by
+        slide number, a kind is missing from the dict when the slide lacks it.
+    """
+    slides = {}
+    for name in names:
+        match = SLIDE_FILE_PATTERN.search(name)
+        if match:
+            slides.setdefault(int(match.group(1)), {})[match.group(2).lower()] = name
+    return sorted(slides.items())
+
+
+class Folder:
+    """The entries of one directory, as of its last scan."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime_ns = None
+        self.exists = False
+        # File name -> os.stat_result, None until it is asked for
+        self.files = {}
+        self.dirs = set()
+
+    def scan(self):
+        """Read the directory again if its mtime changed since the last scan."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self.mtime_ns, self.exists, self.files, self.dirs = None, False, {}, set()
+            return
+        if mtime_ns == self.mtime_ns:
+            return
+        files, dirs = {}, set()
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    dirs.add(entry.name)
+                else:
+                    files[entry.name] = None
+        # The mtime read before the scan, a change during the scan is seen by the next refresh
+        self.mtime_ns, self.exists, self.files, self.dirs = mtime_ns, True, files, dirs
+
+
+class CourseIndex:
+    """
+    Chapters and files of a version folder (e.g. course/fr/v002).
+
+    Args:
+        version_path (str): The version folder.
+    """
+
+    def __init__(self, version_path):
+        self.version_path = os.path.abspath(version_path)
+        self._folders = {}
+        self._lock = threading.RLock()
+
+    def _folder(self, parts):
+        folder = self._folders.get(parts)
+        if folder is None:
+            folder = Folder(os.path.join(self.version_path, *parts))
+            folder.scan()
+            self._folders[parts] = folder
+        return folder
+
+    def chapters(self):
+        """The chapter folders, sorted, without the -DNT ones."""
+        with self._lock:
+            return sorted(name for name in self._folder(()).dirs if EXCLUDED_MARKER not in name)
+
+    def files(self, chapter, *parts, suffix=None):
+        """The sorted file names of chapter/parts, restricted to `suffix` if given."""
+        with self._lock:
+            names = self._folder((chapter,) + parts).files
+            return sorted(name for name in names if suffix is None or name.endswith(suffix))
+
+    def is_dir(self, chapter, *parts):
+        with self._lock:
+            if not parts:
+                return chapter in self._folder(()).dirs
+            return parts[-1] in self._folder((chapter,) + parts[:-1]).dirs
+
+    def exists(self, chapter, *parts):
+        """Whether the file or folder chapter/parts exists."""
+        if not parts:
+            return self.is_dir(chapter)
+        with self._lock:
+            folder = self._folder((chapter,) + parts[:-1])
+            return parts[-1] in folder.files or parts[-1] in folder.dirs
+
+    def stat(self, chapter, *parts):
+        """The os.stat_result of the file chapter/parts, None if it does not exist."""
+        with self._lock:
+            folder = self._folder((chapter,) + parts[:-1])
+            if parts[-1] not in folder.files:
+                return None
+            if folder.files[parts[-1]] is None:
+                try:
+                    folder.files[parts[-1]] = os.stat(os.path.join(folder.path, parts[-1]))
+                except FileNotFoundError:
+                    del folder.files[parts[-1]]
+                    return None
+            return folder.files[parts[-1]]
+
+    def slides(self, chapter):
+        """The png, txt and mp3 of every slide of a chapter, see `pair_slides`."""
+        return pair_slides(self.files(chapter, SLIDES_DIR_NAME))
+
+    def add(self, path):
+        """Record a file or folder written inside the version folder."""
+        parts = tuple(os.path.relpath(os.path.abspath(path), self.version_path).split(os.sep))
+        if parts[0] in (os.curdir, os.pardir):
+            return
+        with self._lock:
+            # Parent folders created on the way
+            for depth in range(1, len(parts)):
+                parent = self._folders.get(parts[:depth - 1])
+                if parent is not None:
+                    parent.dirs.add(parts[depth - 1])
+                folder = self._folders.get(parts[:depth])
+                if folder is not None:
+                    folder.exists = True
+            folder = self._folders.get(parts[:-1])
+            if folder is not None:
+                if os.path.isdir(path):
+                    folder.dirs.add(parts[-1])
+                else:
+                    folder.files[parts[-1]] = None
+
+    def refresh(self, chapter=None):
+        """Scan again the folders (of one chapter, or all) that changed on disk since their last scan."""
+        with self._lock:
+            for parts, folder in self._folders.items():
+                if chapter is None or parts[:1] == (chapter,):
+                    folder.scan()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(version_path):
+    """The index of a version folder, shared by every stage of the process."""
+    key = os.path.abspath(version_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = CourseIndex(key)
+        return _indexes[key]
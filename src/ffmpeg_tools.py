@@ -0,0 +1,77 @@
+import re
+import shutil
+import subprocess
+
+
+def get_ffmpeg():
+    """Path of the ffmpeg binary, the system one or the one shipped with imageio-ffmpeg."""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        return ffmpeg
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def parse_timestamp(value):
+    hours, minutes, seconds = value.split(":")
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def parse_silencedetect(output):
+    """
+    Read the duration and the silences from the stderr of an ffmpeg run with silencedetect.
+
+    A silence still open at the end of the file ends at its duration.
+
+    Returns:
+        tuple: (duration in seconds or None, list of (silence_start, silence_end) pairs).
+    """
+    duration = None
+    match = re.search(r"Duration: (\d+:\d+:\d+(?:\.\d+)?)", output)
+    if match:
+        duration = parse_timestamp(match.group(1))
+
+    silences = []
+    silence_start = None
+    for line in output.splitlines():
+        start_match = re.search(r"silence_start: (-?\d+(?:\.\d+)?)", line)
+        end_match = re.search(r"silence_end: (-?\d+(?:\.\d+)?)", line)
+        if start_match:
+            silence_start = max(float(start_match.group(1)), 0.0)
+        elif end_match and silence_start is not None:
+            silences.append((silence_start, float(end_match.group(1))))
+            silence_start = None
+    if silence_start is not None and duration is not None:
+        silences.append((silence_start, duration))
+    return duration, silences
+
+
+def detect_silences(file_path, noise_db=-35, min_silence=0.4):
+    """
+    Find the silences of an audio file with ffmpeg's silencedetect filter.
+
+    ffmpeg decodes the file as a stream, the decoded audio never reaches Python.
+
+    Returns:
+        tuple: (duration in seconds, list of (silence_start, silence_end) pairs).
+    """
+    command = [
+        get_ffmpeg(), "-hide_banner", "-nostats", "-i", file_path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-",
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    return parse_silencedetect(result.stderr)
+
+
+def cut_audio(file_path, start, end, output_path):
+    """Copy the [start, end] seconds of an audio file to `output_path` without re-encoding."""
+    command = [
+        get_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error",
+        "-ss", f"{start:.3f}", "-i", file_path,
+    ]
+    if end is not None:
+        command += ["-t", f"{end - start:.3f}"]
+    command += ["-map", "0:a", "-c", "copy", output_path]
+    subprocess.run(command, check=True, capture_output=True, text=True)
+    return output_path
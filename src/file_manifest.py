@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MANIFEST_NAME = ".manifest.json"
+# Files whose content drives update_reviewed_version
+TRACKED_SUFFIXES = (".pptx", ".txt")
+READ_SIZE = 1024 * 1024
+
+
+def sha256_file(path):
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb", buffering=0) as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+
+def scan_files(root, suffixes=TRACKED_SUFFIXES):
+    """Walk `root` with os.scandir and yield (relative path, stat) of the tracked files."""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and entry.name.lower().endswith(suffixes):
+                    relative_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    yield relative_path, entry.stat()
+
+
+def load_manifest(version_path):
+    path = os.path.join(version_path, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(version_path, manifest):
+    path = os.path.join(version_path, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def update_manifest(version_path, suffixes=TRACKED_SUFFIXES, workers=8):
+    """
+    Bring the manifest of a version folder up to date and return it.
+
+    The manifest maps every tracked file to its size, mtime and SHA-256. Only
+    files whose size or mtime changed since the last run are hashed again, in
+    parallel.
+    """
+    previous = load_manifest(version_path)
+    manifest = {}
+    to_hash = []
+    for relative_path, stat in scan_files(version_path, suffixes):
+        entry = previous.get(relative_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            manifest[relative_path] = entry
+        else:
+            manifest[relative_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            to_hash.append(relative_path)
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            paths = [os.path.join(version_path, relative_path) for relative_path in to_hash]
+            for relative_path, file_hash in zip(to_hash, executor.map(sha256_file, paths)):
+                manifest[relative_path]["sha256"] = file_hash
+
+    if manifest != previous:
+        save_manifest(version_path, manifest)
+    return manifest
+
+
+def diff_manifests(current, previous):
+    """Relative paths of the files that are new in `current` or whose hash differs from `previous`."""
+    return {
+        relative_path
+        for relative_path, entry in current.items()
+        if relative_path not in previous or previous[relative_path]["sha256"] != entry["sha256"]
+    }
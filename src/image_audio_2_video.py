@@ -1,40 +1,306 @@
+import hashlib
+import math
 import os
-import re
-import psutil
-from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips, concatenate_audioclips, CompositeAudioClip, AudioClip
-
-def limit_resources():
-    # Get the current process
-    current_process = psutil.Process()
-    # Set the resource limits to a % of the machine's capacity
-    factor = 0.50
-    ram_limit = psutil.virtual_memory().total * factor 
-    cpu_limit = psutil.cpu_count() * factor
-    # Set the resource limits for the current process
-    current_process.rlimit(psutil.RLIMIT_AS, (ram_limit, ram_limit))
-    current_process.cpu_affinity([int(cpu) for cpu in range(int(cpu_limit))])
-
-def create_video(directory, output_path):
-    limit_resources()
-    files = sorted(os.listdir(directory), key=lambda x: [int(i) for i in re.split(r'\.|_', x) if i.isdigit()])
-    image_files = [f for f in files if f.lower().endswith(('.png'))]
-    audio_files = [f for f in files if f.lower().endswith('.mp3')]
-
-    if len(image_files) == len(audio_files):
-        clips = []
-        for img, aud in zip(image_files, audio_files):
-            image_path = os.path.join(directory, img)
-            audio_path = os.path.join(directory, aud)
-            audio_clip = AudioFileClip(audio_path)
-            silent_clip = AudioClip(lambda t: 0, duration=0.5)
-            extended_audio = concatenate_audioclips([audio_clip, silent_clip])
-            video_clip = ImageClip(image_path).set_duration(extended_audio.duration).set_audio(extended_audio)
-            clips.append(video_clip)
-    else:
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+from audio_cache import AudioCache
+from config import SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES, STILL_CACHE_DIR, STILL_CACHE_MAX_BYTES
+from course_index import pair_slides
+from ffmpeg_tools import get_ffmpeg
+from file_manifest import sha256_file
+from mp3_info import mp3_duration
+from render_pool import estimate_job, render_budget
+
+# Silence appended after every slide
+SLIDE_PADDING = 0.5
+# Part of every segment and still cache key, change it whenever the encoding settings change
+ENCODE_PROFILE = "libx264-ultrafast-crf28-fps1-aac192k-v2"
+# Segments used to be kept next to the slides folder, see create_video_from_segments
+LEGACY_SEGMENT_DIR_NAME = ".segments"
+# Lengths of the cached still tracks, in seconds
+STILL_SECONDS_STEP = 30
+# A new still track is made this much longer than the slide needing it,
+# translations of the same slide rarely differ by more
+STILL_SLACK = 1.25
+# Lengths tried in the cache, from the shortest fitting one
+STILL_LOOKUP_STEPS = 4
+
+# Video tracks of the slide images, shared by every language and version
+still_cache = AudioCache(STILL_CACHE_DIR, STILL_CACHE_MAX_BYTES, suffix=".mp4")
+# Encoded slides (still track + audio), reused by the incremental renders
+segment_cache = AudioCache(SEGMENT_CACHE_DIR, SEGMENT_CACHE_MAX_BYTES, suffix=".mp4")
+_still_locks = {}
+_still_locks_lock = threading.Lock()
+
+def list_slides(directory):
+    """(image, audio) paths of every slide of a folder, paired by slide number."""
+    with os.scandir(directory) as entries:
+        slides = pair_slides(entry.name for entry in entries)
+    slides = [files for _, files in slides if "png" in files or "mp3" in files]
+    if any("png" not in files or "mp3" not in files for files in slides):
         raise ValueError("Invalid number of images and audio files. Should be equal.")
+    return [(os.path.join(directory, files["png"]), os.path.join(directory, files["mp3"])) for files in slides]
+
+def concat_entry(path):
+    escaped = os.path.abspath(path).replace("'", "'\\''")
+    return f"file '{escaped}'\n"
+
+def slide_durations(slides):
+    """Duration of every slide: its audio, read from the mp3 headers, plus `SLIDE_PADDING`."""
+    return [mp3_duration(audio_path) + SLIDE_PADDING for _, audio_path in slides]
+
+def write_concat_lists(still_paths, audio_paths, durations, video_list_path, audio_list_path):
+    """
+    Write the ffmpeg concat demuxer lists of a slideshow.
+
+    Every still track is cut at the duration of its slide from
+    `slide_durations`. The audio list declares the padded duration too, the gap
+    after each mp3 is filled with silence by `aresample=async`, the padding of
+    the last slide by `apad`.
+    """
+    with open(video_list_path, "w", encoding="utf-8") as videos, open(audio_list_path, "w", encoding="utf-8") as audios:
+        for still_path, audio_path, duration in zip(still_paths, audio_paths, durations):
+            videos.write(concat_entry(still_path))
+            videos.write(f"outpoint {duration:.6f}\n")
+            audios.write(concat_entry(audio_path))
+            audios.write(f"duration {duration:.6f}\n")
+
+def create_video(directory, output_path, threads=None):
+    """
+    Render the slides of a chapter (BASE.NN.png + matching mp3) into a single mp4.
+
+    The video track of every slide comes from the still cache (`fetch_still`),
+    shared by every language and version: a slide image is encoded once and the
+    other target languages reuse its track. The chapter is then built in one
+    streaming ffmpeg pass that copies the still tracks through the concat
+    demuxer and only encodes the audio, so memory use does not grow with the
+    length of the chapter. Reviewed chapters are rebuilt slide by slide
+    instead, see `create_video_from_segments`.
+    """
+    slides = list_slides(directory)
+    if not slides:
+        raise ValueError(f"No slides found in {directory}")
+    durations = slide_durations(slides)
+
+    partial_path = f"{output_path}.part.mp4"
+    with tempfile.TemporaryDirectory(prefix="slideshow_") as tmp_dir:
+        still_paths = [os.path.join(tmp_dir, f"{i:04d}.still.mp4") for i in range(len(slides))]
+        with ThreadPoolExecutor(max_workers=min(render_budget.cores, len(slides))) as executor:
+            futures = [executor.submit(metrics.wrap(fetch_still), image_path, sha256_file(image_path), duration,
+                                       still_path, threads)
+                       for (image_path, _), duration, still_path in zip(slides, durations, still_paths)]
+            for future in futures:
+                future.result()
+
+        video_list_path = os.path.join(tmp_dir, "videos.txt")
+        audio_list_path = os.path.join(tmp_dir, "audios.txt")
+        write_concat_lists(still_paths, [audio_path for _, audio_path in slides], durations,
+                           video_list_path, audio_list_path)
+
+        command = [
+            get_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", video_list_path,
+            "-f", "concat", "-safe", "0", "-i", audio_list_path,
+            "-map", "0:v", "-map", "1:a",
+            "-af", "aresample=async=1:first_pts=0,apad",
+            "-shortest",
+            "-c:v", "copy",
+            "-c:a", "aac", "-b:a", "192k",
+            "-movflags", "+faststart",
+            partial_path,
+        ]
+        # Only the audio is encoded, on one thread
+        with render_budget.reserve(estimate_job(len(slides), sum(durations), 1)), \
+                metrics.span("render_video", slides=len(slides)) as span:
+            try:
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as e:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise RuntimeError(f"ffmpeg failed to render {output_path}: {e.stderr.strip()}") from e
+            span.add(bytes_written=os.path.getsize(partial_path))
+
+    os.replace(partial_path, output_path)
+
+def segment_key(image_hash, audio_hash):
+    key = f"{image_hash}:{audio_hash}:{ENCODE_PROFILE}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def still_key(image_hash, seconds):
+    key = f"{image_hash}:{seconds}:{ENCODE_PROFILE}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def still_lock(key):
+    """Lock of a still track, so that concurrent languages wait for one encode instead of repeating it."""
+    with _still_locks_lock:
+        return _still_locks.setdefault(key, threading.Lock())
+
+def encode_still(image_path, seconds, output_path, threads=None):
+    """Encode the video track of a slide: its image held `seconds` seconds at 1 fps, without audio."""
+    partial_path = f"{output_path}.part.mp4"
+    with render_budget.reserve(estimate_job(1, seconds, threads)) as threads:
+        command = [
+            get_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error",
+            "-loop", "1", "-framerate", "1", "-i", image_path,
+            "-map", "0:v",
+            "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p",
+            "-t", str(seconds),
+            "-c:v", "libx264", "-preset", "ultrafast", "-crf", "28", "-threads", str(threads),
+            partial_path,
+        ]
+        with metrics.span("encode_still", seconds=seconds) as span:
+            try:
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as e:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise RuntimeError(f"ffmpeg failed to encode {image_path}: {e.stderr.strip()}") from e
+            span.add(bytes_written=os.path.getsize(partial_path))
+    os.replace(partial_path, output_path)
+
+def fetch_still(image_path, image_hash, duration, output_path, threads=None):
+    """
+    Materialize at `output_path` a still track of the image lasting at least
+    `duration` seconds, from the still cache or encoded and stored there.
+
+    Still tracks are cut by stream copy, so one track serves every shorter
+    slide. Their length is rounded up to `STILL_SECONDS_STEP` with some slack,
+    so that the same slide read in another language usually fits in it too.
+    """
+    needed = math.ceil(duration / STILL_SECONDS_STEP) * STILL_SECONDS_STEP
+    lengths = range(needed, needed + STILL_SECONDS_STEP * STILL_LOOKUP_STEPS, STILL_SECONDS_STEP)
+    with metrics.span("still_cache") as span:
+        hit = any(still_cache.fetch(still_key(image_hash, seconds), output_path) for seconds in lengths)
+        span.add(hits=hit, misses=not hit)
+    if hit:
+        return
+
+    seconds = math.ceil(duration * STILL_SLACK / STILL_SECONDS_STEP) * STILL_SECONDS_STEP
+    key = still_key(image_hash, seconds)
+    with still_lock(key):
+        # Another language may have encoded it while we were waiting
+        if still_cache.fetch(key, output_path):
+            return
+        encode_still(image_path, seconds, output_path, threads)
+        still_cache.store(key, output_path)
+
+def encode_segment(image_path, audio_path, output_path, threads=None, image_hash=None):
+    """
+    Build one slide (still image + its audio + padding silence) as a standalone mp4.
+
+    The video track comes from `fetch_still` and is copied as is, only the
+    audio is encoded.
+    """
+    image_hash = image_hash or sha256_file(image_path)
+    duration = mp3_duration(audio_path) + SLIDE_PADDING
+    partial_path = f"{output_path}.part.mp4"
+    still_path = f"{output_path}.still.mp4"
+    try:
+        fetch_still(image_path, image_hash, duration, still_path, threads)
+        command = [
+            get_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error",
+            "-i", still_path,
+            "-i", audio_path,
+            "-map", "0:v", "-map", "1:a",
+            "-af", "apad",
+            "-t", f"{duration:.6f}",
+            "-c:v", "copy",
+            "-c:a", "aac", "-b:a", "192k",
+            partial_path,
+        ]
+        with metrics.span("encode_segment", segments=1) as span:
+            try:
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as e:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise RuntimeError(f"ffmpeg failed to encode {image_path}: {e.stderr.strip()}") from e
+            span.add(bytes_written=os.path.getsize(partial_path))
+    finally:
+        if os.path.exists(still_path):
+            os.remove(still_path)
+    os.replace(partial_path, output_path)
+
+def concat_segments(segment_paths, output_path, durations=None):
+    """
+    Splice encoded segments into one mp4 without re-encoding them.
+
+    With `durations`, every segment is cut at its duration: the last frame of a
+    1 fps track would otherwise run up to a second past the end of the slide.
+    """
+    partial_path = f"{output_path}.part.mp4"
+    with tempfile.TemporaryDirectory(prefix="segments_") as tmp_dir:
+        list_path = os.path.join(tmp_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            for i, segment_path in enumerate(segment_paths):
+                f.write(concat_entry(segment_path))
+                if durations:
+                    f.write(f"outpoint {durations[i]:.6f}\n")
+        command = [
+            get_ffmpeg(), "-y", "-hide_banner", "-loglevel", "error",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", "-movflags", "+faststart",
+            partial_path,
+        ]
+        with metrics.span("splice_video", segments=len(segment_paths)) as span:
+            try:
+                subprocess.run(command, check=True, capture_output=True, text=True)
+            except subprocess.CalledProcessError as e:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise RuntimeError(f"ffmpeg failed to splice {output_path}: {e.stderr.strip()}") from e
+            span.add(bytes_written=os.path.getsize(partial_path))
+    os.replace(partial_path, output_path)
+
+def create_video_from_segments(directory, output_path, threads=None):
+    """
+    Render a chapter from cached per-slide segments.
+
+    Every slide is built on its own by `encode_segment` and kept in the shared
+    segment cache (under CACHE_DIR), keyed by the image hash, the audio hash
+    and the encoding profile. Only slides whose image or audio changed are
+    built again, side by side within the render budget, then the chapter is
+    spliced with a stream-copy concat.
+
+    Returns:
+        int: The number of segments that had to be encoded.
+    """
+    slides = list_slides(directory)
+    if not slides:
+        raise ValueError(f"No slides found in {directory}")
+
+    legacy_segment_dir = os.path.join(os.path.dirname(os.path.normpath(directory)), LEGACY_SEGMENT_DIR_NAME)
+    if os.path.isdir(legacy_segment_dir):
+        shutil.rmtree(legacy_segment_dir, ignore_errors=True)
+
+    with tempfile.TemporaryDirectory(prefix="segments_") as tmp_dir:
+        segment_paths = []
+        durations = []
+        missing = {}
+        for i, (image_path, audio_path) in enumerate(slides):
+            durations.append(mp3_duration(audio_path) + SLIDE_PADDING)
+            image_hash = sha256_file(image_path)
+            key = segment_key(image_hash, sha256_file(audio_path))
+            segment_path = os.path.join(tmp_dir, f"{i:04d}.mp4")
+            if not segment_cache.fetch(key, segment_path):
+                missing[segment_path] = (image_path, audio_path, image_hash, key)
+            segment_paths.append(segment_path)
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(render_budget.cores, len(missing))) as executor:
+                futures = [executor.submit(metrics.wrap(encode_segment), image_path, audio_path, segment_path, threads,
+                                           image_hash)
+                           for segment_path, (image_path, audio_path, image_hash, _) in missing.items()]
+                for future in futures:
+                    future.result()
+            for segment_path, (_, _, _, key) in missing.items():
+                segment_cache.store(key, segment_path)
 
-    final_clip = concatenate_videoclips(clips)
-    final_clip.write_videofile(output_path, codec='libx264', fps=1.0, threads=4, ffmpeg_params=['-preset', 'ultrafast', '-crf', '28'])
-    final_clip.close()
-    for clip in clips:
-        clip.close()
+        concat_segments(segment_paths, output_path, durations)
+    return len(missing)
@@ -1,147 +1,35 @@
-import sys
 import os
-import re
-import yaml
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from tqdm import tqdm
 
-from image_audio_2_video import create_video
-from txt_2_mp3 import text_to_speech
+import metrics
+from cli_helpers import (get_latest_version, print_separator, select_directory, select_languages,
+                         select_source_version)
 from config import voice_ids
+from course_index import get_index, version_language, SLIDES_DIR_NAME
 from supported_languages import *
-from pptx_translator import translate_pptx
-from mp3_2_txt import TranscriptionModel
-from txt_translation import translate_txt_to 
+from pipeline_scheduler import Task, run_tasks, IO, CPU
+from pdf_rasterizer import export_slides, missing_export_tools, slides_manifest_path
+from render_pool import render_budget
 
 # Root directory
 ROOT_DIR = "../../../Documents/"  # Replace this with your actual root directory path
 
-numbered_languages = list(enumerate(language_codes.items(), 1))
+# The stages (pptx_translator, txt_translation, mp3_2_txt, txt_2_mp3,
+# image_audio_2_video) are imported by the functions using them: their API
+# clients and libraries are only loaded once a task actually runs.
 
-def print_separator(char="-", length=40):
-    print(char * length)
+def prepare_target_folders(course_dir, source_lang, target_langs, source_version, version_policy=None):
+    """
+    Create or pick the version folder of every target language.
 
-def print_languages():
-    print("\nAvailable languages:")
-    print_separator()
-    for number, (code, name) in numbered_languages:
-        print(f"{number:2}. {name:20} ({code})")
-    print_separator()
-
-def get_language_choice(prompt, multiple=False, default=None):
-    while True:
-        if default:
-            prompt = f"{prompt} (default: {default}): "
-        try:
-            user_input = input(prompt).strip()
-            if default and user_input == "":
-                return default if not multiple else [default]
-            
-            if multiple:
-                choices = user_input.split(',')
-                selected = [numbered_languages[int(choice.strip()) - 1][1][0] for choice in choices]
-                if len(selected) == len(set(selected)):  # Check for duplicates
-                    return selected
-                print("Duplicate selections are not allowed. Please try again.")
-            else:
-                choice = int(user_input)
-                if 1 <= choice <= len(numbered_languages):
-                    return numbered_languages[choice - 1][1][0]  # Return the language code
-            print("Invalid number(s). Please try again.")
-        except (ValueError, IndexError):
-            print("Please enter valid number(s).")
-
-def select_directory(ROOT_DIR):
-    subdirs = [d for d in os.listdir(ROOT_DIR) if os.path.isdir(os.path.join(ROOT_DIR, d))]
-    subdirs = sorted(subdirs)
-    
-    if not subdirs:
-        print("No subdirectories found in the root directory.")
-        sys.exit(1)
-    
-    print("\nAvailable courses (subdirectories):")
-    print_separator()
-    for i, subdir in enumerate(subdirs, 1):
-        print(f"{i:2}. {subdir}")
-    print_separator()
-    
-    while True:
-        try:
-            choice = int(input("Enter the number for the course (subdirectory): "))
-            if 1 <= choice <= len(subdirs):
-                return os.path.join(ROOT_DIR, subdirs[choice - 1])
-            print("Invalid number. Please try again.")
-        except ValueError:
-            print("Please enter a valid number.")
-
-def get_latest_version(directory):
-    version_dirs = [d for d in os.listdir(directory) if re.match(r'v\d{3}', d)]
-    if not version_dirs:
-        return None
-    return max(version_dirs)
-
-def select_source_version(course_dir, source_lang):
-    lang_dir = os.path.join(course_dir, source_lang)
-    if not os.path.exists(lang_dir):
-        print(f"No directory found for language: {source_lang}")
-        return None
-
-    latest_version = get_latest_version(lang_dir)
-    if not latest_version:
-        print(f"No version folders found for language: {source_lang}")
-        return None
-
-    print(f"\nLatest version found: {latest_version}")
-    use_latest = input("Do you want to use this version? (y/n): ").lower().strip()
-
-    if use_latest == 'y':
-        return latest_version
-
-    print("\nAvailable versions:")
-    versions = sorted([d for d in os.listdir(lang_dir) if re.match(r'v\d{3}', d)])
-    for i, version in enumerate(versions, 1):
-        print(f"{i:2}. {version}")
-
-    while True:
-        try:
-            choice = int(input("Enter the number for the version you want to use: "))
-            if 1 <= choice <= len(versions):
-                return versions[choice - 1]
-            print("Invalid number. Please try again.")
-        except ValueError:
-            print("Please enter a valid number.")
-
-def get_original_language(course_dir):
-    course_yaml = os.path.join(course_dir, 'course.yml')
-    if os.path.exists(course_yaml):
-        with open(course_yaml, 'r') as file:
-            try:
-                course_data = yaml.safe_load(file)
-                return course_data.get('original_language')
-            except yaml.YAMLError:
-                print("Error reading course.yml file.")
-    return None
-
-def select_languages(course_dir):
-    print_languages()
-    
-    original_lang = get_original_language(course_dir)
-    if original_lang:
-        print(f"\nOriginal language found in course.yml: {language_codes.get(original_lang, original_lang)} ({original_lang})")
-        use_original = input("Do you want to use this as the source language? (y/n): ").lower().strip()
-        if use_original == 'y':
-            source_lang = original_lang
-        else:
-            source_lang = get_language_choice("\nEnter the number for the source language")
-    else:
-        source_lang = get_language_choice("\nEnter the number for the source language")
-    
-    while True:
-        target_langs = get_language_choice("Enter the numbers for the target languages (comma-separated): ", multiple=True)
-        if source_lang not in target_langs:
-            return source_lang, target_langs
-        print("Source language cannot be in target languages. Please try again.")
-def prepare_target_folders(course_dir, source_lang, target_langs, source_version):
+    Args:
+        version_policy (str): What to do when a target language already has
+            versions: "latest" reuses the latest one, "new" creates the next
+            one, None asks the user.
+    """
     def copy_folder_structure(src, dst):
         for item in os.listdir(src):
             s = os.path.join(src, item)
@@ -172,7 +60,10 @@ def prepare_target_folders(course_dir, source_lang, target_langs, source_version
             # Ask user if they want to use the last version or create a new one
             latest_version = get_latest_version(target_lang_path)
             if latest_version:
-                use_latest = input(f"Latest version for {target_lang} is {latest_version}. Use this version? (y/n): ").lower().strip()
+                if version_policy is None:
+                    use_latest = input(f"Latest version for {target_lang} is {latest_version}. Use this version? (y/n): ").lower().strip()
+                else:
+                    use_latest = 'y' if version_policy == "latest" else 'n'
                 if use_latest == 'y':
                     new_version_path = os.path.join(target_lang_path, latest_version)
                     print(f"Using existing version {latest_version} for {target_lang}")
@@ -193,109 +84,311 @@ def prepare_target_folders(course_dir, source_lang, target_langs, source_version
     return target_version_paths
 
 
+@lru_cache(maxsize=None)
+def report_missing_export_tools(tools):
+    print(f"Error: slides are not exported, {', '.join(tools)} not found on the PATH")
+
 def convert_pptx_to_png(pptx_path):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    bash_script_path = os.path.join(current_dir, 'pptx_2_png.sh')
-    if not os.path.exists(bash_script_path):
-        print(f"Error: Bash script not found at {bash_script_path}")
+    """Export a deck to slides/BASE.NN.png, rendering its pages in parallel and skipping unchanged ones."""
+    missing_tools = missing_export_tools()
+    if missing_tools:
+        # Reported once for the whole run, not once per deck
+        report_missing_export_tools(missing_tools)
         return
-
-    command = ['/bin/bash', bash_script_path, pptx_path]
     try:
-        subprocess.run(command, check=True, text=True, capture_output=True)
+        export_slides(pptx_path)
     except subprocess.CalledProcessError as e:
-        print(f"Error running the script: {e}")
+        print(f"Error exporting {pptx_path}: {e.stderr or e}")
+    except OSError as e:
+        print(f"Error exporting {pptx_path}: {e}")
+
+def list_chapters(version_path):
+    return get_index(version_path).chapters()
+
+def refresh_indexes(*version_paths):
+    """Pick up the changes made to the version folders since they were indexed."""
+    for version_path in version_paths:
+        get_index(version_path).refresh()
+
+def slides_are_outdated(pptx_path):
+    """Return True if the pptx has no exported slides yet, or was modified after the export."""
+    slide_path = os.path.join(os.path.dirname(pptx_path), 'slides')
+    base_name = os.path.splitext(os.path.basename(pptx_path))[0]
+    if not os.path.isdir(slide_path):
+        return True
+    # Unchanged pages keep their old mtime, the manifest is rewritten by every export
+    manifest_path = slides_manifest_path(slide_path, base_name)
+    if os.path.exists(manifest_path):
+        return os.path.getmtime(pptx_path) > os.path.getmtime(manifest_path)
+    png_files = [f for f in os.listdir(slide_path) if f.startswith(f"{base_name}.") and f.endswith('.png')]
+    if not png_files:
+        return True
+    oldest_png = min(os.path.getmtime(os.path.join(slide_path, f)) for f in png_files)
+    return os.path.getmtime(pptx_path) > oldest_png
+
+def translate_chapter_pptx(source_version_path, subfolder, source, target_version_path, target):
+    pptx_file = f"{subfolder}.pptx"
+    if not get_index(source_version_path).exists(subfolder, pptx_file):
+        return None
+    source_pptx_path = os.path.join(source_version_path, subfolder, pptx_file)
 
-def translate_pptx_in_subfolders(source_version_path, source, target_version_path, target):
-    subfolders = [f for f in os.listdir(source_version_path) if os.path.isdir(os.path.join(source_version_path, f)) and "-DNT" not in f]
-    subfolders = sorted(subfolders)
-    for subfolder in tqdm(subfolders, desc=f"Translating PowerPoint", unit="folder"):
-        subfolder_path = os.path.join(source_version_path, subfolder)
-        pptx_file = f"{subfolder}.pptx"
-        source_pptx_path = os.path.join(subfolder_path, pptx_file)
-
-        if os.path.exists(source_pptx_path):
-            target_subfolder_path = os.path.join(target_version_path, subfolder)
+    target_index = get_index(target_version_path)
+    target_subfolder_path = os.path.join(target_version_path, subfolder)
+    if not target_index.is_dir(subfolder):
+        os.makedirs(target_subfolder_path, exist_ok=True)
+    target_pptx_path = os.path.join(target_subfolder_path, pptx_file)
+
+    if not target_index.exists(subfolder, pptx_file):
+        from pptx_translator import translate_pptx
+
+        target_version = os.path.basename(os.path.normpath(target_version_path))
+        translate_pptx(source_pptx_path, target_pptx_path, source, target, target_version, use_exception=True,
+                       batched=True, paragraphs=True)
+        target_index.add(target_pptx_path)
+    else:
+        print(f"Skipping existing PPTX: {target_pptx_path}")
+    return target_pptx_path
+
+def translate_chapter_pptx_to_many(source_version_path, subfolder, source, targets, target_version_paths):
+    """Translate the deck of a chapter into every target language missing it, in one pass."""
+    pptx_file = f"{subfolder}.pptx"
+    if not get_index(source_version_path).exists(subfolder, pptx_file):
+        return
+    source_pptx_path = os.path.join(source_version_path, subfolder, pptx_file)
+
+    outputs = {}
+    for target, target_version_path in zip(targets, target_version_paths):
+        target_index = get_index(target_version_path)
+        target_subfolder_path = os.path.join(target_version_path, subfolder)
+        if not target_index.is_dir(subfolder):
             os.makedirs(target_subfolder_path, exist_ok=True)
-            target_pptx_path = os.path.join(target_subfolder_path, pptx_file)
+        target_pptx_path = os.path.join(target_subfolder_path, pptx_file)
+        if not target_index.exists(subfolder, pptx_file):
+            outputs[target] = (target_pptx_path, os.path.basename(os.path.normpath(target_version_path)))
+        else:
+            print(f"Skipping existing PPTX: {target_pptx_path}")
+    if outputs:
+        from pptx_translator import translate_pptx_to_many
+
+        translate_pptx_to_many(source_pptx_path, outputs, source, use_exception=True, paragraphs=True)
+        for target, target_version_path in zip(targets, target_version_paths):
+            if target in outputs:
+                get_index(target_version_path).add(outputs[target][0])
+
+def export_chapter_slides(target_version_path, subfolder):
+    target_index = get_index(target_version_path)
+    target_pptx_path = os.path.join(target_version_path, subfolder, f"{subfolder}.pptx")
+    if target_index.exists(subfolder, f"{subfolder}.pptx") and slides_are_outdated(target_pptx_path):
+        convert_pptx_to_png(target_pptx_path)
+        target_index.refresh(subfolder)
 
-            if not os.path.exists(target_pptx_path):
-                target_version = os.path.basename(os.path.normpath(target_version_path))
-                translate_pptx(source_pptx_path, target_pptx_path, source, target, target_version, use_exception=True)
-                convert_pptx_to_png(target_pptx_path)
-            else:
-                print(f"Skipping existing PPTX: {target_pptx_path}")
+def translate_pptx_in_subfolders(source_version_path, source, target_version_path, target):
+    refresh_indexes(source_version_path, target_version_path)
+    for subfolder in tqdm(list_chapters(source_version_path), desc=f"Translating PowerPoint", unit="folder"):
+        target_pptx_path = translate_chapter_pptx(source_version_path, subfolder, source, target_version_path, target)
+        if target_pptx_path:
+            export_chapter_slides(target_version_path, subfolder)
+
+def transcribe_chapter(source_version_path, subfolder):
+    """
+    Write the transcript of every source audio lacking one.
+
+    Transcripts come from the transcript cache when the same audio content was
+    already transcribed (in another chapter, version or under another name),
+    only new recordings are sent to Whisper.
+    """
+    source_index = get_index(source_version_path)
+    source_slide_path = os.path.join(source_version_path, subfolder, SLIDES_DIR_NAME)
+
+    if source_index.is_dir(subfolder, SLIDES_DIR_NAME):
+        files = source_index.files(subfolder, SLIDES_DIR_NAME)
+        txt_files = [os.path.splitext(f)[0] for f in files if f.endswith('.txt')]
+        mp3_files = [os.path.splitext(f)[0] for f in files if f.endswith('.mp3')]
+
+        missing_transcripts = set(mp3_files) - set(txt_files)
+        if missing_transcripts:
+            from mp3_2_txt import TranscriptionModel
+            from transcript_cache import whisper_language
+
+            language = version_language(source_version_path)
+            model = TranscriptionModel(source_slide_path, whisper_language(language) if language in language_codes else None)
+            for file in tqdm(missing_transcripts, desc=f"Transcribing audio for {subfolder}", unit="file"):
+                audio_path = f"{source_slide_path}/{file}.mp3"
+                model.load_and_transcribe_audio(audio_path)
+                source_index.add(f"{source_slide_path}/{file}.txt")
 
 def transcript_if_necessary(source_version_path):
-    subfolders = [f for f in os.listdir(source_version_path) if os.path.isdir(os.path.join(source_version_path, f)) and "-DNT" not in f]
-    for subfolder in sorted(subfolders):
-        subfolder_path = os.path.join(source_version_path, subfolder)
-        source_slide_path = os.path.join(subfolder_path, 'slides')
-
-        if os.path.isdir(source_slide_path):
-            files = os.listdir(source_slide_path)
-            txt_files = [os.path.splitext(f)[0] for f in files if f.endswith('.txt')]
-            mp3_files = [os.path.splitext(f)[0] for f in files if f.endswith('.mp3')]
-
-            missing_transcripts = set(mp3_files) - set(txt_files)
-            if missing_transcripts:
-                model = TranscriptionModel(source_slide_path)
-                for file in tqdm(missing_transcripts, desc=f"Transcribing audio for {subfolder}", unit="file"):
-                    audio_path = f"{source_slide_path}/{file}.mp3"
-                    model.load_and_transcribe_audio(audio_path)
-
-def translate_transcripts(source_version_path, target, target_version_path):
-    subfolders = [f for f in os.listdir(source_version_path) if os.path.isdir(os.path.join(source_version_path, f)) and "-DNT" not in f]
-    for subfolder in sorted(subfolders):
-        subfolder_path = os.path.join(source_version_path, subfolder)
-        source_slide_path = os.path.join(subfolder_path, 'slides')
-        if os.path.isdir(source_slide_path):
-            target_slide_path = os.path.join(target_version_path, subfolder, 'slides')
+    refresh_indexes(source_version_path)
+    for subfolder in list_chapters(source_version_path):
+        transcribe_chapter(source_version_path, subfolder)
+
+def find_untranslated_transcripts(source_version_path, subfolder, target_version_path):
+    source_index = get_index(source_version_path)
+    source_slide_path = os.path.join(source_version_path, subfolder, SLIDES_DIR_NAME)
+    pending = []
+    if source_index.is_dir(subfolder, SLIDES_DIR_NAME):
+        target_index = get_index(target_version_path)
+        target_slide_path = os.path.join(target_version_path, subfolder, SLIDES_DIR_NAME)
+        if not target_index.is_dir(subfolder, SLIDES_DIR_NAME):
             os.makedirs(target_slide_path, exist_ok=True)
+            target_index.add(target_slide_path)
 
-            txt_files = [f for f in os.listdir(source_slide_path) if f.endswith('.txt')]
-            for filename in tqdm(txt_files, desc=f"Translating transcripts for {subfolder}", unit="file"):
-                source_file_path = os.path.join(source_slide_path, filename)
-                target_file_path = os.path.join(target_slide_path, filename)
+        txt_files = source_index.files(subfolder, SLIDES_DIR_NAME, suffix='.txt')
+        for filename in txt_files:
+            source_file_path = os.path.join(source_slide_path, filename)
+            target_file_path = os.path.join(target_slide_path, filename)
 
-                if not os.path.exists(target_file_path):
-                    with open(source_file_path, 'r', encoding='utf-8') as source_file:
-                        content = source_file.read()
-                    translated_content = translate_txt_to(content, target)
+            if not target_index.exists(subfolder, SLIDES_DIR_NAME, filename):
+                pending.append((source_file_path, target_file_path))
+            else:
+                print(f"Skipping existing transcript: {target_file_path}")
+    return pending
+
+def translate_transcript_files(pending, target, target_version_path, source=None):
+    from txt_translation import translate_texts_to
+
+    # Every chunk of every transcript is translated concurrently
+    contents = []
+    for source_file_path, _ in pending:
+        with open(source_file_path, 'r', encoding='utf-8') as source_file:
+            contents.append(source_file.read())
+    translated_contents = translate_texts_to(contents, target, source_language=source)
+
+    for (_, target_file_path), translated_content in zip(pending, translated_contents):
+        with open(target_file_path, 'w', encoding='utf-8') as target_file:
+            target_file.write(translated_content)
+        get_index(target_version_path).add(target_file_path)
+
+def translate_chapter_transcripts(source_version_path, subfolder, target, target_version_path):
+    pending = find_untranslated_transcripts(source_version_path, subfolder, target_version_path)
+    translate_transcript_files(pending, target, target_version_path, version_language(source_version_path))
+
+def translate_chapter_transcripts_to_many(source_version_path, subfolder, targets, target_version_paths):
+    """Translate the transcripts of a chapter into every target language missing them, in one pass."""
+    # Source transcript -> {target: target transcript}
+    pending = {}
+    for target, target_version_path in zip(targets, target_version_paths):
+        for source_file_path, target_file_path in find_untranslated_transcripts(source_version_path, subfolder,
+                                                                                target_version_path):
+            pending.setdefault(source_file_path, {})[target] = target_file_path
+
+    # Transcripts missing in the same languages are translated together
+    groups = {}
+    for source_file_path, target_files in pending.items():
+        groups.setdefault(tuple(sorted(target_files)), []).append(source_file_path)
+
+    from txt_translation import translate_texts_to_many
+
+    for group_targets, source_file_paths in groups.items():
+        contents = []
+        for source_file_path in source_file_paths:
+            with open(source_file_path, 'r', encoding='utf-8') as source_file:
+                contents.append(source_file.read())
+        translated_contents = translate_texts_to_many(contents, list(group_targets),
+                                                      source_language=version_language(source_version_path))
+        for target in group_targets:
+            target_index = get_index(target_version_paths[targets.index(target)])
+            for source_file_path, translated_content in zip(source_file_paths, translated_contents[target]):
+                with open(pending[source_file_path][target], 'w', encoding='utf-8') as target_file:
+                    target_file.write(translated_content)
+                target_index.add(pending[source_file_path][target])
 
-                    with open(target_file_path, 'w', encoding='utf-8') as target_file:
-                        target_file.write(translated_content)
+def translate_transcripts(source_version_path, target, target_version_path):
+    refresh_indexes(source_version_path, target_version_path)
+    pending = []
+    for subfolder in list_chapters(source_version_path):
+        pending.extend(find_untranslated_transcripts(source_version_path, subfolder, target_version_path))
+    translate_transcript_files(pending, target, target_version_path, version_language(source_version_path))
+
+def generate_chapter_audios(target_version_path, subfolder):
+    from txt_2_mp3 import text_to_speech
+
+    target_index = get_index(target_version_path)
+    target_slide_path = os.path.join(target_version_path, subfolder, SLIDES_DIR_NAME)
+    if target_index.is_dir(subfolder, SLIDES_DIR_NAME):
+        for filename in tqdm(target_index.files(subfolder, SLIDES_DIR_NAME), desc=f"Generating audio for {subfolder}", unit="file"):
+            if filename.endswith('.txt'):
+                voice = filename.split('.')[-2].split('_')[-1]
+                filepath = f"{target_slide_path}/{filename}"
+                audio_filename = f"{os.path.splitext(filename)[0]}.mp3"
+                audio_filepath = f"{target_slide_path}/{audio_filename}"
+                if not target_index.exists(subfolder, SLIDES_DIR_NAME, audio_filename):
+                    text_to_speech(filepath, voice_ids[voice])
+                    target_index.add(audio_filepath)
                 else:
-                    print(f"Skipping existing transcript: {target_file_path}")
+                    print(f"Skipping existing audio: {audio_filepath}")
 
 def generate_translated_audios(target_version_path):
-    subfolders = [f for f in os.listdir(target_version_path) if os.path.isdir(os.path.join(target_version_path, f)) and "-DNT" not in f]
-    for subfolder in sorted(subfolders):
-        subfolder_path = os.path.join(target_version_path, subfolder)
-        target_slide_path = os.path.join(subfolder_path, 'slides')
-        if os.path.isdir(target_slide_path):
-            for filename in tqdm(os.listdir(target_slide_path), desc=f"Generating audio for {subfolder}", unit="file"):
-                if filename.endswith('.txt'):
-                    voice = filename.split('.')[-2].split('_')[-1]
-                    filepath = f"{target_slide_path}/{filename}"
-                    audio_filepath = f"{target_slide_path}/{os.path.splitext(filename)[0]}.mp3"
-                    if not os.path.exists(audio_filepath):
-                        text_to_speech(filepath, voice_ids[voice])
-                    else:
-                        print(f"Skipping existing audio: {audio_filepath}")
+    refresh_indexes(target_version_path)
+    for subfolder in list_chapters(target_version_path):
+        generate_chapter_audios(target_version_path, subfolder)
+
+def generate_chapter_video(target_version_path, subfolder):
+    target_index = get_index(target_version_path)
+    subfolder_path = os.path.join(target_version_path, subfolder)
+    target_slide_path = os.path.join(subfolder_path, SLIDES_DIR_NAME)
+    if target_index.is_dir(subfolder, SLIDES_DIR_NAME):
+        video_path = os.path.join(subfolder_path, f"{subfolder}.mp4")
+        if not target_index.exists(subfolder, f"{subfolder}.mp4"):
+            from image_audio_2_video import create_video
+
+            create_video(target_slide_path, video_path)
+            target_index.add(video_path)
+        else:
+            print(f"Skipping existing video: {video_path}")
 
 def generate_translated_videos(target_version_path):
-    subfolders = [f for f in os.listdir(target_version_path) if os.path.isdir(os.path.join(target_version_path, f)) and "-DNT" not in f]
-    subfolders = sorted(subfolders)
-    for subfolder in tqdm(subfolders, desc=f"Generating videos", unit="folder"):
-        subfolder_path = os.path.join(target_version_path, subfolder)
-        target_slide_path = os.path.join(subfolder_path, 'slides')
-        if os.path.isdir(target_slide_path):
-            video_path = os.path.join(subfolder_path, f"{subfolder}.mp4")
-            if not os.path.exists(video_path):
-                create_video(target_slide_path, video_path)
-            else:
-                print(f"Skipping existing video: {video_path}")
+    refresh_indexes(target_version_path)
+    chapters = list_chapters(target_version_path)
+    if not chapters:
+        return
+
+    # The chapters are encoded side by side, each one waits for its share of the render budget
+    with ThreadPoolExecutor(max_workers=min(render_budget.cores, len(chapters))) as executor:
+        futures = [executor.submit(metrics.wrap(generate_chapter_video), target_version_path, subfolder)
+                   for subfolder in chapters]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Generating videos", unit="folder"):
+            future.result()
+
+def build_pipeline(source_version_path, source, targets, target_version_paths, name_prefix=""):
+    """
+    Build the per-chapter, per-language dependency graph of the translation:
+
+        pptx -> translated pptx -> png
+        mp3 -> txt -> translated txt -> mp3
+        png + mp3 -> mp4
+
+    The source transcription of a chapter is shared by every target language,
+    and its deck and transcripts are translated into all the target languages
+    at once. `name_prefix` keeps task names unique when several courses share
+    a graph.
+    """
+    course = os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(source_version_path))))
+    refresh_indexes(source_version_path, *target_version_paths)
+    tasks = []
+    for subfolder in list_chapters(source_version_path):
+        transcribe_task = f"{name_prefix}transcribe:{subfolder}"
+        tags = {"course": course, "chapter": subfolder, "language": source}
+        tasks.append(Task(transcribe_task, transcribe_chapter, (source_version_path, subfolder), IO, tags=tags))
+
+        pptx_task = f"{name_prefix}pptx:{subfolder}"
+        txt_task = f"{name_prefix}txt:{subfolder}"
+        tags = {"course": course, "chapter": subfolder, "language": "+".join(targets)}
+        tasks.append(Task(pptx_task, translate_chapter_pptx_to_many,
+                          (source_version_path, subfolder, source, targets, target_version_paths), IO, tags=tags))
+        tasks.append(Task(txt_task, translate_chapter_transcripts_to_many,
+                          (source_version_path, subfolder, targets, target_version_paths), IO, [transcribe_task], tags))
+
+        for target, target_version_path in zip(targets, target_version_paths):
+            prefix = f"{name_prefix}{target}:{subfolder}"
+            tags = {"course": course, "chapter": subfolder, "language": target}
+            tasks.append(Task(f"{prefix}:png", export_chapter_slides,
+                              (target_version_path, subfolder), CPU, [pptx_task], tags))
+            tasks.append(Task(f"{prefix}:mp3", generate_chapter_audios,
+                              (target_version_path, subfolder), IO, [txt_task], tags))
+            tasks.append(Task(f"{prefix}:mp4", generate_chapter_video,
+                              (target_version_path, subfolder), CPU, [f"{prefix}:png", f"{prefix}:mp3"], tags))
+    return tasks
 
 if __name__ == "__main__":
     print("Welcome to the Course, Language, and Version Selection Tool")
@@ -317,21 +410,14 @@ if __name__ == "__main__":
     
     source_version_path = os.path.join(selected_dir, source, source_version)
     target_version_paths = prepare_target_folders(selected_dir, source, targets, source_version)
-    for i, target in enumerate(targets):
-        target_version_path = target_version_paths[i]
-        
-        print(f"\nProcessing target language: {language_codes[target]} ({target})")
-        print_separator()
 
-        translate_pptx_in_subfolders(source_version_path, source, target_version_path, target)
-        
-        transcript_if_necessary(source_version_path)
-        translate_transcripts(source_version_path, target, target_version_path)
-        
-        generate_translated_audios(target_version_path)
-        generate_translated_videos(target_version_path)
-        
-        print(f"Completed processing for {language_codes[target]} ({target})")
+    # All chapters and target languages progress at the same time
+    failures = run_tasks(build_pipeline(source_version_path, source, targets, target_version_paths))
+    if failures:
+        print("\nSome steps did not complete:")
+        print_separator()
+        for name, reason in sorted(failures.items()):
+            print(f"{name}: {reason}")
         print_separator()
 
     print("\nTranslation process completed for all target languages.")
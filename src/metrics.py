@@ -0,0 +1,131 @@
+"""
+Per-stage metrics and tracing of the translation pipeline.
+
+Every instrumented call opens a span:
+
+    with metrics.span("tts", provider="elevenlabs") as span:
+        ...
+        span.add(characters=len(text), bytes_written=size)
+
+A span records its latency, whether it failed, and any counter added to it
+(retries, tokens_in, tokens_out, characters, bytes_written, ...). It is tagged
+with the course/chapter/language set by the enclosing `metrics.tagged(...)`.
+
+When METRICS_TRACE_PATH is set, every span is appended to that file as one
+JSON line. When METRICS_PROM_PATH is set, a Prometheus textfile summary
+aggregated by stage and provider is written there at exit (or when
+`write_prometheus` is called).
+"""
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+TRACE_PATH = os.getenv("METRICS_TRACE_PATH")
+PROM_PATH = os.getenv("METRICS_PROM_PATH")
+
+_tags = contextvars.ContextVar("metrics_tags", default={})
+_lock = threading.Lock()
+# (stage, provider) -> aggregated counters
+_summary = defaultdict(lambda: defaultdict(float))
+
+
+class Span:
+    def __init__(self, stage, provider, tags):
+        self.stage = stage
+        self.provider = provider
+        self.tags = tags
+        self.counters = defaultdict(float)
+
+    def add(self, **counters):
+        for name, value in counters.items():
+            self.counters[name] += value
+
+
+@contextmanager
+def tagged(**tags):
+    """Tag every span opened inside the block, e.g. with course, chapter and language."""
+    token = _tags.set({**_tags.get(), **{key: value for key, value in tags.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def wrap(fn):
+    """Bind `fn` to the current tags, for work submitted to a thread pool."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def span(stage, provider=None, **counters):
+    current = Span(stage, provider, dict(_tags.get()))
+    current.add(**counters)
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield current
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(current, time.perf_counter() - start, ok)
+
+
+def record(current, seconds, ok):
+    entry = {
+        "ts": time.time(),
+        "stage": current.stage,
+        "provider": current.provider,
+        "seconds": round(seconds, 6),
+        "ok": ok,
+        **current.tags,
+        **{name: value for name, value in current.counters.items()},
+    }
+    with _lock:
+        summary = _summary[(current.stage, current.provider or "")]
+        summary["calls"] += 1
+        summary["errors"] += 0 if ok else 1
+        summary["seconds"] += seconds
+        summary["max_seconds"] = max(summary["max_seconds"], seconds)
+        for name, value in current.counters.items():
+            summary[name] += value
+        if TRACE_PATH:
+            with open(TRACE_PATH, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+
+def summary():
+    """A copy of the aggregated counters, keyed by (stage, provider)."""
+    with _lock:
+        return {key: dict(values) for key, values in _summary.items()}
+
+
+def write_prometheus(path=PROM_PATH):
+    """Write the aggregated counters in the Prometheus textfile format."""
+    if not path:
+        return
+    lines = []
+    metric_names = sorted({name for values in summary().values() for name in values})
+    for name in metric_names:
+        metric = f"pipeline_stage_{name}"
+        kind = "gauge" if name == "max_seconds" else "counter"
+        lines.append(f"# TYPE {metric} {kind}")
+        for (stage, provider), values in sorted(summary().items()):
+            if name in values:
+                lines.append(f'{metric}{{stage="{stage}",provider="{provider}"}} {values[name]:g}')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+atexit.register(write_prometheus)
@@ -1,18 +1,22 @@
 import os
-import re
-import time
+import shutil
+import tempfile
 import requests
 import openai
-import tiktoken
-from pydub import AudioSegment
+import metrics
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from openai.error import RateLimitError, Timeout, APIError
+from openai.error import APIConnectionError, OpenAIError, RateLimitError, ServiceUnavailableError, Timeout, TryAgain
+from api_governor import Failure, Governor, RetriesExhaustedError, classify_status
+from rate_limiter import RateLimiter
+from text_chunker import chunk_text, count_tokens, TRANSCRIPT, PARAGRAPH
+from ffmpeg_tools import detect_silences, cut_audio
+from file_manifest import sha256_file
+from transcript_cache import WHISPER_MODEL, transcript_cache
 
 def num_tokens_from_string(string: str, encoding_name: str) -> int:
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
+    return count_tokens(string, encoding_name)
 
 def split_text_into_chunks(text: str, MAX_TOKENS: int = 1000,
         ENCODING_NAME: str = "cl100k_base", transcript: bool = False) -> list:
@@ -23,35 +27,55 @@ def split_text_into_chunks(text: str, MAX_TOKENS: int = 1000,
         text (str): The input text to be split.
         MAX_TOKENS (int): The maximum token count for each chunk (default: 1000).
         ENCODING_NAME (str): The encoding name to be used for tokenization (default: "cl100k_base").
+        transcript (bool): Cut between sentences instead of between lines (default: False).
 
     Returns:
         list: The list of chunks.
     """
+    return chunk_text(text, MAX_TOKENS, TRANSCRIPT if transcript else PARAGRAPH, ENCODING_NAME)
+
+def classify_openai_error(e):
+    if isinstance(e, (Timeout, APIConnectionError, TryAgain)):
+        return Failure(f"connection error ({str(e)})")
+    if isinstance(e, OpenAIError) and e.http_status:
+        return classify_status(e.http_status, e.headers)
+    if isinstance(e, (RateLimitError, ServiceUnavailableError)):
+        return Failure(str(e), throttled=isinstance(e, RateLimitError))
+    return None
+
+# Shared by every transcription of the process
+openai_governor = Governor(
+    "openai",
+    RateLimiter(int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", 50)), max_concurrent=int(os.getenv("OPENAI_MAX_CONCURRENT", 4))),
+    classify_openai_error,
+)
+
+def plan_cuts(duration, silences, max_chunk_duration):
+    """
+    Choose where to cut an audio so that no chunk is longer than `max_chunk_duration`.
+
+    Each cut is placed in the middle of the last silence that ends a chunk short
+    enough, and only falls back to a hard cut when a whole window has no silence.
+
+    Returns:
+        list: (start, end) pairs covering [0, duration].
+    """
     chunks = []
-    current_chunk = ""
-
-    if transcript:
-        sentences = re.split(r'\.\s+', text)  
-        for sentence in sentences:
-            sentence_tokens = num_tokens_from_string(sentence, ENCODING_NAME)
-            if sentence_tokens + num_tokens_from_string(current_chunk, ENCODING_NAME) <= MAX_TOKENS:
-                current_chunk += sentence + ". "
-            else:
-                chunks.append(current_chunk.strip())
-                current_chunk = sentence
-    else:
-        paragraphs = text.splitlines()  
-        for paragraph in paragraphs:
-            paragraph_tokens = num_tokens_from_string(paragraph, ENCODING_NAME)
-
-            if paragraph_tokens + num_tokens_from_string(current_chunk, ENCODING_NAME) <= MAX_TOKENS:
-                current_chunk += paragraph + "\n"  
-            else:
-                chunks.append(current_chunk.strip())
-                current_chunk = paragraph
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
+    start = 0.0
+    while duration - start > max_chunk_duration:
+        limit = start + max_chunk_duration
+        cut = None
+        for silence_start, silence_end in silences:
+            middle = (silence_start + silence_end) / 2
+            if start < middle <= limit:
+                cut = middle
+            elif middle > limit:
+                break
+        if cut is None:
+            cut = limit
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, duration))
     return chunks
 
 class TranscriptionModel:
@@ -61,15 +85,31 @@ class TranscriptionModel:
 
     AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.webm', '.mp4', '.mpga', '.mpeg')
     MAX_SUPPORTED_AUDIO_SIZE_MB = 20  
+    MAX_CONCURRENT_TRANSCRIPTIONS = 4
 
     load_dotenv()
     openai.api_key = os.getenv("API_KEY_OPENAI")
+    if os.getenv("OPENAI_API_BASE"):
+        openai.api_base = os.getenv("OPENAI_API_BASE")
 
-    def __init__(self, output_dir):
+    def __init__(self, output_dir, language=None):
         self.transcript = None
         self.original_audio_file = []
         self.audio_files = []
+        # (start, end) seconds of every chunk of audio_files, None for a whole file
+        self.audio_segments = []
+        self.audio_hash = None
+        self.chunk_dir = None
         self.output_dir = output_dir
+        # ISO-639-1 code of the spoken language, None lets Whisper detect it
+        self.language = language
+
+    def lookup(self, segment=None):
+        """The cached transcript of the loaded audio (or of one of its chunks), None on a miss."""
+        with metrics.span("transcript_cache") as span:
+            transcript = transcript_cache.get(self.audio_hash, WHISPER_MODEL, self.language, segment)
+            span.add(hits=transcript is not None, misses=transcript is None)
+        return transcript
 
     def save_text(self, text: str, suffix: str):
         """
@@ -92,6 +132,9 @@ class TranscriptionModel:
         """
         Loads an audio file from the specified file path.
 
+        When the transcript of its content is already cached, it is loaded in
+        `transcript` and the file is not cut.
+
         Args:
             file_path (str): The path to the audio file.
 
@@ -103,31 +146,52 @@ class TranscriptionModel:
 
         self.transcript = None
         self.original_audio_file = []
-        self.audio_files = []
+        self.remove_chunks()
 
         self.original_audio_file.append(file_path)
+        self.audio_hash = sha256_file(file_path)
+        self.transcript = self.lookup()
+        if self.transcript is not None:
+            self.audio_files.append(file_path)
+            self.audio_segments.append(None)
+            return
 
         audio_size_mb = os.path.getsize(file_path) / (1024 * 1024)
         if audio_size_mb > self.MAX_SUPPORTED_AUDIO_SIZE_MB:
-            chunk_size_ms = self.MAX_SUPPORTED_AUDIO_SIZE_MB * 1024 * 1024 * 8 // 1000
-            audio = AudioSegment.from_file(file_path)
-            duration_ms = len(audio)
-
-            for i in range(0, duration_ms, chunk_size_ms):
-                chunk = audio[i:i + chunk_size_ms]
-                chunk_file_path = f"{os.path.splitext(file_path)[0]}_{i // chunk_size_ms}{os.path.splitext(file_path)[1]}"
-                chunk.export(chunk_file_path, format=file_path.split('.')[-1])
+            # ffmpeg streams through the file to find silences and copies each
+            # chunk without decoding it in memory or re-encoding it
+            duration, silences = detect_silences(file_path)
+            if duration is None:
+                raise ValueError(f"Could not read the duration of {file_path}")
+            # Keep a margin, the bitrate is not constant over the file
+            max_chunk_duration = duration * self.MAX_SUPPORTED_AUDIO_SIZE_MB / audio_size_mb * 0.9
+
+            self.chunk_dir = tempfile.mkdtemp(prefix="transcription_chunks_")
+            extension = os.path.splitext(file_path)[1]
+            for i, (start, end) in enumerate(plan_cuts(duration, silences, max_chunk_duration)):
+                chunk_file_path = os.path.join(self.chunk_dir, f"chunk_{i:03d}{extension}")
+                cut_audio(file_path, start, end, chunk_file_path)
                 self.audio_files.append(chunk_file_path)
+                self.audio_segments.append((start, end))
         else:
             self.audio_files.append(file_path)
+            self.audio_segments.append(None)
+
+    def remove_chunks(self):
+        if self.chunk_dir:
+            shutil.rmtree(self.chunk_dir, ignore_errors=True)
+            self.chunk_dir = None
+        self.audio_files = []
+        self.audio_segments = []
 
-    def transcribe_audio(self, max_retries=10, retry_delay=5):
+    def transcribe_audio(self, max_retries=10, retry_delay=1, file_path=None):
         """
         Transcribes the audio data using OpenAI's Whisper API with error handling and retries.
 
         Args:
-            max_retries (int): Maximum number of retry attempts (default: 10)
-            retry_delay (int): Delay in seconds between retry attempts (default: 5)
+            max_retries (int): Maximum number of attempts (default: 10)
+            retry_delay (int): First backoff delay in seconds, see api_governor (default: 1)
+            file_path (str): The audio file to transcribe (default: the first loaded file)
 
         Returns:
             str: The transcript of the audio data in text format.
@@ -138,32 +202,36 @@ class TranscriptionModel:
         if not self.audio_files:
             raise ValueError("No audio files have been loaded.")
 
-        file_path = self.audio_files[0]
+        file_path = file_path or self.audio_files[0]
         
-        for attempt in range(max_retries):
+        def send():
+            with open(file_path, "rb") as audio_file:
+                if self.language:
+                    return openai.Audio.transcribe(WHISPER_MODEL, audio_file, language=self.language)
+                return openai.Audio.transcribe(WHISPER_MODEL, audio_file)
+
+        with metrics.span("transcribe", provider="openai", requests=1, bytes_sent=os.path.getsize(file_path)) as span:
             try:
-                with open(file_path, "rb") as audio_file:
-                    transcript = openai.Audio.transcribe("whisper-1", audio_file)
-                
-                # Extract the transcript text
-                transcript_text = transcript["text"]
-                return transcript_text
-
-            except (RateLimitError, Timeout, APIError) as e:
-                print(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    print(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    raise Exception(f"Transcription failed after {max_retries} attempts. Last error: {str(e)}")
-
-    def transcribe_multiple_chunks_audio(self, max_retries=10, retry_delay=5):
+                transcript = openai_governor.call(send, label=f"transcription of {os.path.basename(file_path)}",
+                                                  span=span, max_attempts=max_retries, base_delay=retry_delay)
+            except (RetriesExhaustedError, OpenAIError) as e:
+                raise Exception(f"Transcription failed. {str(e)}") from e
+
+        # Extract the transcript text
+        transcript_text = transcript["text"]
+        return transcript_text
+
+    def transcribe_multiple_chunks_audio(self, max_retries=10, retry_delay=1):
         """
         Transcribes all the audio chunks into a single transcript with error handling and retries.
 
+        Transcripts are cached by audio content, model and language. Every chunk
+        is cached as soon as it is transcribed, so a transcription interrupted
+        midway only sends the missing chunks again.
+
         Args:
-            max_retries (int): Maximum number of retry attempts (default: 10)
-            retry_delay (int): Delay in seconds between retry attempts (default: 5)
+            max_retries (int): Maximum number of attempts (default: 10)
+            retry_delay (int): First backoff delay in seconds, see api_governor (default: 1)
 
         Returns:
             str: The transcript of the audio data in text format.
@@ -174,40 +242,42 @@ class TranscriptionModel:
         if not self.audio_files:
             raise ValueError("No audio files have been loaded.")
 
-        sub_audio_file = len(self.audio_files) > 1
-
-        file_path = self.original_audio_file[0]
-        transcript_file = f"./outputs/{os.path.splitext(os.path.basename(file_path))[0]}_French_transcript.txt"
-
-        if os.path.exists(transcript_file):
-            with open(transcript_file, 'r') as f:
-                transcript_text = f.read()
-            self.transcript = transcript_text
-            while self.audio_files:
-                if sub_audio_file:
-                    os.remove(self.audio_files[0])
-                self.audio_files.pop(0)
-            return transcript_text
-
-        transcript_texts = []
-
-        while self.audio_files:
-            try:
-                transcript_text = self.transcribe_audio(max_retries, retry_delay)
-                transcript_texts.append(transcript_text)
-            except Exception as e:
-                raise Exception(f"Failed to transcribe audio chunk: {str(e)}")
-            finally:
-                if sub_audio_file:
-                    os.remove(self.audio_files[0])
-                self.audio_files.pop(0)
-
-        self.transcript = "".join(transcript_texts)
+        if self.transcript is not None:
+            self.remove_chunks()
+            self.save_text(self.transcript, "")
+            return self.transcript
+
+        def transcribe_chunk(chunk_path, segment):
+            if segment is not None:
+                transcript = self.lookup(segment)
+                if transcript is not None:
+                    return transcript
+            transcript = self.transcribe_audio(max_retries, retry_delay, chunk_path)
+            if segment is not None:
+                transcript_cache.put(self.audio_hash, WHISPER_MODEL, self.language, transcript, segment)
+            return transcript
+
+        # Chunks are transcribed concurrently and stitched back in order
+        try:
+            workers = min(self.MAX_CONCURRENT_TRANSCRIPTIONS, len(self.audio_files))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(metrics.wrap(transcribe_chunk), chunk_path, segment)
+                           for chunk_path, segment in zip(self.audio_files, self.audio_segments)]
+                transcript_texts = [future.result() for future in futures]
+        except Exception as e:
+            raise Exception(f"Failed to transcribe audio chunk: {str(e)}")
+        finally:
+            self.remove_chunks()
+
+        # Chunks end at silences, between two words: Whisper starts every chunk
+        # without a leading space, joining them as is would glue those words
+        self.transcript = " ".join(text.strip() for text in transcript_texts)
+        transcript_cache.put(self.audio_hash, WHISPER_MODEL, self.language, self.transcript)
         self.save_text(self.transcript, "")
 
         return self.transcript
 
-    def load_and_transcribe_audio(self, audio_file, max_retries=10, retry_delay=5):
+    def load_and_transcribe_audio(self, audio_file, max_retries=10, retry_delay=1):
         self.load_audio(audio_file)
         transcript = self.transcribe_multiple_chunks_audio(max_retries, retry_delay)
         return transcript
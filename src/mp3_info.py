@@ -0,0 +1,126 @@
+import os
+import struct
+
+# Bitrates in kbps, indexed by [table][bitrate_index]
+BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+LAYERS = {0b01: 3, 0b10: 2, 0b11: 1}
+
+
+class Mp3InfoError(ValueError):
+    pass
+
+
+def _skip_id3v2(f):
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        if header[5] & 0x10:  # footer present
+            size += 10
+        return 10 + size
+    return 0
+
+
+def _parse_frame_header(header):
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = VERSIONS.get((header[1] >> 3) & 0b11)
+    layer = LAYERS.get((header[1] >> 1) & 0b11)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0b11
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    table = (1, layer) if version == 1 else (2, 1 if layer == 1 else 2)
+    if layer == 1:
+        samples_per_frame = 384
+    elif layer == 3 and version != 1:
+        samples_per_frame = 576
+    else:
+        samples_per_frame = 1152
+    return {
+        "version": version,
+        "layer": layer,
+        "bitrate": BITRATES[table][bitrate_index] * 1000,
+        "sample_rate": SAMPLE_RATES[version][sample_rate_index],
+        "channels": 1 if header[3] >> 6 == 0b11 else 2,
+        "samples_per_frame": samples_per_frame,
+    }
+
+
+def read_mp3_info(path, search_limit=64 * 1024):
+    """
+    Read the duration and stream parameters of an mp3 from its headers, without decoding it.
+
+    The duration comes from the Xing/Info or VBRI header when the encoder wrote
+    one, otherwise it is derived from the bitrate of the first frame (CBR).
+
+    Returns:
+        dict: duration (seconds), bitrate, sample_rate, channels, audio_size (bytes).
+
+    Raises:
+        Mp3InfoError: If no mp3 frame is found.
+    """
+    file_size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        audio_start = _skip_id3v2(f)
+        f.seek(audio_start)
+        data = f.read(search_limit)
+
+        frame = None
+        position = 0
+        while position < len(data) - 4:
+            position = data.find(b"\xff", position)
+            if position == -1 or position > len(data) - 4:
+                break
+            frame = _parse_frame_header(data[position:position + 4])
+            if frame:
+                break
+            position += 1
+        if not frame:
+            raise Mp3InfoError(f"No mp3 frame found in {path}")
+        audio_start += position
+
+        audio_end = file_size
+        f.seek(max(file_size - 128, 0))
+        if f.read(3) == b"TAG":
+            audio_end -= 128
+
+    frame_data = data[position:]
+    frames = None
+    if frame["version"] == 1:
+        xing_offset = 4 + (17 if frame["channels"] == 1 else 32)
+    else:
+        xing_offset = 4 + (9 if frame["channels"] == 1 else 17)
+    tag = frame_data[xing_offset:xing_offset + 4]
+    if tag in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", frame_data[xing_offset + 4:xing_offset + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", frame_data[xing_offset + 8:xing_offset + 12])[0]
+    elif frame_data[36:40] == b"VBRI":
+        frames = struct.unpack(">I", frame_data[50:54])[0]
+
+    audio_size = audio_end - audio_start
+    if frames:
+        duration = frames * frame["samples_per_frame"] / frame["sample_rate"]
+    else:
+        duration = audio_size * 8 / frame["bitrate"]
+
+    return {
+        "duration": duration,
+        "bitrate": frame["bitrate"],
+        "sample_rate": frame["sample_rate"],
+        "channels": frame["channels"],
+        "audio_size": audio_size,
+    }
+
+
+def mp3_duration(path):
+    """Duration of an mp3 in seconds, read from its headers."""
+    return read_mp3_info(path)["duration"]
@@ -0,0 +1,184 @@
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import metrics
+from config import SLIDE_RESOLUTION
+from file_manifest import sha256_file
+
+
+# Command line tools the export runs, LibreOffice and poppler-utils
+SLIDE_EXPORT_TOOLS = ("libreoffice", "pdfinfo", "pdftoppm")
+
+
+def missing_export_tools():
+    """The tools of `SLIDE_EXPORT_TOOLS` that are not on the PATH."""
+    return tuple(tool for tool in SLIDE_EXPORT_TOOLS if shutil.which(tool) is None)
+
+
+def slides_manifest_path(slide_dir, base_name):
+    """
+    Sidecar of the exported pages of a deck: the resolution they were rendered
+    for and, per image, its hash, dimensions and size.
+    """
+    return os.path.join(slide_dir, f"{base_name}.slides.json")
+
+
+def load_slides_manifest(slide_dir, base_name):
+    path = slides_manifest_path(slide_dir, base_name)
+    if not os.path.exists(path):
+        return {"pages": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_slides_manifest(slide_dir, base_name, manifest):
+    path = slides_manifest_path(slide_dir, base_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def page_hash(entry):
+    """The hash of a manifest page entry, older manifests only recorded the hash."""
+    return entry if isinstance(entry, str) else entry.get("sha256")
+
+
+def png_size(path):
+    """(width, height) of a png, read from its IHDR chunk."""
+    with open(path, "rb") as f:
+        header = f.read(24)
+    if len(header) < 24 or not header.startswith(b"\x89PNG"):
+        raise ValueError(f"{path} is not a png")
+    return struct.unpack(">II", header[16:24])
+
+
+def export_pptx_to_pdf(pptx_path, output_dir):
+    """Convert a pptx to pdf with LibreOffice and return the pdf path."""
+    os.makedirs(output_dir, exist_ok=True)
+    # A private profile per export, concurrent instances sharing one profile fail silently
+    with tempfile.TemporaryDirectory(prefix="lo_profile_") as profile_dir:
+        command = [
+            "libreoffice", f"-env:UserInstallation={Path(profile_dir).as_uri()}",
+            "--headless", "--convert-to", "pdf", "--outdir", output_dir, pptx_path,
+        ]
+        subprocess.run(command, check=True, text=True, capture_output=True)
+    return os.path.join(output_dir, f"{Path(pptx_path).stem}.pdf")
+
+
+def read_pdf_info(pdf_path):
+    """
+    Returns:
+        tuple: (page count, (width, height) of the first page in points).
+    """
+    result = subprocess.run(["pdfinfo", pdf_path], check=True, text=True, capture_output=True)
+    pages = re.search(r"^Pages:\s+(\d+)", result.stdout, re.MULTILINE)
+    if not pages:
+        raise ValueError(f"Could not read the page count of {pdf_path}")
+    size = re.search(r"^Page size:\s+([\d.]+) x ([\d.]+)", result.stdout, re.MULTILINE)
+    # Slides default to 16:9
+    page_size = (float(size.group(1)), float(size.group(2))) if size else (16.0, 9.0)
+    return int(pages.group(1)), page_size
+
+
+def fit_resolution(page_size, resolution):
+    """The largest even (width, height) with the aspect ratio of the page fitting in `resolution`."""
+    scale = min(resolution[0] / page_size[0], resolution[1] / page_size[1])
+    return (max(2, int(page_size[0] * scale) // 2 * 2), max(2, int(page_size[1] * scale) // 2 * 2))
+
+
+def render_page(pdf_path, page, output_prefix, size):
+    """Render one page (1-based) of a pdf to `output_prefix`.png, at `size` pixels, with poppler."""
+    command = [
+        "pdftoppm", "-f", str(page), "-l", str(page),
+        "-scale-to-x", str(size[0]), "-scale-to-y", str(size[1]),
+        "-png", "-singlefile", pdf_path, output_prefix,
+    ]
+    subprocess.run(command, check=True, text=True, capture_output=True)
+    return f"{output_prefix}.png"
+
+
+def rasterize_pdf(pdf_path, slide_dir, base_name, resolution=SLIDE_RESOLUTION, workers=None):
+    """
+    Render every page of a pdf to `slide_dir`/BASE.NN.png, in parallel.
+
+    Pages are rendered straight at the video resolution (fitted to the page
+    aspect ratio), so the encoder neither decodes nor scales oversized images.
+    They are rendered concurrently (one pdftoppm process per page) into a
+    temporary folder. A page whose image hash matches the one recorded in the
+    slides manifest is left untouched, so unchanged slides keep their file and
+    mtime and later incremental stages skip them.
+
+    Returns:
+        list: The names of the images that were written or replaced.
+    """
+    page_count, page_size = read_pdf_info(pdf_path)
+    size = fit_resolution(page_size, resolution)
+    manifest = load_slides_manifest(slide_dir, base_name)
+    previous_pages = manifest.get("pages", {})
+    workers = workers or os.cpu_count() or 1
+
+    changed = []
+    pages = {}
+    with tempfile.TemporaryDirectory(prefix="rasterize_", dir=slide_dir) as tmp_dir:
+        with ThreadPoolExecutor(max_workers=min(workers, page_count) or 1) as executor:
+            futures = {
+                page: executor.submit(render_page, pdf_path, page, os.path.join(tmp_dir, f"page-{page}"), size)
+                for page in range(1, page_count + 1)
+            }
+            for page, future in futures.items():
+                rendered_path = future.result()
+                image_name = f"{base_name}.{page:02d}.png"
+                image_path = os.path.join(slide_dir, image_name)
+                width, height = png_size(rendered_path)
+                pages[image_name] = {
+                    "sha256": sha256_file(rendered_path),
+                    "width": width,
+                    "height": height,
+                    "bytes": os.path.getsize(rendered_path),
+                }
+                previous = previous_pages.get(image_name)
+                if previous and page_hash(previous) == pages[image_name]["sha256"] and os.path.exists(image_path):
+                    continue
+                shutil.move(rendered_path, image_path)
+                changed.append(image_name)
+
+    # Slides removed from the deck
+    for image_name in set(previous_pages) - set(pages):
+        image_path = os.path.join(slide_dir, image_name)
+        if os.path.exists(image_path):
+            os.remove(image_path)
+
+    manifest["resolution"] = list(resolution)
+    manifest["pages"] = pages
+    save_slides_manifest(slide_dir, base_name, manifest)
+    return changed
+
+
+def export_slides(pptx_path, resolution=SLIDE_RESOLUTION, workers=None):
+    """
+    Export a deck to `slides/BASE.NN.png` next to it, as `pptx_2_png.sh` does,
+    rendered for a `resolution` (width, height) video.
+
+    Returns:
+        list: The names of the images that were written or replaced.
+    """
+    slide_dir = os.path.join(os.path.dirname(os.path.abspath(pptx_path)), "slides")
+    base_name = Path(pptx_path).stem
+    os.makedirs(slide_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(prefix="pdf_export_") as pdf_dir:
+        with metrics.span("export_pdf"):
+            pdf_path = export_pptx_to_pdf(pptx_path, pdf_dir)
+        with metrics.span("rasterize_pdf") as span:
+            changed = rasterize_pdf(pdf_path, slide_dir, base_name, resolution, workers)
+            span.add(pages=len(load_slides_manifest(slide_dir, base_name)["pages"]), pages_written=len(changed),
+                     bytes_written=sum(os.path.getsize(os.path.join(slide_dir, name)) for name in changed))
+        return changed
@@ -0,0 +1,122 @@
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from tqdm import tqdm
+
+import metrics
+
+IO = "io"
+CPU = "cpu"
+
+# Network-bound stages spend their time waiting for Claude, ElevenLabs or
+# Whisper, CPU-bound stages run LibreOffice, ImageMagick or x264.
+DEFAULT_IO_WORKERS = int(os.getenv("PIPELINE_IO_WORKERS", 8))
+DEFAULT_CPU_WORKERS = int(os.getenv("PIPELINE_CPU_WORKERS", max(1, (os.cpu_count() or 2) // 4)))
+
+
+class Task:
+    """
+    A node of the pipeline graph.
+
+    Args:
+        name (str): Unique name of the task, also used by other tasks to depend on it.
+        fn (callable): The work to do.
+        args (tuple): Positional arguments for `fn`.
+        kind (str): `IO` or `CPU`, selects the worker pool running the task.
+        deps (list): Names of the tasks that must succeed before this one starts.
+        tags (dict): Metrics tags (course, chapter, language) of the spans opened by the task.
+    """
+
+    def __init__(self, name, fn, args=(), kind=IO, deps=(), tags=None):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.kind = kind
+        self.deps = list(deps)
+        self.tags = tags or {}
+
+    def __repr__(self):
+        return f"Task({self.name!r}, kind={self.kind!r}, deps={self.deps!r})"
+
+
+def run_tagged(task):
+    with metrics.tagged(task=task.name, **task.tags):
+        return task.fn(*task.args)
+
+
+def run_tasks(tasks, io_workers=DEFAULT_IO_WORKERS, cpu_workers=DEFAULT_CPU_WORKERS, desc="Running pipeline"):
+    """
+    Run a dependency graph of tasks with one worker pool per task kind.
+
+    A task starts as soon as all its dependencies succeeded, so independent
+    chapters and languages progress at the same time. When a task fails, every
+    task depending on it (directly or not) is skipped and the rest of the graph
+    keeps running.
+
+    Returns:
+        dict: The failed and skipped task names, mapped to the error message.
+    """
+    tasks_by_name = {}
+    for task in tasks:
+        if task.name in tasks_by_name:
+            raise ValueError(f"Duplicate task name: {task.name}")
+        tasks_by_name[task.name] = task
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in tasks_by_name:
+                raise ValueError(f"Task {task.name} depends on unknown task {dep}")
+
+    dependents = {name: [] for name in tasks_by_name}
+    remaining_deps = {}
+    for task in tasks:
+        remaining_deps[task.name] = len(set(task.deps))
+        for dep in set(task.deps):
+            dependents[dep].append(task.name)
+
+    failures = {}
+    pools = {
+        IO: ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="pipeline-io"),
+        CPU: ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="pipeline-cpu"),
+    }
+    running = {}
+
+    def submit(name):
+        task = tasks_by_name[name]
+        running[pools[task.kind].submit(run_tagged, task)] = name
+
+    def skip(name, reason):
+        stack = [name]
+        while stack:
+            for dependent in dependents[stack.pop()]:
+                if dependent not in failures:
+                    failures[dependent] = reason
+                    progress.update(1)
+                    stack.append(dependent)
+
+    try:
+        with tqdm(total=len(tasks), desc=desc, unit="task") as progress:
+            for name, count in remaining_deps.items():
+                if count == 0:
+                    submit(name)
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    progress.update(1)
+                    error = future.exception()
+                    if error is not None:
+                        print(f"\nTask {name} failed: {error}")
+                        traceback.print_exception(type(error), error, error.__traceback__)
+                        failures[name] = str(error)
+                        skip(name, f"skipped because {name} failed")
+                        continue
+                    for dependent in dependents[name]:
+                        remaining_deps[dependent] -= 1
+                        if remaining_deps[dependent] == 0 and dependent not in failures:
+                            submit(dependent)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True)
+
+    return failures
@@ -17,20 +17,21 @@ mkdir -p "$OUTPUT_DIR"
 BASE_NAME=$(basename "$PPTX_PATH" .pptx)
 
 # Convert PPTX to PDF using LibreOffice
+# LO_USER_INSTALLATION lets concurrent exports use separate LibreOffice profiles
 # echo "Converting PPTX to PDF..."
-libreoffice --headless --convert-to pdf --outdir "$OUTPUT_DIR" "$PPTX_PATH"
+libreoffice ${LO_USER_INSTALLATION:+"-env:UserInstallation=$LO_USER_INSTALLATION"} --headless --convert-to pdf --outdir "$OUTPUT_DIR" "$PPTX_PATH"
 PDF_PATH="${OUTPUT_DIR}/${BASE_NAME}.pdf"
 # echo "PDF conversion completed."
 
 # Get number of pages in the PDF using pdfinfo
 NUM_PAGES=$(pdfinfo "$PDF_PATH" | grep 'Pages' | awk '{print $2}')
 
-# Convert PDF to PNG using ImageMagick's convert
+# Render the PDF pages to PNG straight at the video width (SLIDE_WIDTH, default 1920)
 # echo "Converting PDF to PNG..."
-for ((i=0; i<NUM_PAGES; i++))
+for ((i=1; i<=NUM_PAGES; i++))
 do
-    # echo -ne "Converting page $((i+1)) of $NUM_PAGES...\r"
-    magick -density 300 "${PDF_PATH}[$i]" -quality 100 "${OUTPUT_DIR}/${BASE_NAME}.$(printf "%02d" $((i+1))).png"
+    # echo -ne "Converting page $i of $NUM_PAGES...\r"
+    pdftoppm -f $i -l $i -scale-to-x "${SLIDE_WIDTH:-1920}" -scale-to-y -1 -png -singlefile "$PDF_PATH" "${OUTPUT_DIR}/${BASE_NAME}.$(printf "%02d" $i)"
 done
 # echo -ne "\nConversion to PNG completed. Images saved in ${OUTPUT_DIR}\n"
 
@@ -1,15 +1,17 @@
 import re
 
 from typing import Optional
-from pptx import Presentation
 from pathlib import Path
 from functools import lru_cache
 from tqdm import tqdm
+import metrics
 from supported_languages import *
-from txt_translation import translate_txt_to
+from txt_translation import translate_txt_to, translate_segments, translate_segments_to_many
 
 translation_cache = {}
 
+RUN_MARKER_PATTERN = re.compile(r"<r(\d+)>(.*?)</r\1>", re.DOTALL)
+
 def is_exception_text(text: str, source_lang: str, target_lang: str, version: str) -> Optional[str]:
     """
     Check if the given text contains exception patterns and modify it accordingly.
@@ -50,15 +52,18 @@ class TranslationError(Exception):
     pass
 
 @lru_cache(maxsize=1000)
-def get_translation(text, target_language):
+def get_translation(text, target_language, source_language=None):
     """
     Check if the translation exists in cache, if not, translate and cache the result.
+
+    Translations are also persisted in the on-disk translation memory by
+    `translate_txt_to`, so strings seen in previous runs never reach the API again.
     """
-    cache_key = (text, target_language)
+    cache_key = (text, target_language, source_language)
     if cache_key in translation_cache:
         return translation_cache[cache_key]
     else:
-        translated_text = translate_txt_to(text, target_language)
+        translated_text = translate_txt_to(text, target_language, source_language=source_language)
         translation_cache[cache_key] = translated_text
         return translated_text
 
@@ -71,23 +76,231 @@ def count_total_runs(prs):
                     total += len(paragraph.runs)
     return total
 
-def translate_pptx(input_path, output_path, source_lang, target_lang, version, use_exception=False):
-    prs = Presentation(input_path)
-
+def iter_paragraphs(prs):
     for slide in prs.slides:
         for shape in slide.shapes:
             if not shape.has_text_frame:
                 continue
-            text_frame = shape.text_frame
-            for paragraph in text_frame.paragraphs:
-                for run in paragraph.runs:
-                    if use_exception:
-                        exception_result = is_exception_text(run.text, source_lang, target_lang, version)
-                        if exception_result:
-                            run.text = exception_result
-                            continue
-
-                    translated_text = get_translation(run.text, language_codes[target_lang])
-                    run.text = translated_text
-
-    prs.save(output_path)
+            for paragraph in shape.text_frame.paragraphs:
+                yield paragraph
+
+def iter_runs(prs):
+    for paragraph in iter_paragraphs(prs):
+        for run in paragraph.runs:
+            yield run
+
+def apply_exceptions(runs, source_lang, target_lang, version):
+    """Rewrite the runs matched by `is_exception_text` and return the other ones."""
+    remaining = []
+    for run in runs:
+        exception_result = is_exception_text(run.text, source_lang, target_lang, version)
+        if exception_result:
+            run.text = exception_result
+        else:
+            remaining.append(run)
+    return remaining
+
+def collect_paragraphs(prs, source_lang, target_lang, version, use_exception):
+    """
+    Group the runs left to translate by paragraph.
+
+    Returns:
+        list: One list of runs per paragraph with text to translate: the only
+        run holding text, or every non-empty run of the paragraph.
+    """
+    paragraphs = []
+    for paragraph in iter_paragraphs(prs):
+        runs = paragraph.runs
+        if use_exception:
+            runs = apply_exceptions(runs, source_lang, target_lang, version)
+        text_runs = [run for run in runs if run.text.strip()]
+        if len(text_runs) == 1:
+            paragraphs.append(text_runs)
+        elif text_runs:
+            paragraphs.append([run for run in runs if run.text])
+    return paragraphs
+
+def paragraph_segment(runs):
+    """
+    The text sent for a paragraph: the text of a lone run, or the whole
+    paragraph with every run wrapped in <rN>...</rN> so that the translation can
+    be spread back over the runs and their formatting.
+    """
+    if len(runs) == 1:
+        return runs[0].text.strip()
+    return "".join(f"<r{n}>{run.text}</r{n}>" for n, run in enumerate(runs, 1))
+
+def set_paragraph_translation(runs, translated_text):
+    """
+    Spread the translation of a `paragraph_segment` over its runs.
+
+    Returns:
+        bool: False, leaving the runs untouched, if the run markers did not
+        survive the translation (missing, repeated or out of order).
+    """
+    if len(runs) == 1:
+        set_run_translation(runs[0], translated_text)
+        return True
+    matches = list(RUN_MARKER_PATTERN.finditer(translated_text))
+    if [int(match.group(1)) for match in matches] != list(range(1, len(runs) + 1)):
+        return False
+
+    texts = [match.group(2) for match in matches]
+    # Text left between two markers, usually a space, stays with the run before it
+    for i, (match, next_match) in enumerate(zip(matches, matches[1:])):
+        texts[i] += translated_text[match.end():next_match.start()]
+    texts[0] = translated_text[:matches[0].start()].lstrip() + texts[0]
+    texts[-1] += translated_text[matches[-1].end():].rstrip()
+    # Whitespace-only runs only separate their neighbours and keep their spacing,
+    # words put in them go to the run before (the first run for leading ones)
+    owner = None
+    leading = ""
+    for i, (run, text) in enumerate(zip(runs, texts)):
+        if run.text.strip():
+            owner = i
+            texts[i] = leading + text
+            leading = ""
+        elif text.strip():
+            if owner is None:
+                leading += text.lstrip()
+            else:
+                texts[owner] += text.rstrip()
+    for run, text in zip(runs, texts):
+        if run.text.strip():
+            run.text = text
+    return True
+
+def translate_paragraphs(paragraphs, target_lang, source_lang):
+    """
+    Translate paragraphs with numbered-segment requests, each paragraph once
+    with its run markers. The paragraphs whose markers come back broken are
+    translated again run by run.
+    """
+    segments = [paragraph_segment(runs) for runs in paragraphs]
+    translations = translate_segments(segments, language_codes[target_lang], language_codes[source_lang])
+    failed_runs = []
+    for runs, translated_text in zip(paragraphs, translations):
+        if not set_paragraph_translation(runs, translated_text):
+            failed_runs.extend(run for run in runs if run.text.strip())
+    if failed_runs:
+        print(f"Run markers lost in {target_lang} for some paragraphs, translating their runs one by one.")
+        _translate_runs(failed_runs, target_lang, source_lang)
+
+def _translate_runs(runs, target_lang, source_lang):
+    segments = [run.text.strip() for run in runs]
+    translations = translate_segments(segments, language_codes[target_lang], language_codes[source_lang])
+    for run, translated_text in zip(runs, translations):
+        set_run_translation(run, translated_text)
+
+def translate_pptx(input_path, output_path, source_lang, target_lang, version, use_exception=False, batched=False,
+                   paragraphs=False):
+    """
+    Translate every text run of a presentation.
+
+    Args:
+        input_path (str): The pptx to translate.
+        output_path (str): Where to save the translated pptx.
+        source_lang (str): The source language code (e.g., 'en').
+        target_lang (str): The target language code (e.g., 'fr').
+        version (str): The target version, used by the exception rules.
+        use_exception (bool): Apply `is_exception_text` before translating.
+        batched (bool): Collect every run of the deck and translate them with a
+            handful of numbered-segment requests instead of one request per run.
+        paragraphs (bool): With `batched`, translate whole paragraphs instead of
+            single runs, see `translate_paragraphs`.
+    """
+    from pptx import Presentation
+
+    with metrics.span("translate_pptx") as span:
+        prs = Presentation(input_path)
+        span.add(runs=count_total_runs(prs))
+        if batched and paragraphs:
+            paragraph_runs = collect_paragraphs(prs, source_lang, target_lang, version, use_exception)
+            span.add(paragraphs=len(paragraph_runs))
+            translate_paragraphs(paragraph_runs, target_lang, source_lang)
+        else:
+            _translate_presentation(prs, source_lang, target_lang, version, use_exception, batched)
+        prs.save(output_path)
+
+def _translate_presentation(prs, source_lang, target_lang, version, use_exception, batched):
+    pending_runs = []
+    for run in iter_runs(prs):
+        if use_exception:
+            exception_result = is_exception_text(run.text, source_lang, target_lang, version)
+            if exception_result:
+                run.text = exception_result
+                continue
+
+        if batched:
+            if run.text.strip():
+                pending_runs.append(run)
+        else:
+            translated_text = get_translation(run.text, language_codes[target_lang], language_codes[source_lang])
+            run.text = translated_text
+
+    if pending_runs:
+        _translate_runs(pending_runs, target_lang, source_lang)
+
+def set_run_translation(run, translated_text):
+    # Keep the spacing around the run, it glues it to its neighbours
+    leading = run.text[:len(run.text) - len(run.text.lstrip())]
+    trailing = run.text[len(run.text.rstrip()):]
+    run.text = leading + translated_text.strip() + trailing
+
+def translate_pptx_to_many(input_path, outputs, source_lang, use_exception=False, paragraphs=False):
+    """
+    Translate a presentation into several languages at once.
+
+    The runs of every target are collected first and translated together with
+    `translate_segments_to_many`, so each batch of source text is sent once for
+    all the languages.
+
+    Args:
+        input_path (str): The pptx to translate.
+        outputs (dict): Target language code -> (output path, target version).
+        source_lang (str): The source language code (e.g., 'en').
+        use_exception (bool): Apply `is_exception_text` before translating.
+        paragraphs (bool): Translate whole paragraphs instead of single runs,
+            see `translate_paragraphs`.
+    """
+    from pptx import Presentation
+
+    with metrics.span("translate_pptx") as span:
+        presentations = {target_lang: Presentation(input_path) for target_lang in outputs}
+        pending = {}
+        for target_lang, prs in presentations.items():
+            version = outputs[target_lang][1]
+            if paragraphs:
+                pending[target_lang] = collect_paragraphs(prs, source_lang, target_lang, version, use_exception)
+            else:
+                runs = list(iter_runs(prs))
+                if use_exception:
+                    runs = apply_exceptions(runs, source_lang, target_lang, version)
+                pending[target_lang] = [[run] for run in runs if run.text.strip()]
+
+        segments = list(dict.fromkeys(paragraph_segment(runs) for items in pending.values() for runs in items))
+        span.add(runs=sum(len(runs) for items in pending.values() for runs in items), segments=len(segments))
+        translations = translate_segments_to_many(segments, [language_codes[target_lang] for target_lang in outputs],
+                                                  language_codes[source_lang])
+
+        failed_runs = {}
+        for target_lang, items in pending.items():
+            translated_segments = dict(zip(segments, translations[language_codes[target_lang]]))
+            for runs in items:
+                if not set_paragraph_translation(runs, translated_segments[paragraph_segment(runs)]):
+                    failed_runs.setdefault(target_lang, []).extend(run for run in runs if run.text.strip())
+
+        if failed_runs:
+            # Paragraphs whose run markers came back broken, translated again run by run
+            print("Run markers lost for some paragraphs, translating their runs one by one.")
+            run_segments = list(dict.fromkeys(run.text.strip() for runs in failed_runs.values() for run in runs))
+            translations = translate_segments_to_many(run_segments,
+                                                      [language_codes[target_lang] for target_lang in failed_runs],
+                                                      language_codes[source_lang])
+            for target_lang, runs in failed_runs.items():
+                translated_segments = dict(zip(run_segments, translations[language_codes[target_lang]]))
+                for run in runs:
+                    set_run_translation(run, translated_segments[run.text.strip()])
+
+        for target_lang, prs in presentations.items():
+            prs.save(outputs[target_lang][0])
@@ -0,0 +1,122 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class RateLimiter:
+    """
+    Process-wide request/token budget shared by every thread talking to one API.
+
+    Two token buckets refill continuously: one counting requests per minute and
+    one counting (prompt) tokens per minute. A semaphore caps the number of
+    requests in flight at the same time.
+
+    The request rate adapts to the provider: `slow_down` halves it when the
+    provider throttles us, `speed_up` wins it back step by step, up to the
+    configured rate, and `pause` / `observe` hold every thread back when the
+    provider asks to wait (Retry-After or rate-limit headers).
+    """
+
+    # Share of the configured rate recovered by every successful request
+    RECOVERY_STEP = 0.1
+    MIN_RATE_SHARE = 0.25
+    # Requests in flight are throttled together, they count as one signal
+    SLOW_DOWN_INTERVAL = 1.0
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None, max_concurrent=8):
+        self.max_requests_per_minute = requests_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._last_refill = time.monotonic()
+        self._paused_until = 0.0
+        self._last_slow_down = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_concurrent)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_allowance = min(
+            self.requests_per_minute,
+            self._request_allowance + elapsed * self.requests_per_minute / 60,
+        )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                self.tokens_per_minute,
+                self._token_allowance + elapsed * self.tokens_per_minute / 60,
+            )
+
+    def acquire(self, tokens=0):
+        """Block until one request carrying `tokens` tokens fits in the budget."""
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                paused = self._paused_until - time.monotonic()
+                missing_requests = 1 - self._request_allowance
+                missing_tokens = tokens - self._token_allowance if self.tokens_per_minute else 0
+                if paused <= 0 and missing_requests <= 0 and missing_tokens <= 0:
+                    self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    return
+                wait = max(
+                    paused,
+                    missing_requests * 60 / self.requests_per_minute,
+                    missing_tokens * 60 / self.tokens_per_minute if self.tokens_per_minute else 0,
+                )
+            time.sleep(wait)
+
+    @contextmanager
+    def request(self, tokens=0):
+        """Hold one concurrency slot and spend budget for the duration of a request."""
+        with self._in_flight:
+            self.acquire(tokens)
+            yield
+
+    def pause(self, seconds):
+        """Hold every request back for `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def slow_down(self, factor=0.5):
+        """Cut the request rate after the provider throttled us."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_slow_down < self.SLOW_DOWN_INTERVAL:
+                return
+            self._last_slow_down = now
+            self._refill()
+            self.requests_per_minute = max(self.max_requests_per_minute * self.MIN_RATE_SHARE,
+                                           self.requests_per_minute * factor)
+            self._request_allowance = min(self._request_allowance, self.requests_per_minute / 60)
+
+    def speed_up(self):
+        """Win back part of the configured rate after a successful request."""
+        with self._lock:
+            self._refill()
+            self.requests_per_minute = min(self.max_requests_per_minute,
+                                           self.requests_per_minute + self.max_requests_per_minute * self.RECOVERY_STEP)
+
+    def observe(self, requests_remaining=None, tokens_remaining=None, reset_after=None):
+        """
+        Align the buckets with the rate-limit headers of a response.
+
+        Args:
+            requests_remaining (int): Requests the provider still accepts in its window.
+            tokens_remaining (int): Tokens the provider still accepts in its window.
+            reset_after (float): Seconds until the provider window resets.
+        """
+        with self._lock:
+            self._refill()
+            if requests_remaining is not None:
+                self._request_allowance = min(self._request_allowance, float(requests_remaining))
+            if tokens_remaining is not None and self.tokens_per_minute:
+                self._token_allowance = min(self._token_allowance, float(tokens_remaining))
+            exhausted = requests_remaining == 0 or (tokens_remaining == 0 and self.tokens_per_minute)
+            if exhausted and reset_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + reset_after)
@@ -0,0 +1,99 @@
+"""
+Cores and memory shared by every ffmpeg encode of the process.
+
+Chapters are rendered side by side, each encode first reserves the threads
+and the memory it needs from a single `RenderBudget` and waits while the
+machine is full. The needs of a job are estimated from its slide count and
+duration by `estimate_job`.
+"""
+import math
+import os
+import threading
+from contextlib import contextmanager
+
+import metrics
+from config import RENDER_CORES, RENDER_MEMORY_SHARE
+
+MIB = 1024 ** 2
+# x264 ultrafast at 1 fps: the decoded slide, the scaler and the encoder
+# buffers, plus the frames every encoder thread works on (1080p)
+JOB_BASE_MEMORY = 200 * MIB
+THREAD_MEMORY = 50 * MIB
+# Work given to one encoder thread, in seconds of video and in slides to decode
+SECONDS_PER_THREAD = 300
+SLIDES_PER_THREAD = 20
+MAX_THREADS_PER_JOB = 8
+
+
+def physical_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, OSError, ValueError):
+        return 8 * 1024 ** 3
+
+
+class RenderJob:
+    """
+    What an encode needs from the budget.
+
+    Args:
+        threads (int): The ffmpeg -threads of the encode.
+        memory (int): Peak memory of the encode, in bytes.
+    """
+
+    def __init__(self, threads, memory):
+        self.threads = threads
+        self.memory = memory
+
+
+def estimate_job(slide_count, duration, threads=None):
+    """
+    Estimate the threads and memory of an encode of `slide_count` slides lasting
+    `duration` seconds. `threads` forces the thread count.
+    """
+    if threads is None:
+        threads = max(math.ceil(duration / SECONDS_PER_THREAD), math.ceil(slide_count / SLIDES_PER_THREAD))
+        threads = max(1, min(MAX_THREADS_PER_JOB, threads))
+    return RenderJob(threads, JOB_BASE_MEMORY + threads * THREAD_MEMORY)
+
+
+class RenderBudget:
+    """
+    Hand out cores and memory to concurrent encodes.
+
+    A job larger than the whole budget is shrunk to it, so it can always run
+    once the others are done.
+
+    Args:
+        cores (int): Encoder threads running at the same time.
+        memory (int): Bytes the encodes may use together.
+    """
+
+    def __init__(self, cores=RENDER_CORES, memory=None):
+        self.cores = max(1, cores)
+        self.memory = memory or int(physical_memory() * RENDER_MEMORY_SHARE)
+        self._cores_used = 0
+        self._memory_used = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, job):
+        """Wait until `job` fits in the budget and hold its share; yield the threads granted."""
+        threads = min(job.threads, self.cores)
+        memory = min(job.memory, self.memory)
+        # The span measures the time spent waiting for the budget
+        with metrics.span("render_budget", threads=threads), self._condition:
+            while self._cores_used + threads > self.cores or self._memory_used + memory > self.memory:
+                self._condition.wait()
+            self._cores_used += threads
+            self._memory_used += memory
+        try:
+            yield threads
+        finally:
+            with self._condition:
+                self._cores_used -= threads
+                self._memory_used -= memory
+                self._condition.notify_all()
+
+
+render_budget = RenderBudget()
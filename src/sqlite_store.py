@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class SQLiteStore:
+    """
+    On-disk key -> text store backed by SQLite, evicted least-recently-used.
+
+    Subclasses name their table and value column (`TABLE`, `VALUE_COLUMN`) and
+    build the content address of their entries. Once the store holds more
+    than `max_entries`, the least recently used ones are removed.
+
+    `contains_key` only reads: it never creates the database, so dry runs
+    leave the disk untouched.
+    """
+
+    TABLE = None
+    VALUE_COLUMN = None
+    EVICTION_INTERVAL = 100  # number of writes between two eviction passes
+
+    def __init__(self, path, max_entries):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._connection = None
+        self._readonly_connection = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.TABLE} ("
+                " key TEXT PRIMARY KEY,"
+                f" {self.VALUE_COLUMN} TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.TABLE}_last_used ON {self.TABLE} (last_used)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _connect_readonly(self):
+        """The open connection if any, else a read-only one, None while the database does not exist."""
+        if self._connection is not None:
+            return self._connection
+        if self._readonly_connection is None:
+            if not os.path.exists(self.path):
+                return None
+            uri = f"{Path(os.path.abspath(self.path)).as_uri()}?mode=ro"
+            self._readonly_connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._readonly_connection
+
+    def get_value(self, key):
+        """Return the stored value, or None on a miss."""
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(
+                f"SELECT {self.VALUE_COLUMN} FROM {self.TABLE} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                f"UPDATE {self.TABLE} SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            connection.commit()
+            return row[0]
+
+    def contains_key(self, key):
+        """Whether a value is stored, without refreshing its last use nor writing anything (for dry runs)."""
+        with self._lock:
+            connection = self._connect_readonly()
+            if connection is None:
+                return False
+            try:
+                row = connection.execute(
+                    f"SELECT 1 FROM {self.TABLE} WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.OperationalError:
+                # No table yet
+                return False
+            return row is not None
+
+    def put_value(self, key, value):
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                f"INSERT OR REPLACE INTO {self.TABLE} (key, {self.VALUE_COLUMN}, created, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            connection.commit()
+            self._writes += 1
+            if self._writes % self.EVICTION_INTERVAL == 0:
+                self._evict(connection)
+
+    def _evict(self, connection):
+        (count,) = connection.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            connection.execute(
+                f"DELETE FROM {self.TABLE} WHERE key IN"
+                f" (SELECT key FROM {self.TABLE} ORDER BY last_used ASC LIMIT ?)",
+                (excess,),
+            )
+            connection.commit()
+
+    def close(self):
+        with self._lock:
+            for connection in (self._connection, self._readonly_connection):
+                if connection is not None:
+                    connection.close()
+            self._connection = None
+            self._readonly_connection = None
@@ -0,0 +1,136 @@
+import re
+from functools import lru_cache
+
+SENTENCE = "sentence"
+TRANSCRIPT = "transcript"
+PARAGRAPH = "paragraph"
+
+# Byte patterns after which a chunk may be cut, per mode
+BOUNDARY_PATTERNS = {
+    SENTENCE: re.compile(rb"\."),
+    TRANSCRIPT: re.compile(rb"\.\s+"),
+    PARAGRAPH: re.compile(rb"\n"),
+}
+
+
+# Encodings used in place of the tiktoken ones, see register_encoding
+_registered_encodings = {}
+
+
+def register_encoding(encoding_name, encoding):
+    """
+    Use `encoding` (encode, decode and decode_tokens_bytes like a tiktoken
+    Encoding) for `encoding_name`, e.g. for an offline benchmark where the
+    tiktoken files cannot be downloaded.
+    """
+    _registered_encodings[encoding_name] = encoding
+    get_encoding.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name="cl100k_base"):
+    if encoding_name in _registered_encodings:
+        return _registered_encodings[encoding_name]
+    import tiktoken
+
+    return tiktoken.get_encoding(encoding_name)
+
+
+def count_tokens(text: str, encoding_name: str = "cl100k_base") -> int:
+    return len(get_encoding(encoding_name).encode(text))
+
+
+def _token_offsets(tokens, encoding):
+    """Byte offset of the start of every token, plus the total length at the end."""
+    offsets = [0]
+    position = 0
+    for token_bytes in encoding.decode_tokens_bytes(tokens):
+        position += len(token_bytes)
+        offsets.append(position)
+    return offsets
+
+
+def _last_boundaries(data, offsets, pattern):
+    """
+    For every token index i, the largest token index <= i at which a chunk may end.
+
+    A boundary falling inside a token is moved to the end of that token, so the
+    token stays in the chunk it starts in.
+    """
+    token_count = len(offsets) - 1
+    is_boundary = [False] * (token_count + 1)
+    token_index = 0
+    for match in pattern.finditer(data):
+        position = match.end()
+        while offsets[token_index] < position:
+            token_index += 1
+        is_boundary[token_index] = True
+
+    last_boundaries = [0] * (token_count + 1)
+    last = 0
+    for i in range(token_count + 1):
+        if is_boundary[i]:
+            last = i
+        last_boundaries[i] = last
+    return last_boundaries
+
+
+def _char_boundary(data, position):
+    """Move a byte position forward to the start of a UTF-8 character."""
+    while position < len(data) and data[position] & 0xC0 == 0x80:
+        position += 1
+    return position
+
+
+def chunk_text(text: str, max_tokens: int = 1000, mode: str = SENTENCE,
+               encoding_name: str = "cl100k_base") -> list:
+    """
+    Split a text into chunks of at most `max_tokens` tokens, cutting at natural boundaries.
+
+    The text is encoded once and every cut is found on the token offsets, so the
+    cost is linear in the length of the text.
+
+    Args:
+        text (str): The input text to be split.
+        max_tokens (int): The maximum token count for each chunk (default: 1000).
+        mode (str): Where chunks may end:
+            - SENTENCE: after a period, chunks are kept verbatim so that
+              joining them gives back the text.
+            - TRANSCRIPT: after a period followed by whitespace, chunks are stripped.
+            - PARAGRAPH: after a line break, chunks are stripped.
+            A chunk without any boundary is cut at `max_tokens`.
+        encoding_name (str): The encoding name to be used for tokenization (default: "cl100k_base").
+
+    Returns:
+        list: The list of chunks.
+    """
+    if mode not in BOUNDARY_PATTERNS:
+        raise ValueError(f"Unknown chunking mode: {mode}")
+
+    encoding = get_encoding(encoding_name)
+    data = text.encode("utf-8")
+    tokens = encoding.encode(text)
+    offsets = _token_offsets(tokens, encoding)
+    last_boundaries = _last_boundaries(data, offsets, BOUNDARY_PATTERNS[mode])
+    token_count = len(tokens)
+
+    chunks = []
+    start = 0
+    start_byte = 0
+    while start < token_count:
+        limit = start + max_tokens
+        if limit >= token_count:
+            end = token_count
+        else:
+            end = last_boundaries[limit]
+            if end <= start:
+                end = limit
+        end_byte = _char_boundary(data, offsets[end])
+        chunks.append(data[start_byte:end_byte].decode("utf-8"))
+        start = end
+        start_byte = end_byte
+
+    if mode != SENTENCE:
+        chunks = [chunk.strip() for chunk in chunks]
+        chunks = [chunk for chunk in chunks if chunk]
+    return chunks
@@ -0,0 +1,56 @@
+import hashlib
+
+from config import TRANSCRIPT_CACHE_PATH, TRANSCRIPT_CACHE_MAX_ENTRIES
+from sqlite_store import SQLiteStore
+
+WHISPER_MODEL = "whisper-1"
+
+
+def whisper_language(language_code):
+    """The ISO-639-1 code Whisper expects for a course language code (e.g. zh-Hans -> zh)."""
+    return language_code.split("-")[0].lower() if language_code else None
+
+
+def make_key(audio_hash: str, model: str, language=None, segment=None) -> str:
+    """
+    Build the content address of a transcript.
+
+    The key is a SHA-256 of the audio content hash together with everything
+    that influences the transcript: model, language and, for a chunk of a long
+    recording, the (start, end) seconds it was cut at.
+    """
+    span = f"{segment[0]:.3f}-{segment[1]:.3f}" if segment else ""
+    parts = [audio_hash, model, language or "", span]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TranscriptCache(SQLiteStore):
+    """
+    On-disk store of Whisper transcripts backed by SQLite.
+
+    Transcripts are looked up by the content of the audio (see `make_key`),
+    so a renamed, moved or copied recording is never sent again. The chunks of
+    a long recording are stored as soon as they are transcribed, an interrupted
+    transcription resumes from the missing ones. Entries are evicted
+    least-recently-used first once the store holds more than `max_entries`.
+    """
+
+    TABLE = "transcripts"
+    VALUE_COLUMN = "transcript"
+
+    def __init__(self, path=TRANSCRIPT_CACHE_PATH, max_entries=TRANSCRIPT_CACHE_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    def get(self, audio_hash, model, language=None, segment=None):
+        """Return the stored transcript, or None on a miss."""
+        return self.get_value(make_key(audio_hash, model, language, segment))
+
+    def contains(self, audio_hash, model, language=None, segment=None):
+        """Whether a transcript is stored, without refreshing its last use (for dry runs)."""
+        return self.contains_key(make_key(audio_hash, model, language, segment))
+
+    def put(self, audio_hash, model, language, transcript, segment=None):
+        self.put_value(make_key(audio_hash, model, language, segment), transcript)
+
+
+transcript_cache = TranscriptCache()
@@ -0,0 +1,72 @@
+import hashlib
+import unicodedata
+
+from config import TRANSLATION_MEMORY_PATH, TRANSLATION_MEMORY_MAX_ENTRIES
+from sqlite_store import SQLiteStore
+from supported_languages import language_codes
+
+# Language name -> code, the memory is keyed by codes whatever form the caller uses
+LANGUAGE_NAME_CODES = {name.lower(): code for code, name in language_codes.items()}
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a source string so that trivial variations share one memory entry."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def normalize_layout(text: str) -> str:
+    """
+    Like `normalize_text`, but line breaks are kept: a translation is returned
+    with the layout of its source, texts differing by their lines must not share it.
+    """
+    lines = unicodedata.normalize("NFC", text).replace("\r\n", "\n").split("\n")
+    return "\n".join(" ".join(line.split()) for line in lines)
+
+
+def normalize_language(language) -> str:
+    """The code of a language given by code or by name (fr, French -> fr)."""
+    if not language:
+        return ""
+    return LANGUAGE_NAME_CODES.get(language.lower(), language)
+
+
+def make_key(text: str, source_language, target_language, model: str, prompt_version: str) -> str:
+    """
+    Build the content address of a translation.
+
+    The key is a SHA-256 of the normalized source text (line breaks kept)
+    together with everything that influences the output: source/target
+    language (as codes), model and prompt version.
+    """
+    parts = [normalize_layout(text), normalize_language(source_language), normalize_language(target_language),
+             model, prompt_version]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class TranslationMemory(SQLiteStore):
+    """
+    On-disk translation memory backed by SQLite.
+
+    Entries are looked up by content address (see `make_key`) and evicted
+    least-recently-used first once the memory holds more than `max_entries`.
+    """
+
+    TABLE = "translations"
+    VALUE_COLUMN = "translation"
+
+    def __init__(self, path=TRANSLATION_MEMORY_PATH, max_entries=TRANSLATION_MEMORY_MAX_ENTRIES):
+        super().__init__(path, max_entries)
+
+    def get(self, text, source_language, target_language, model, prompt_version):
+        """Return the stored translation, or None on a miss."""
+        return self.get_value(make_key(text, source_language, target_language, model, prompt_version))
+
+    def contains(self, text, source_language, target_language, model, prompt_version):
+        """Whether a translation is stored, without refreshing its last use (for dry runs)."""
+        return self.contains_key(make_key(text, source_language, target_language, model, prompt_version))
+
+    def put(self, text, source_language, target_language, model, prompt_version, translation):
+        self.put_value(make_key(text, source_language, target_language, model, prompt_version), translation)
+
+
+translation_memory = TranslationMemory()
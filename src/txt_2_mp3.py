@@ -1,42 +1,139 @@
 import os
+import tempfile
+from functools import lru_cache
 from pathlib import Path
-import requests
-import time
-from config import HEADERS
+import metrics
+from api_governor import Failure, Governor, RetriesExhaustedError, classify_status
+from audio_cache import audio_cache, make_key
+from config import HEADERS, ELEVENLABS_API_BASE, ELEVENLABS_MAX_CONCURRENT, ELEVENLABS_REQUESTS_PER_MINUTE
+from rate_limiter import RateLimiter
+from mp3_info import read_mp3_info, Mp3InfoError
 
-def text_to_speech(text_filepath, voice_id, max_retries=10, retry_delay=5):
+CHUNK_SIZE = 64 * 1024
+# (connect, read) timeouts in seconds
+TIMEOUT = (10, 300)
+
+TTS_MODEL_ID = "eleven_turbo_v2_5"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.8,
+    "style": 0.0,
+    "use_speaker_boost": True
+}
+
+@lru_cache(maxsize=None)
+def get_session():
+    """
+    One keep-alive session for the whole process, connections to ElevenLabs are
+    reused across slides and shared by concurrent threads. Built on first use,
+    so that importing this module does not load requests.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+class IncompleteAudioError(Exception):
+    pass
+
+def classify_elevenlabs_error(e):
+    import requests
+
+    if isinstance(e, requests.exceptions.HTTPError) and e.response is not None:
+        return classify_status(e.response.status_code, e.response.headers)
+    if isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                      requests.exceptions.ChunkedEncodingError)):
+        return Failure(f"connection error ({str(e)})")
+    if isinstance(e, IncompleteAudioError):
+        return Failure(f"incomplete audio ({str(e)})")
+    return None
+
+elevenlabs_governor = Governor(
+    "elevenlabs",
+    RateLimiter(ELEVENLABS_REQUESTS_PER_MINUTE, max_concurrent=ELEVENLABS_MAX_CONCURRENT),
+    classify_elevenlabs_error,
+)
+
+def download_audio(response, output_path):
+    """
+    Stream a TTS response to `output_path` through a temporary file.
+
+    The file only appears at `output_path` once it is complete: the number of
+    bytes received matches the announced content-length and the result parses
+    as an mp3 with a non-zero duration.
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    fd, partial_path = tempfile.mkstemp(prefix=f".{os.path.basename(output_path)}.", suffix=".part", dir=output_dir)
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                received += len(chunk)
+
+        # With a content-encoding, content-length counts the compressed bytes
+        expected = response.headers.get("Content-Length")
+        if expected is not None and not response.headers.get("Content-Encoding") and int(expected) != received:
+            raise IncompleteAudioError(f"Received {received} bytes out of {expected}")
+        try:
+            duration = read_mp3_info(partial_path)["duration"]
+        except Mp3InfoError as e:
+            raise IncompleteAudioError(str(e)) from e
+        if duration <= 0:
+            raise IncompleteAudioError("Received an empty audio")
+
+        os.replace(partial_path, output_path)
+        return received
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+def audio_key(text, voice_id):
+    """Content address of the audio text_to_speech produces for `text`, see audio_cache."""
+    return make_key(text, voice_id, TTS_MODEL_ID, VOICE_SETTINGS)
+
+def text_to_speech(text_filepath, voice_id, max_retries=10, retry_delay=1):
+    """
+    Synthesize a transcript to the mp3 next to it.
+
+    An identical text already synthesized with the same voice and settings is
+    taken from the shared audio cache instead of calling ElevenLabs again.
+    """
     text_filepath = Path(text_filepath)
     output_path = text_filepath.with_suffix(".mp3")
 
     text_to_speak = text_filepath.read_text()
-    tts_url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}/stream"
+    key = audio_key(text_to_speak, voice_id)
+    with metrics.span("audio_cache") as span:
+        hit = audio_cache.fetch(key, output_path)
+        span.add(hits=hit, misses=not hit)
+    if hit:
+        return
+
+    tts_url = f"{ELEVENLABS_API_BASE}/v1/text-to-speech/{voice_id}/stream"
     data = {
         "text": text_to_speak,
-        "model_id": "eleven_turbo_v2_5",
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.8,
-            "style": 0.0,
-            "use_speaker_boost": True
-        }
+        "model_id": TTS_MODEL_ID,
+        "voice_settings": VOICE_SETTINGS
     }
 
-    for attempt in range(max_retries):
-        try:
-            response = requests.post(tts_url, headers=HEADERS, json=data, stream=False)
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-
-            with open(output_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=1024):
-                    f.write(chunk)
-            # print(f"Audio stream saved successfully to {output_path}")
-            return  
+    import requests
 
-        except requests.exceptions.RequestException as e:
-            # print(f"Attempt {attempt + 1} failed: {str(e)}")
-            if attempt < max_retries - 1:
-                print(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                raise Exception(f"Failed after {max_retries} attempts. Last error: {str(e)}")
+    def send():
+        with get_session().post(tts_url, json=data, stream=True, timeout=TIMEOUT) as response:
+            response.raise_for_status()  # Raises an HTTPError for bad responses
+            return download_audio(response, output_path)
 
+    with metrics.span("tts", provider="elevenlabs", requests=1, characters=len(text_to_speak)) as span:
+        try:
+            bytes_written = elevenlabs_governor.call(send, label=f"text-to-speech of {text_filepath.name}", span=span,
+                                                     max_attempts=max_retries, base_delay=retry_delay)
+        except (RetriesExhaustedError, requests.exceptions.RequestException) as e:
+            raise Exception(f"Failed to synthesize {text_filepath}. {str(e)}") from e
+        span.add(bytes_written=bytes_written)
+        audio_cache.store(key, output_path)
@@ -1,88 +1,495 @@
-import anthropic
-import tiktoken
-from config import anthropic_client
+import re
+import metrics
+from concurrent.futures import ThreadPoolExecutor
+from config import get_anthropic_client, ANTHROPIC_REQUESTS_PER_MINUTE, ANTHROPIC_TOKENS_PER_MINUTE, ANTHROPIC_MAX_CONCURRENT
+from api_governor import Failure, Governor, RetriesExhaustedError, classify_status, int_header, parse_reset
+from rate_limiter import RateLimiter
+from text_chunker import chunk_text, count_tokens, get_encoding, SENTENCE
+from translation_memory import translation_memory
+
+MODEL = "claude-3-5-sonnet-20240620"
+# Bump whenever the system prompt or the request layout changes so that
+# translations stored in the translation memory are not reused across prompts.
+PROMPT_VERSION = "1"
+
+SEGMENT_PATTERN = re.compile(r"<(\d+)>(.*?)</\1>", re.DOTALL)
+# Formatting runs of a pptx paragraph, see pptx_translator.paragraph_segment
+RUN_MARKER_PATTERN = re.compile(r"<r\d+>")
+# Only added to the prompt of the batches holding run markers: segments
+# without markers are translated the same way, their memory entries stay valid
+RUN_MARKER_INSTRUCTION = (
+    " Some segments are split into formatting runs marked <r1>...</r1>, <r2>...</r2>: keep every marker, once, "
+    "in the same order, and move the words between them as the translation requires."
+)
+RUN_MARKER_PAIR_PATTERN = re.compile(r"<r(\d+)>.*?</r\1>", re.DOTALL)
+TRANSLATION_BLOCK_PATTERN = re.compile(r'<translation lang="([^"]+)">(.*?)</translation>', re.DOTALL)
+
+# Fan-out requests translate one source into several languages, the answer
+# grows with every language while the source and the prompt are sent once.
+FANOUT_MAX_OUTPUT_TOKENS = 8000
+# Translations are usually a bit longer than their source
+OUTPUT_TOKEN_RATIO = 1.3
+
+def run_markers(text):
+    """Numbers of the <rN>...</rN> runs of a text, in order."""
+    return [int(match.group(1)) for match in RUN_MARKER_PAIR_PATTERN.finditer(text)]
+
+def recall(text, source_language, language):
+    """The translation of `text` from the translation memory, None on a miss."""
+    translated_text = translation_memory.get(text, source_language, language, MODEL, PROMPT_VERSION)
+    # Entries stored before the markers were checked by `remember`
+    if translated_text is not None and run_markers(translated_text) != run_markers(text):
+        return None
+    return translated_text
+
+def remember(text, source_language, language, translated_text):
+    """
+    Store a translation in the translation memory, unless the run markers of
+    `text` did not survive it: pptx_translator then translates the paragraph
+    again run by run, and the broken answer must not be served on later runs.
+    """
+    if run_markers(translated_text) != run_markers(text):
+        return
+    translation_memory.put(text, source_language, language, MODEL, PROMPT_VERSION, translated_text)
+
+def classify_anthropic_error(e):
+    import anthropic
+    if isinstance(e, anthropic.APIConnectionError):
+        return Failure(f"connection error ({str(e)})")
+    if isinstance(e, anthropic.APIStatusError):
+        return classify_status(e.status_code, e.response.headers)
+    return None
+
+# Shared by every thread of the process so that concurrent translations of
+# several documents stay within the account limits together.
+anthropic_limiter = RateLimiter(ANTHROPIC_REQUESTS_PER_MINUTE, ANTHROPIC_TOKENS_PER_MINUTE, ANTHROPIC_MAX_CONCURRENT)
+anthropic_governor = Governor("anthropic", anthropic_limiter, classify_anthropic_error)
+
+def observe_anthropic_headers(raw_response):
+    headers = raw_response.headers
+    anthropic_limiter.observe(
+        int_header(headers, "anthropic-ratelimit-requests-remaining"),
+        int_header(headers, "anthropic-ratelimit-input-tokens-remaining")
+        if "anthropic-ratelimit-input-tokens-remaining" in headers
+        else int_header(headers, "anthropic-ratelimit-tokens-remaining"),
+        parse_reset(headers.get("anthropic-ratelimit-requests-reset")),
+    )
+
+def chunk_system_prompt(language):
+    return f"You are an professional translation software. Translate this text into {language}. You MUST only output the translation, nothing else. If there's nothing to translate simply output the original text."
+
+def batch_system_prompt(language, count, run_markers=False):
+    return (
+        f"You are an professional translation software. Translate each numbered segment into {language}. "
+        f"Answer with exactly the same {count} numbered segments, in the same <n>...</n> format, "
+        "one per line, and nothing else. Keep every segment separate, even if it looks incomplete. "
+        "If there's nothing to translate in a segment simply output its original text."
+        + (RUN_MARKER_INSTRUCTION if run_markers else "")
+    )
+
+def has_run_markers(segments):
+    return any(RUN_MARKER_PATTERN.search(segment) for segment in segments)
+
+def fanout_system_prompt(languages, count=None, run_markers=False):
+    blocks = "".join(f'<translation lang="{language}">...</translation>' for language in languages)
+    if count is None:
+        task = "Translate this text into each of the following languages"
+        content = "the translation"
+    else:
+        task = "Translate each numbered segment into each of the following languages"
+        content = (f"exactly the same {count} numbered segments, in the same <n>...</n> format, one per line. "
+                   "Keep every segment separate, even if it looks incomplete")
+    return (
+        f"You are an professional translation software. {task}: {', '.join(languages)}. "
+        f"Answer with one block per language, in this order: {blocks}, and nothing else. "
+        f"Each block contains {content}. "
+        "If there's nothing to translate simply output the original text."
+        + (RUN_MARKER_INSTRUCTION if run_markers else "")
+    )
 
 def split_text(text, max_tokens=1750):
-    enc = tiktoken.get_encoding("cl100k_base")
-    tokens = enc.encode(text)
-    
-    chunks = []
-    current_chunk = []
+    return chunk_text(text, max_tokens, SENTENCE)
+
+def request_translation(system, content, label, max_retries=10, retry_delay=1, max_tokens=5000):
+    """
+    Send a single translation request and return the text of the answer.
+
+    Args:
+        system (str): The system prompt.
+        content (str): The user message.
+        label (str): Human readable description of the request, used in logs and errors.
+        max_retries (int): Attempts before giving up, see api_governor.Governor.
+        retry_delay (float): First backoff delay in seconds.
+        max_tokens (int): Maximum length of the answer.
+    """
+    import anthropic
+
+    with metrics.span("translate", provider="anthropic", requests=1) as span:
+        prompt_tokens = count_tokens(system) + count_tokens(content)
+
+        def send():
+            return get_anthropic_client().messages.with_raw_response.create(
+                model=MODEL,
+                max_tokens=max_tokens,
+                temperature=0.2,
+                system=system,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {
+                                "type": "text",
+                                "text": content
+                            }
+                        ]
+                    }
+                ]
+            )
+
+        try:
+            raw_response = anthropic_governor.call(send, prompt_tokens, label, span, max_retries, retry_delay,
+                                                   observe_anthropic_headers)
+        except RetriesExhaustedError as e:
+            raise TranslationError(f"Translation failed for {label}. {str(e)}") from e
+        except anthropic.APIError as e:
+            raise TranslationError(f"Translation failed for {label}: {str(e)}") from e
+        message = raw_response.parse()
+        span.add(tokens_in=message.usage.input_tokens, tokens_out=message.usage.output_tokens)
+        return message.content[0].text
+
+def translate_chunk(chunk, language, label, max_retries=10, retry_delay=1, source_language=None):
+    with metrics.span("translation_memory") as span:
+        cached_chunk = recall(chunk, source_language, language)
+        span.add(hits=cached_chunk is not None, misses=cached_chunk is None)
+    if cached_chunk is not None:
+        return cached_chunk
+
+    translated_chunk = request_translation(
+        chunk_system_prompt(language),
+        f"string to translate:\n {chunk}",
+        label,
+        max_retries,
+        retry_delay,
+    )
+    remember(chunk, source_language, language, translated_chunk)
+    print(f"{label.capitalize()} translated successfully.")
+    return translated_chunk
+
+def translate_texts_to(texts, language, max_retries=10, retry_delay=1, source_language=None):
+    """
+    Translate several documents at once.
+
+    Every chunk of every document is sent concurrently, within the budget of
+    the shared `anthropic_limiter`, and the translated chunks are reassembled in
+    their original order.
+
+    Args:
+        texts (list): The documents to translate.
+        language (str): The target language.
+
+    Returns:
+        list: The translated documents, in the same order as `texts`.
+    """
+    documents = [split_text(text) for text in texts]
+    jobs = [(d, i, chunk) for d, chunks in enumerate(documents) for i, chunk in enumerate(chunks)]
+    if not jobs:
+        return ["" for _ in texts]
+
+    with ThreadPoolExecutor(max_workers=min(ANTHROPIC_MAX_CONCURRENT, len(jobs))) as executor:
+        futures = [
+            executor.submit(metrics.wrap(translate_chunk), chunk, language, f"chunk {i+1}/{len(documents[d])}",
+                            max_retries, retry_delay, source_language)
+            for d, i, chunk in jobs
+        ]
+        results = [future.result() for future in futures]
+
+    translated_documents = [[] for _ in texts]
+    for (d, _, _), translated_chunk in zip(jobs, results):
+        translated_documents[d].append(translated_chunk)
+    return [" ".join(translated_chunks) for translated_chunks in translated_documents]
+
+def translate_txt_to(text, language, max_retries=10, retry_delay=1, source_language=None):
+    return translate_texts_to([text], language, max_retries, retry_delay, source_language)[0]
+
+def pack_segments(segments, max_tokens=1500):
+    """
+    Group segments into batches whose total token count stays below `max_tokens`.
+
+    Args:
+        segments (list): The strings to pack.
+        max_tokens (int): Token budget of a single batch (default: 1500).
+
+    Returns:
+        list: A list of batches, each batch being a list of indices into `segments`.
+    """
+    enc = get_encoding()
+    batches = []
+    current_batch = []
     current_token_count = 0
-    
-    for token in tokens:
-        current_chunk.append(token)
-        current_token_count += 1
-        
-        if current_token_count >= max_tokens:
-            # Convert tokens back to text
-            chunk_text = enc.decode(current_chunk)
-            # Find the last complete sentence
-            last_period = chunk_text.rfind('.')
-            if last_period != -1:
-                chunks.append(chunk_text[:last_period+1])
-                # Start the next chunk with the remainder
-                current_chunk = enc.encode(chunk_text[last_period+1:])
-                current_token_count = len(current_chunk)
-            else:
-                # If no period found, just use the whole chunk
-                chunks.append(chunk_text)
-                current_chunk = []
-                current_token_count = 0
-    
-    # Add any remaining text as the last chunk
-    if current_chunk:
-        chunks.append(enc.decode(current_chunk))
-    
-    return chunks
-
-def translate_txt_to(text, language, max_retries=10, retry_delay=5):
-    chunks = split_text(text)
-    translated_chunks = []
-    
-    for i, chunk in enumerate(chunks):
-        for attempt in range(max_retries):
-            try:
-                message = anthropic_client.messages.create(
-                    model="claude-3-5-sonnet-20240620",
-                    max_tokens=5000,
-                    temperature=0.2,
-                    system=f"You are an professional translation software. Translate this text into {language}. You MUST only output the translation, nothing else. If there's nothing to translate simply output the original text.",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": f"string to translate:\n {chunk}"
-                                }
-                            ]
-                        }
-                    ]
-                )
-                
-                translated_chunk = message.content[0].text
-                translated_chunks.append(translated_chunk)
-                print(f"Chunk {i+1}/{len(chunks)} translated successfully.")
-                break  # Break the retry loop if successful
-            
-            except anthropic.APIError as e:
-                print(f"API error on chunk {i+1}/{len(chunks)}, attempt {attempt+1}/{max_retries}: {str(e)}")
-                if attempt < max_retries - 1:
-                    print(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    raise TranslationError(f"Translation failed for chunk {i+1}/{len(chunks)} after {max_retries} attempts. Last error: {str(e)}")
-            
-            except Exception as e:
-                print(f"Unexpected error on chunk {i+1}/{len(chunks)}, attempt {attempt+1}/{max_retries}: {str(e)}")
-                if attempt < max_retries - 1:
-                    print(f"Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    raise TranslationError(f"Unexpected error occurred for chunk {i+1}/{len(chunks)} after {max_retries} attempts. Last error: {str(e)}")
-    
-    return " ".join(translated_chunks)
+
+    for i, segment in enumerate(segments):
+        # Account for the <n></n> markers wrapped around each segment
+        segment_tokens = len(enc.encode(segment)) + 8
+        if current_batch and current_token_count + segment_tokens > max_tokens:
+            batches.append(current_batch)
+            current_batch = []
+            current_token_count = 0
+        current_batch.append(i)
+        current_token_count += segment_tokens
+
+    if current_batch:
+        batches.append(current_batch)
+    return batches
+
+def parse_segments(text, expected_count):
+    """
+    Parse a numbered segment answer (`<1>...</1><2>...</2>`).
+
+    Returns:
+        list: The translated segments in order, or None if the answer does not
+        contain exactly the segments 1..expected_count.
+    """
+    found = {}
+    for match in SEGMENT_PATTERN.finditer(text):
+        found[int(match.group(1))] = match.group(2)
+    if sorted(found) != list(range(1, expected_count + 1)):
+        return None
+    return [found[i] for i in range(1, expected_count + 1)]
+
+def translate_batch(batch_segments, language, label, source_language=None, max_retries=10, retry_delay=1):
+    numbered = "\n".join(f"<{n}>{segment}</{n}>" for n, segment in enumerate(batch_segments, 1))
+    answer = request_translation(
+        batch_system_prompt(language, len(batch_segments), has_run_markers(batch_segments)),
+        f"segments to translate:\n{numbered}",
+        label,
+        max_retries,
+        retry_delay,
+    )
+    translated_batch = parse_segments(answer, len(batch_segments))
+    if translated_batch is None:
+        print(f"{label.capitalize()} returned unexpected segments, translating them one by one.")
+        return [translate_txt_to(segment, language, max_retries, retry_delay, source_language)
+                for segment in batch_segments]
+
+    for segment, translated_segment in zip(batch_segments, translated_batch):
+        remember(segment, source_language, language, translated_segment)
+    return translated_batch
+
+def translate_segments(segments, language, source_language=None, max_tokens=1500, max_retries=10, retry_delay=1):
+    """
+    Translate many short strings with as few API requests as possible.
+
+    Segments are deduplicated, looked up in the translation memory, and the
+    remaining ones are packed into token-bounded numbered requests sent
+    concurrently. If an answer does not contain the expected segments, the
+    batch falls back to one request per segment.
+
+    Args:
+        segments (list): The strings to translate.
+        language (str): The target language name.
+        source_language (str): The source language name, if known.
+        max_tokens (int): Token budget of a single request (default: 1500).
+
+    Returns:
+        list: The translations, in the same order as `segments`.
+    """
+    translations = {}
+    missing = []
+    for segment in dict.fromkeys(segments):
+        cached_segment = recall(segment, source_language, language)
+        if cached_segment is not None:
+            translations[segment] = cached_segment
+        else:
+            missing.append(segment)
+
+    batches = [[missing[i] for i in batch] for batch in pack_segments(missing, max_tokens)]
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(ANTHROPIC_MAX_CONCURRENT, len(batches))) as executor:
+            futures = [
+                executor.submit(metrics.wrap(translate_batch), batch_segments, language, f"batch {b+1}/{len(batches)}",
+                                source_language, max_retries, retry_delay)
+                for b, batch_segments in enumerate(batches)
+            ]
+            for batch_segments, future in zip(batches, futures):
+                translations.update(zip(batch_segments, future.result()))
+
+    return [translations[segment] for segment in segments]
+
+def parse_translations(text, languages):
+    """
+    Parse a fan-out answer (`<translation lang="...">...</translation>` blocks).
+
+    Returns:
+        dict: language -> block content, or None if a language is missing.
+    """
+    found = {language: block.strip() for language, block in TRANSLATION_BLOCK_PATTERN.findall(text)}
+    if any(language not in found for language in languages):
+        return None
+    return {language: found[language] for language in languages}
+
+def group_languages(languages, source_tokens, max_output_tokens=FANOUT_MAX_OUTPUT_TOKENS):
+    """Split `languages` into groups whose expected answer fits in `max_output_tokens`."""
+    per_language = max(1, int(source_tokens * OUTPUT_TOKEN_RATIO) + 20)
+    size = max(1, max_output_tokens // per_language)
+    return [languages[i:i + size] for i in range(0, len(languages), size)]
+
+def fanout_chunk_tokens(language_count, max_tokens=1750):
+    """Chunk size for which the translations into `language_count` languages fit in one answer."""
+    return max(200, min(max_tokens, int(FANOUT_MAX_OUTPUT_TOKENS / (OUTPUT_TOKEN_RATIO * language_count)) - 20))
+
+def translate_chunk_to_many(chunk, languages, label, max_retries=10, retry_delay=1, source_language=None):
+    """
+    Translate one chunk into several languages with a single request.
+
+    Languages already in the translation memory are skipped. If the answer does
+    not contain every language, the missing ones are translated one by one.
+
+    Returns:
+        dict: language -> translated chunk.
+    """
+    translations = {}
+    with metrics.span("translation_memory") as span:
+        for language in languages:
+            cached_chunk = recall(chunk, source_language, language)
+            if cached_chunk is not None:
+                translations[language] = cached_chunk
+        span.add(hits=len(translations), misses=len(languages) - len(translations))
+
+    missing = [language for language in languages if language not in translations]
+    for group in group_languages(missing, count_tokens(chunk)):
+        if len(group) == 1:
+            translations[group[0]] = translate_chunk(chunk, group[0], label, max_retries, retry_delay, source_language)
+            continue
+        answer = request_translation(
+            fanout_system_prompt(group),
+            f"string to translate:\n {chunk}",
+            label,
+            max_retries,
+            retry_delay,
+            FANOUT_MAX_OUTPUT_TOKENS,
+        )
+        translated = parse_translations(answer, group)
+        if translated is None:
+            print(f"{label.capitalize()} is missing languages, translating them one by one.")
+            translated = {language: translate_chunk(chunk, language, label, max_retries, retry_delay, source_language)
+                          for language in group}
+        else:
+            for language, translated_chunk in translated.items():
+                remember(chunk, source_language, language, translated_chunk)
+        translations.update(translated)
+    print(f"{label.capitalize()} translated successfully.")
+    return translations
+
+def translate_texts_to_many(texts, languages, max_retries=10, retry_delay=1, source_language=None):
+    """
+    Translate several documents into several languages at once.
+
+    Like `translate_texts_to`, but every chunk is sent once for all the
+    languages, so the source text and the prompt are not repeated per
+    language. Chunks are smaller than for a single language so that all the
+    translations fit in one answer.
+
+    Returns:
+        dict: language -> translated documents, in the same order as `texts`.
+    """
+    if len(languages) == 1:
+        return {languages[0]: translate_texts_to(texts, languages[0], max_retries, retry_delay, source_language)}
+
+    max_tokens = fanout_chunk_tokens(len(languages))
+    documents = [chunk_text(text, max_tokens, SENTENCE) for text in texts]
+    jobs = [(d, i, chunk) for d, chunks in enumerate(documents) for i, chunk in enumerate(chunks)]
+    if not jobs:
+        return {language: ["" for _ in texts] for language in languages}
+
+    with ThreadPoolExecutor(max_workers=min(ANTHROPIC_MAX_CONCURRENT, len(jobs))) as executor:
+        futures = [
+            executor.submit(metrics.wrap(translate_chunk_to_many), chunk, languages, f"chunk {i+1}/{len(documents[d])}",
+                            max_retries, retry_delay, source_language)
+            for d, i, chunk in jobs
+        ]
+        results = [future.result() for future in futures]
+
+    translated_documents = {language: [[] for _ in texts] for language in languages}
+    for (d, _, _), translations in zip(jobs, results):
+        for language, translated_chunk in translations.items():
+            translated_documents[language][d].append(translated_chunk)
+    return {language: [" ".join(translated_chunks) for translated_chunks in documents]
+            for language, documents in translated_documents.items()}
+
+def translate_batch_to_many(batch_segments, languages, label, source_language=None, max_retries=10, retry_delay=1):
+    """
+    Translate a batch of segments into several languages with a single request.
+
+    Returns:
+        dict: language -> translated segments, in the same order as `batch_segments`.
+    """
+    if len(languages) == 1:
+        return {languages[0]: translate_batch(batch_segments, languages[0], label, source_language,
+                                              max_retries, retry_delay)}
+
+    numbered = "\n".join(f"<{n}>{segment}</{n}>" for n, segment in enumerate(batch_segments, 1))
+    answer = request_translation(
+        fanout_system_prompt(languages, len(batch_segments), has_run_markers(batch_segments)),
+        f"segments to translate:\n{numbered}",
+        label,
+        max_retries,
+        retry_delay,
+        FANOUT_MAX_OUTPUT_TOKENS,
+    )
+    blocks = parse_translations(answer, languages) or {}
+    translations = {}
+    for language in languages:
+        translated_batch = parse_segments(blocks[language], len(batch_segments)) if language in blocks else None
+        if translated_batch is None:
+            print(f"{label.capitalize()} returned unexpected segments for {language}, translating them again.")
+            translations[language] = translate_batch(batch_segments, language, label, source_language,
+                                                     max_retries, retry_delay)
+            continue
+        for segment, translated_segment in zip(batch_segments, translated_batch):
+            remember(segment, source_language, language, translated_segment)
+        translations[language] = translated_batch
+    return translations
+
+def translate_segments_to_many(segments, languages, source_language=None, max_tokens=1500, max_retries=10, retry_delay=1):
+    """
+    Translate many short strings into several languages with as few API requests as possible.
+
+    Like `translate_segments`, but every batch is sent once for all the
+    languages that miss one of its segments in the translation memory.
+
+    Returns:
+        dict: language -> translations, in the same order as `segments`.
+    """
+    if len(languages) == 1:
+        return {languages[0]: translate_segments(segments, languages[0], source_language, max_tokens,
+                                                 max_retries, retry_delay)}
+
+    translations = {language: {} for language in languages}
+    missing = []
+    for segment in dict.fromkeys(segments):
+        for language in languages:
+            cached_segment = recall(segment, source_language, language)
+            if cached_segment is not None:
+                translations[language][segment] = cached_segment
+        if any(segment not in translations[language] for language in languages):
+            missing.append(segment)
+
+    batch_tokens = min(max_tokens, fanout_chunk_tokens(len(languages), max_tokens))
+    batches = [[missing[i] for i in batch] for batch in pack_segments(missing, batch_tokens)]
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(ANTHROPIC_MAX_CONCURRENT, len(batches))) as executor:
+            futures = []
+            for b, batch_segments in enumerate(batches):
+                batch_languages = [language for language in languages
+                                   if any(segment not in translations[language] for segment in batch_segments)]
+                futures.append(executor.submit(metrics.wrap(translate_batch_to_many), batch_segments, batch_languages,
+                                               f"batch {b+1}/{len(batches)}", source_language, max_retries,
+                                               retry_delay))
+            for batch_segments, future in zip(batches, futures):
+                for language, translated_batch in future.result().items():
+                    translations[language].update(zip(batch_segments, translated_batch))
+
+    return {language: [translations[language][segment] for segment in segments] for language in languages}
 
 def save_translation(content, path):
     with open(path, 'w', encoding='utf-8') as file:
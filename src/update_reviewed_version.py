@@ -1,21 +1,14 @@
 import os
-import hashlib
 
+from cli_helpers import print_separator, select_directory, select_source_version
 from config import voice_ids
-from image_audio_2_video import create_video
-from initial_translation import convert_pptx_to_png, print_separator, select_directory, select_source_version, language_codes
-from txt_2_mp3 import text_to_speech
+from file_manifest import update_manifest, diff_manifests
+from initial_translation import convert_pptx_to_png
+from supported_languages import language_codes
 
 
 ROOT_DIR = "../../../course-translation/V3"
 
-def calculate_sha256(file_path):
-    sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
-    return sha256_hash.hexdigest()
-
 def decrement_version(path):
     parts = path.split(os.sep)
     for i, part in enumerate(parts):
@@ -26,16 +19,17 @@ def decrement_version(path):
             return os.sep.join(parts)
     return path  # Return original path if no version found
 
-def file_has_changed(filepath):
-    previous_version_path = decrement_version(filepath)
-    if not os.path.exists(filepath) or not os.path.exists(previous_version_path):
-        return False, f"One or both files do not exist: \n{filepath}\n{previous_version_path}"
-
-    current_hash = calculate_sha256(filepath)
-    previous_hash = calculate_sha256(previous_version_path)
+def changed_files(version_path):
+    """
+    Relative paths of the tracked files of a version that differ from the previous version.
 
-    are_identical = current_hash == previous_hash
-    return not(are_identical)
+    Both version folders keep a manifest of (size, mtime, hash), only files whose
+    stat changed since the last run are hashed again.
+    """
+    previous_version_path = decrement_version(version_path)
+    if os.path.normpath(previous_version_path) == os.path.normpath(version_path) or not os.path.isdir(previous_version_path):
+        return set()
+    return diff_manifests(update_manifest(version_path), update_manifest(previous_version_path))
 
 def get_available_languages(folder_path):
     return [lang for lang in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, lang)) and lang in language_codes]
@@ -78,18 +72,12 @@ def select_language(folder_path):
     lang = get_language_choice(numbered_langs, "\nEnter the number for the target language: ")
     return lang
 
-if __name__ == "__main__":
+def update_version(update_version_path):
+    # Loaded here, listing the changed files must not wait for the API clients
+    from image_audio_2_video import create_video_from_segments
+    from txt_2_mp3 import text_to_speech
 
-    print("This script will let you generate a reviewed version!")
-    print_separator("=")
-    selected_dir = select_directory(ROOT_DIR)
-    available_langs = get_available_languages(selected_dir)
-    numbered_languages = create_numbered_languages(available_langs)
-    print_separator()
-    print_languages(numbered_languages)
-    lang = get_language_choice(numbered_languages, "\nEnter the number for the language: ")
-    version = select_source_version(selected_dir, lang)
-    update_version_path = os.path.join(selected_dir, lang, version)
+    changed = changed_files(update_version_path)
     items = os.listdir(update_version_path)
 
     for item in sorted(items):
@@ -103,7 +91,7 @@ if __name__ == "__main__":
 
             print()
             print("Processing pptx...")
-            if file_has_changed(pptx_path):
+            if f"{item}/{PPTX_NAME}" in changed:
                 MODIFIED = True
                 print_separator(" ")
                 print("Exporting modified pptx...")
@@ -118,7 +106,7 @@ if __name__ == "__main__":
                 slide_item_path = os.path.join(slide_path, slide_item)
                 
                 if slide_item.lower().endswith('.txt'):
-                    if file_has_changed(slide_item_path):
+                    if f"{item}/slides/{slide_item}" in changed:
                         MODIFIED = True
                         print(f"Generating audio for {slide_item}...")
                         voice = slide_item.split('.')[-2].split('_')[-1]
@@ -127,9 +115,26 @@ if __name__ == "__main__":
                 video_path = os.path.join(item_path, f"{item}.mp4")
                 print_separator(" ")
                 print("Exporting chapter video...")
-                create_video(slide_path, video_path)
+                # Only the slides whose image or audio changed are encoded again
+                encoded = create_video_from_segments(slide_path, video_path)
+                print(f"Re-encoded {encoded} slide(s).")
 
         print_separator("=")
+
+if __name__ == "__main__":
+
+    print("This script will let you generate a reviewed version!")
+    print_separator("=")
+    selected_dir = select_directory(ROOT_DIR)
+    available_langs = get_available_languages(selected_dir)
+    numbered_languages = create_numbered_languages(available_langs)
+    print_separator()
+    print_languages(numbered_languages)
+    lang = get_language_choice(numbered_languages, "\nEnter the number for the language: ")
+    version = select_source_version(selected_dir, lang)
+    update_version_path = os.path.join(selected_dir, lang, version)
+    update_version(update_version_path)
+
     print_separator(" ")
     course = os.path.basename(selected_dir)
     print(f"The {version} of {course} in {lang} has been fully generated!")
@@ -0,0 +1,16 @@
+"""
+Run from the repository root with `python -m pytest test`.
+
+The modules live flat in src/ and import each other by name, as when the
+command line tools are run from there.
+"""
+import os
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+
+# config parses VOICE_IDS at import time, and the caches must stay out of the real CACHE_DIR
+os.environ.setdefault("VOICE_IDS", "{}")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="test_cache_"))
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from api_governor import CircuitBreaker, Failure, Governor, RetriesExhaustedError
+from rate_limiter import RateLimiter
+
+
+class ProviderError(Exception):
+    def __init__(self, failure):
+        super().__init__(failure.reason)
+        self.failure = failure
+
+
+def make_governor(breaker, max_attempts=1):
+    return Governor("provider", RateLimiter(60000, max_concurrent=8), lambda e: getattr(e, "failure", None),
+                    max_attempts=max_attempts, base_delay=0.01, breaker=breaker)
+
+
+def failing(failure):
+    def fn():
+        raise ProviderError(failure)
+    return fn
+
+
+def open_circuit(governor):
+    for _ in range(governor.breaker.failure_threshold):
+        with pytest.raises(RetriesExhaustedError):
+            governor.call(failing(Failure("server error (500)")))
+
+
+def test_throttled_trial_does_not_keep_the_circuit_open():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    governor = make_governor(breaker)
+    open_circuit(governor)
+    time.sleep(0.06)
+
+    # The trial request after the cooldown is throttled
+    with pytest.raises(RetriesExhaustedError, match="throttled"):
+        governor.call(failing(Failure("throttled (429)", throttled=True)))
+
+    # The provider recovered
+    assert governor.call(lambda: "ok") == "ok"
+
+
+def test_waiting_for_the_trial_does_not_spend_attempts():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    governor = make_governor(breaker)
+    open_circuit(governor)
+    time.sleep(0.06)
+
+    def slow_trial():
+        time.sleep(0.3)
+        return "trial"
+
+    results = []
+    trial = threading.Thread(target=lambda: results.append(governor.call(slow_trial)))
+    trial.start()
+    time.sleep(0.05)
+    # One attempt each, all made while the trial is in flight
+    others = [threading.Thread(target=lambda: results.append(governor.call(lambda: "ok"))) for _ in range(3)]
+    for thread in others:
+        thread.start()
+    for thread in [trial] + others:
+        thread.join(timeout=10)
+
+    assert sorted(results) == ["ok", "ok", "ok", "trial"]
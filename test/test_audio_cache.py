@@ -0,0 +1,29 @@
+import os
+
+from audio_cache import AudioCache
+
+
+def test_evict_skips_files_removed_during_the_walk(tmp_path, monkeypatch):
+    cache = AudioCache(tmp_path, max_bytes=10)
+    for i, key in enumerate(["aa01", "aa02", "bb03"]):
+        source = tmp_path / f"source{i}.mp3"
+        source.write_bytes(b"x" * 8)
+        cache.store(key, str(source))
+        os.utime(cache.path(key), (i, i))
+        source.unlink()
+
+    walk = os.walk
+
+    def racing_walk(directory):
+        # Another process evicts the oldest file once it is listed
+        for root, dirs, files in walk(directory):
+            if os.path.join(root, "aa01.mp3") == cache.path("aa01"):
+                os.remove(cache.path("aa01"))
+            yield root, dirs, files
+
+    monkeypatch.setattr(os, "walk", racing_walk)
+    cache.evict()
+
+    assert not cache.contains("aa01")
+    assert not cache.contains("aa02")
+    assert cache.contains("bb03")
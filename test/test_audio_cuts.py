@@ -0,0 +1,60 @@
+from ffmpeg_tools import parse_silencedetect
+from mp3_2_txt import plan_cuts
+
+SILENCEDETECT_OUTPUT = """\
+Input #0, mp3, from 'chapter.mp3':
+  Duration: 00:01:05.50, start: 0.025057, bitrate: 128 kb/s
+    Stream #0:0: Audio: mp3, 44100 Hz, mono, fltp, 128 kb/s
+[silencedetect @ 0x55d1] silence_start: -0.0123
+[silencedetect @ 0x55d1] silence_end: 0.8 | silence_duration: 0.8123
+[silencedetect @ 0x55d1] silence_start: 12.5
+[silencedetect @ 0x55d1] silence_end: 13.25 | silence_duration: 0.75
+[silencedetect @ 0x55d1] silence_start: 64.9
+size=N/A time=00:01:05.50 bitrate=N/A speed= 512x
+"""
+
+
+def assert_covers(chunks, duration):
+    assert chunks[0][0] == 0.0
+    assert chunks[-1][1] == duration
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+
+
+def test_parse_silencedetect_reads_duration_and_silences():
+    duration, silences = parse_silencedetect(SILENCEDETECT_OUTPUT)
+
+    assert duration == 65.5
+    # A negative start is clamped, a silence still open at the end closes at the duration
+    assert silences == [(0.0, 0.8), (12.5, 13.25), (64.9, 65.5)]
+
+
+def test_parse_silencedetect_without_duration():
+    assert parse_silencedetect("[silencedetect @ 0x1] silence_start: 3") == (None, [])
+
+
+def test_short_audio_is_not_cut():
+    assert plan_cuts(50.0, [(10.0, 11.0)], max_chunk_duration=60) == [(0.0, 50.0)]
+
+
+def test_cut_in_the_middle_of_the_last_silence_that_fits():
+    silences = [(10.0, 11.0), (40.0, 42.0), (70.0, 71.0), (130.0, 131.0)]
+
+    chunks = plan_cuts(150.0, silences, max_chunk_duration=60)
+
+    assert chunks == [(0.0, 41.0), (41.0, 70.5), (70.5, 130.5), (130.5, 150.0)]
+    assert_covers(chunks, 150.0)
+
+
+def test_silence_past_the_limit_is_not_used():
+    # The middle of the silence is at 61, one second over the limit
+    chunks = plan_cuts(100.0, [(59.0, 63.0)], max_chunk_duration=60)
+
+    assert chunks == [(0.0, 60.0), (60.0, 100.0)]
+
+
+def test_hard_cuts_without_silence():
+    chunks = plan_cuts(130.0, [], max_chunk_duration=60)
+
+    assert chunks == [(0.0, 60.0), (60.0, 120.0), (120.0, 130.0)]
+    assert all(end - start <= 60 for start, end in chunks)
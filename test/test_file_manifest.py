@@ -0,0 +1,54 @@
+import hashlib
+import os
+
+from file_manifest import MANIFEST_NAME, diff_manifests, load_manifest, update_manifest
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_diff_lists_new_and_changed_files():
+    previous = {
+        "same.txt": {"sha256": "a"},
+        "changed.txt": {"sha256": "b"},
+        "deleted.txt": {"sha256": "c"},
+    }
+    current = {
+        "same.txt": {"sha256": "a"},
+        "changed.txt": {"sha256": "B"},
+        "new.txt": {"sha256": "d"},
+    }
+
+    assert diff_manifests(current, previous) == {"changed.txt", "new.txt"}
+    assert diff_manifests(current, current) == set()
+
+
+def test_update_manifest_hashes_tracked_files(tmp_path):
+    write(tmp_path / "chapter1" / "transcript.txt", "hello")
+    write(tmp_path / "slides.pptx", "slides")
+    write(tmp_path / "audio.mp3", "not tracked")
+
+    manifest = update_manifest(str(tmp_path))
+
+    assert set(manifest) == {"chapter1/transcript.txt", "slides.pptx"}
+    assert manifest["chapter1/transcript.txt"]["sha256"] == hashlib.sha256(b"hello").hexdigest()
+    assert (tmp_path / MANIFEST_NAME).exists()
+    assert load_manifest(str(tmp_path)) == manifest
+
+
+def test_update_manifest_then_diff_finds_the_edited_file(tmp_path):
+    write(tmp_path / "a.txt", "first")
+    write(tmp_path / "b.txt", "second")
+    previous = update_manifest(str(tmp_path))
+
+    write(tmp_path / "b.txt", "second, reviewed")
+    # Make sure the edit is seen even on a coarse mtime clock
+    stat = os.stat(tmp_path / "b.txt")
+    os.utime(tmp_path / "b.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    current = update_manifest(str(tmp_path))
+
+    assert diff_manifests(current, previous) == {"b.txt"}
+    assert current["a.txt"] == previous["a.txt"]
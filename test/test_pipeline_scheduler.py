@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from pipeline_scheduler import CPU, IO, Task, run_tasks
+
+
+class Recorder:
+    """Tasks append their name when they run, optionally failing."""
+
+    def __init__(self):
+        self.order = []
+        self._lock = threading.Lock()
+
+    def task(self, name, deps=(), kind=IO, fail=False):
+        def run():
+            with self._lock:
+                self.order.append(name)
+            if fail:
+                raise RuntimeError(f"{name} failed")
+        return Task(name, run, kind=kind, deps=deps)
+
+
+def test_tasks_run_after_their_dependencies():
+    recorder = Recorder()
+    tasks = [
+        recorder.task("video", deps=["audio", "slides"], kind=CPU),
+        recorder.task("audio", deps=["translate"]),
+        recorder.task("slides", deps=["translate"], kind=CPU),
+        recorder.task("translate", deps=["transcribe"]),
+        recorder.task("transcribe"),
+    ]
+
+    failures = run_tasks(tasks, io_workers=4, cpu_workers=2)
+
+    assert failures == {}
+    order = recorder.order
+    assert sorted(order) == sorted(task.name for task in tasks)
+    for task in tasks:
+        for dep in task.deps:
+            assert order.index(dep) < order.index(task.name)
+
+
+def test_failure_skips_every_dependent_and_nothing_else():
+    recorder = Recorder()
+    tasks = [
+        recorder.task("transcribe", fail=True),
+        recorder.task("translate", deps=["transcribe"]),
+        recorder.task("audio", deps=["translate"]),
+        recorder.task("video", deps=["audio", "slides"]),
+        recorder.task("slides"),
+        recorder.task("other-chapter"),
+    ]
+
+    failures = run_tasks(tasks)
+
+    assert set(failures) == {"transcribe", "translate", "audio", "video"}
+    assert "transcribe failed" in failures["transcribe"]
+    assert failures["video"] == "skipped because transcribe failed"
+    assert sorted(recorder.order) == ["other-chapter", "slides", "transcribe"]
+
+
+def test_duplicate_task_names_are_rejected():
+    recorder = Recorder()
+    with pytest.raises(ValueError, match="Duplicate task name: a"):
+        run_tasks([recorder.task("a"), recorder.task("a")])
+    assert recorder.order == []
+
+
+def test_unknown_dependency_is_rejected():
+    recorder = Recorder()
+    with pytest.raises(ValueError, match="depends on unknown task"):
+        run_tasks([recorder.task("a", deps=["missing"])])
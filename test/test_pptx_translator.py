@@ -0,0 +1,82 @@
+import pytest
+from pptx import Presentation
+from pptx.util import Inches
+
+from pptx_translator import paragraph_segment, set_paragraph_translation
+
+
+def make_runs(*texts):
+    """The runs of a real text box paragraph, bold on every other run."""
+    presentation = Presentation()
+    slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+    paragraph = slide.shapes.add_textbox(0, 0, Inches(4), Inches(1)).text_frame.paragraphs[0]
+    runs = []
+    for i, text in enumerate(texts):
+        run = paragraph.add_run()
+        run.text = text
+        run.font.bold = i % 2 == 1
+        runs.append(run)
+    return runs
+
+
+def test_single_run_is_sent_stripped_and_keeps_its_spacing():
+    runs = make_runs("  Hello world ")
+
+    assert paragraph_segment(runs) == "Hello world"
+    assert set_paragraph_translation(runs, "Bonjour le monde")
+    assert runs[0].text == "  Bonjour le monde "
+
+
+def test_run_markers_round_trip():
+    runs = make_runs("The ", "private key", " signs the transaction.")
+
+    segment = paragraph_segment(runs)
+    assert segment == "<r1>The </r1><r2>private key</r2><r3> signs the transaction.</r3>"
+
+    assert set_paragraph_translation(
+        runs, "<r1>La </r1><r2>clé privée</r2><r3> signe la transaction.</r3>"
+    )
+    assert [run.text for run in runs] == ["La ", "clé privée", " signe la transaction."]
+    assert [run.font.bold for run in runs] == [False, True, False]
+
+
+def test_text_between_markers_stays_with_the_run_before_it():
+    runs = make_runs("Bitcoin", "node", "software")
+
+    assert set_paragraph_translation(runs, " <r1>Le</r1> <r2>nœud</r2> <r3>Bitcoin</r3>. ")
+    assert [run.text for run in runs] == ["Le ", "nœud ", "Bitcoin."]
+
+
+def test_whitespace_only_runs_keep_their_spacing():
+    runs = make_runs("Hello", " ", "world")
+
+    assert set_paragraph_translation(runs, "<r1>Bonjour</r1><r2> </r2><r3>monde</r3>")
+    assert [run.text for run in runs] == ["Bonjour", " ", "monde"]
+
+
+def test_words_in_a_whitespace_only_run_go_to_the_run_before():
+    runs = make_runs("Hello", " ", "world")
+
+    assert set_paragraph_translation(runs, "<r1>Bonjour</r1><r2> le </r2><r3>monde</r3>")
+    assert [run.text for run in runs] == ["Bonjour le", " ", "monde"]
+
+
+def test_words_in_a_leading_whitespace_only_run_go_to_the_first_run():
+    runs = make_runs(" ", "world", "!")
+
+    assert set_paragraph_translation(runs, "<r1> Le </r1><r2>monde</r2><r3> !</r3>")
+    assert [run.text for run in runs] == [" ", "Le monde", " !"]
+
+
+@pytest.mark.parametrize("translation", [
+    "La clé privée signe la transaction.",
+    "<r1>La </r1><r2>clé privée</r2> signe la transaction.",
+    "<r2>clé privée</r2><r1>La </r1><r3> signe la transaction.</r3>",
+    "<r1>La </r1><r1>clé privée</r1><r3> signe la transaction.</r3>",
+])
+def test_lost_markers_leave_the_runs_untouched(translation):
+    texts = ("The ", "private key", " signs the transaction.")
+    runs = make_runs(*texts)
+
+    assert not set_paragraph_translation(runs, translation)
+    assert tuple(run.text for run in runs) == texts
@@ -0,0 +1,84 @@
+import re
+
+import pytest
+
+from text_chunker import PARAGRAPH, SENTENCE, TRANSCRIPT, chunk_text, count_tokens, register_encoding
+
+
+class WordEncoding:
+    """One token per line break and per word with its leading spaces, so tests need no tiktoken download."""
+
+    PIECE_PATTERN = re.compile(rb"\n|[ \t]*[^\s]+|[ \t]+")
+
+    def encode(self, text, **kwargs):
+        return self.PIECE_PATTERN.findall(text.encode("utf-8"))
+
+    def decode_tokens_bytes(self, tokens):
+        return list(tokens)
+
+    def decode(self, tokens):
+        return b"".join(tokens).decode("utf-8")
+
+
+ENCODING = "test-words"
+register_encoding(ENCODING, WordEncoding())
+
+TEXT = (
+    "Bitcoin est une monnaie. Elle n'a pas de banque centrale. "
+    "Les nœuds vérifient chaque bloc.\nLes mineurs ajoutent les blocs à la chaîne. "
+    "Le réseau ajuste la difficulté toutes les deux semaines environ.\n"
+    "Fin."
+)
+
+
+@pytest.mark.parametrize("max_tokens", [1, 3, 7, 12, 1000])
+def test_sentence_chunks_join_back_to_the_text(max_tokens):
+    chunks = chunk_text(TEXT, max_tokens, SENTENCE, ENCODING)
+
+    assert "".join(chunks) == TEXT
+    assert all(chunks)
+
+
+@pytest.mark.parametrize("mode", [SENTENCE, TRANSCRIPT, PARAGRAPH])
+@pytest.mark.parametrize("max_tokens", [1, 3, 7, 12])
+def test_chunks_stay_within_the_token_budget(mode, max_tokens):
+    chunks = chunk_text(TEXT, max_tokens, mode, ENCODING)
+
+    assert chunks
+    for chunk in chunks:
+        assert count_tokens(chunk, ENCODING) <= max_tokens
+
+
+def test_sentence_chunks_end_after_a_period():
+    chunks = chunk_text(TEXT, 12, SENTENCE, ENCODING)
+
+    assert chunks == [
+        "Bitcoin est une monnaie. Elle n'a pas de banque centrale.",
+        " Les nœuds vérifient chaque bloc.",
+        "\nLes mineurs ajoutent les blocs à la chaîne.",
+        " Le réseau ajuste la difficulté toutes les deux semaines environ.\nFin.",
+    ]
+
+
+def test_paragraph_chunks_end_at_line_breaks_and_are_stripped():
+    chunks = chunk_text(TEXT, 20, PARAGRAPH, ENCODING)
+
+    assert chunks == [
+        "Bitcoin est une monnaie. Elle n'a pas de banque centrale. "
+        "Les nœuds vérifient chaque bloc.",
+        "Les mineurs ajoutent les blocs à la chaîne. "
+        "Le réseau ajuste la difficulté toutes les deux semaines environ.\nFin.",
+    ]
+
+
+def test_text_without_boundary_is_cut_at_the_budget():
+    text = " ".join(f"mot{i}" for i in range(10))
+
+    chunks = chunk_text(text, 4, TRANSCRIPT, ENCODING)
+
+    assert chunks == ["mot0 mot1 mot2 mot3", "mot4 mot5 mot6 mot7", "mot8 mot9"]
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown chunking mode"):
+        chunk_text(TEXT, 10, "words", ENCODING)
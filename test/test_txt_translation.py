@@ -0,0 +1,53 @@
+import pytest
+
+import txt_translation
+from translation_memory import TranslationMemory
+from txt_translation import parse_segments, recall, remember, translate_batch
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    memory = TranslationMemory(tmp_path / "memory.sqlite")
+    monkeypatch.setattr(txt_translation, "translation_memory", memory)
+    yield memory
+    memory.close()
+
+
+def answer(*segments):
+    return "\n".join(f"<{n}>{segment}</{n}>" for n, segment in enumerate(segments, 1))
+
+
+def test_parse_segments_in_order():
+    assert parse_segments("<2>deux</2>\n<1>un</1>", 2) == ["un", "deux"]
+    assert parse_segments("<1>un</1>", 2) is None
+
+
+def test_translation_with_broken_run_markers_is_not_remembered(memory, monkeypatch):
+    segments = ["<r1>The </r1><r2>private key</r2>", "Signature"]
+    requests = []
+
+    def request_translation(system, content, label, *args):
+        requests.append(content)
+        return answer("La clé privée", "Signature")
+
+    monkeypatch.setattr(txt_translation, "request_translation", request_translation)
+
+    # The broken paragraph is returned as is, pptx_translator falls back to its runs
+    assert translate_batch(segments, "fr", "batch 1/1", "en") == ["La clé privée", "Signature"]
+    assert recall(segments[0], "en", "fr") is None
+    assert recall(segments[1], "en", "fr") == "Signature"
+
+
+def test_translation_keeping_its_run_markers_is_remembered(memory):
+    segment = "<r1>The </r1><r2>private key</r2>"
+
+    remember(segment, "en", "fr", "<r1>La </r1><r2>clé privée</r2>")
+
+    assert recall(segment, "en", "fr") == "<r1>La </r1><r2>clé privée</r2>"
+
+
+def test_broken_entries_already_in_the_memory_are_misses(memory):
+    segment = "<r1>The </r1><r2>private key</r2>"
+    memory.put(segment, "en", "fr", txt_translation.MODEL, txt_translation.PROMPT_VERSION, "La clé privée")
+
+    assert recall(segment, "en", "fr") is None